@@ -1,10 +1,31 @@
 import tkinter as tk
-from tkinter import ttk, messagebox
-import pygame  # Library for sound playback
+from tkinter import ttk, messagebox, filedialog
 from PIL import Image, ImageTk  # For image manipulation
-from mutagen.mp3 import MP3  # For getting metadata like song length
 import os  # To handle file paths and directories
+import bisect  # Finds a song's row in the folder playlist by its track number
 import time  # For tracking playtime and formatting time
+from playlist import Playlist  # Ordered playlist model with O(1) membership checks
+import playlist_io  # Streaming M3U and JSON lines playlist files
+import play_queue  # Shuffle, repeat and rating-weighted playback order
+import track_library as lib  # Track ratings used to weight random playback
+from audio_engine import AudioEngine  # Decodes songs in a worker process and plays them
+import dsp_chain  # Equalizer presets applied by the audio engine
+import media_cache  # Process pool for decoding songs in the background
+import waveform  # Cached min/max peaks for drawing song waveforms
+import loudness  # Measured loudness and the gain that evens it out between songs
+import folder_watcher  # Notices songs added to, removed from or renamed in the music folder
+import play_history  # Append-only log of what was played, when and for how long
+import recommender  # Learns which songs go together from the saved and loaded playlists
+from tag_ingest import track_key  # Stable key of a song file for songs that are not in the library
+import duplicates  # Finds copies of the same song saved under different names
+from gui_tasks import TaskRunner  # Runs the duplicate search without blocking the window
+import tk_watchdog  # Optional tracing of slow handlers, enabled with TK_WATCHDOG_TRACE
+import album_art  # Cover thumbnails from the songs' ID3 tags, made in the background
+
+ENGINE_POLL_MS = 50  # How often the window checks the audio engine for news
+WAVEFORM_WIDTH = 360  # Width of the waveform drawn above the song slider, matching the slider
+WAVEFORM_HEIGHT = 40
+CROSSFADE_SECONDS = 3.0  # How long one song fades into the next when crossfading is on
 
 
 class MusicPlayer:
@@ -17,8 +38,8 @@ class MusicPlayer:
         self.window.title("MP3 Player")  # Sets the title of the main window
         self.window.geometry("1000x600")  # Sets the initial size of the window
 
-        # Initializes the Pygame mixer, which handles audio playback
-        pygame.mixer.init()
+        # Starts the audio engine; decoding happens in a worker process so the window never waits on disk
+        self.engine = AudioEngine()
 
         # Paths for required resources such as music files and control button icons
         self.BASE_DIR = os.path.dirname(os.path.abspath(__file__))  # Base directory of the script
@@ -30,6 +51,12 @@ class MusicPlayer:
         self.paused = False  # Indicates if playback is currently paused
         self.song_length = 0  # Total length of the currently loaded song in seconds
         self.start_time = None  # Tracks the time when the song started playing
+        self.song_path = None  # Path of the song being played
+        self.song_key = None  # Key the song is recorded under in the play history
+        self.history = play_history.shared_history()
+        self.recommender = recommender.shared_recommender()
+        self.play_time_job = None  # Pending play_time update, cancelled when a new song starts
+        self.song_gain = 1.0  # Amplitude factor that brings the current song to the target loudness
 
         # Variables for the GUI sliders
         self.slider_value = tk.DoubleVar()  # Controls the song playback position
@@ -38,12 +65,53 @@ class MusicPlayer:
         # Mapping of song display names (shown to the user) to their respective file names
         self.song_mapping = {}
 
+        # Songs added for playback, in order, together with the current position
+        self.playlist = Playlist(unique=True)
+        self.playlist_load = None  # Playlist file still being read in chunks, cancelled by a reset
+
+        # Decides which song plays next for the selected playback mode
+        self.queue = play_queue.PlayQueue(self.playlist, weight_of=self.song_weight)
+
+        # Library keys of songs whose title matches a library track, and the reverse lookup
+        self.library_keys = {}
+        self.songs_by_key = {}
+        lib.add_listener(self.on_library_change)  # Reweight songs when their rating changes
+
         # Build the graphical user interface (GUI)
         self.create_widgets()
 
+        # Follows the music folder, so later changes are applied as they happen instead of by a rescan
+        self.watcher = folder_watcher.FolderWatcher(
+            self.MUSIC_FOLDER, snapshot_path=folder_watcher.snapshot_path_for(self.MUSIC_FOLDER)
+        )
+
+        # Copies of a song are listed once; the search runs in the background after each change
+        self.tasks = TaskRunner(self.window, on_busy=lambda busy: None)
+        self.duplicate_finder = duplicates.DuplicateFinder()
+
         # Populate the folder playlist with available MP3 files
         self.load_songs()
 
+        # Waveform peaks and loudness being worked out in the background, by song path
+        self.decode_pool = None
+        self.peak_jobs = {}
+        self.loudness = loudness.LoudnessCache()
+        self.loudness_jobs = {}
+
+        # Cover thumbnails, made in the same worker pool and shown for the current or hovered song
+        self.covers = album_art.CoverArt(
+            lambda *job: self.get_decode_pool().submit(*job), lambda data: tk.PhotoImage(data=data)
+        )
+        self.hovered_path = None  # Path of the song under the pointer in either playlist
+        song_paths = [os.path.join(self.MUSIC_FOLDER, file) for file in self.song_mapping.values()]
+        self.generate_peaks(song_paths)
+        self.analyze_loudness(song_paths)
+
+        # Listen for songs finishing loading or playing, and shut the engine down with the window
+        self.poll_engine()
+        self.window.after(folder_watcher.POLL_MS, self.poll_folder)
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+
     def create_widgets(self):
         """
         Creates and arranges all GUI components, including playlists, control buttons, sliders, 
@@ -78,7 +146,7 @@ class MusicPlayer:
 
         self.folder_playlist = tk.Listbox(
             left_frame, bg="black", fg="white", width=50,
-            selectbackground="blue", selectforeground="white"
+            selectbackground="blue", selectforeground="white", selectmode=tk.EXTENDED
         )
         self.folder_playlist.pack(fill="y", expand=True)
 
@@ -86,6 +154,11 @@ class MusicPlayer:
         add_button = tk.Button(left_frame, text="Add", command=self.add_to_playlist)
         add_button.pack(pady=5)
 
+        # Cover of the song under the pointer, or of the current song, with a blank square until one is ready
+        self.no_cover = tk.PhotoImage(width=album_art.COVER_SIZE, height=album_art.COVER_SIZE)
+        self.cover_label = tk.Label(left_frame, image=self.no_cover)
+        self.cover_label.pack(pady=5)
+
         # Right frame: Contains the added playlist and playback controls
         right_frame = tk.Frame(main_frame)
         right_frame.pack(side=tk.RIGHT, fill="both", expand=True, padx=10)
@@ -96,13 +169,36 @@ class MusicPlayer:
 
         self.added_playlist = tk.Listbox(
             right_frame, bg="black", fg="white", width=50, height=15,
-            selectbackground="blue", selectforeground="white"
+            selectbackground="blue", selectforeground="white", selectmode=tk.EXTENDED
         )
         self.added_playlist.pack(fill="y", expand=True)
+        # Keep the playlist's current position in step with the user's selection
+        self.added_playlist.bind("<<ListboxSelect>>", self.on_playlist_select)
+
+        # Show the cover of the song under the pointer in either playlist
+        for listbox in (self.folder_playlist, self.added_playlist):
+            listbox.bind("<Motion>", self.hover_song)
+            listbox.bind("<Leave>", self.hover_end)
+            # A wheel scroll puts another row under the pointer once the list has moved
+            for sequence in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+                listbox.bind(sequence, lambda event: self.window.after_idle(self.hover_song, event), add="+")
+
+        # Buttons to remove the selected songs and to reset the playlist
+        playlist_buttons_frame = tk.Frame(right_frame)
+        playlist_buttons_frame.pack(pady=5)
+
+        remove_button = tk.Button(playlist_buttons_frame, text="Remove Selected", command=self.remove_from_playlist)
+        remove_button.pack(side=tk.LEFT, padx=5)
+
+        reset_playlist_button = tk.Button(playlist_buttons_frame, text="Reset Playlist", command=self.reset_playlist)
+        reset_playlist_button.pack(side=tk.LEFT, padx=5)
 
-        # Button to reset playlist
-        reset_playlist_button = tk.Button(right_frame, text="Reset Playlist", command=self.reset_playlist)
-        reset_playlist_button.pack(pady=5)
+        # Buttons to save the playlist to and load it from M3U or JSON lines files
+        save_playlist_button = tk.Button(playlist_buttons_frame, text="Save Playlist", command=self.save_playlist)
+        save_playlist_button.pack(side=tk.LEFT, padx=5)
+
+        load_playlist_button = tk.Button(playlist_buttons_frame, text="Load Playlist", command=self.load_playlist)
+        load_playlist_button.pack(side=tk.LEFT, padx=5)
 
         # Control buttons frame for playback controls
         controls_frame = tk.Frame(right_frame)
@@ -136,9 +232,35 @@ class MusicPlayer:
         pause_button.grid(row=0, column=3, padx=10)
         stop_button.grid(row=0, column=4, padx=10)
 
+        # Drop-down list for choosing the playback mode
+        self.mode_value = tk.StringVar(value=play_queue.ORDER)
+        mode_box = ttk.Combobox(
+            controls_frame, textvariable=self.mode_value, values=play_queue.MODES, state="readonly", width=12
+        )
+        mode_box.grid(row=1, column=0, columnspan=5, pady=10)
+        mode_box.bind("<<ComboboxSelected>>", lambda event: self.queue.set_mode(self.mode_value.get()))
+
+        # Equalizer preset and crossfading, both applied by the engine while the audio plays
+        self.eq_value = tk.StringVar(value="Flat")
+        eq_box = ttk.Combobox(
+            controls_frame, textvariable=self.eq_value, values=list(dsp_chain.EQ_PRESETS), state="readonly", width=12
+        )
+        eq_box.grid(row=2, column=0, columnspan=3)
+        eq_box.bind("<<ComboboxSelected>>", lambda event: self.engine.set_eq(dsp_chain.EQ_PRESETS[self.eq_value.get()]))
+        self.crossfade_value = tk.BooleanVar(value=True)
+        crossfade_check = tk.Checkbutton(controls_frame, text="Crossfade", variable=self.crossfade_value)
+        crossfade_check.grid(row=2, column=3, columnspan=2)
+
+        # Waveform of the current song, drawn from cached peaks, with a marker for the playback position
+        self.waveform_canvas = tk.Canvas(
+            right_frame, width=WAVEFORM_WIDTH, height=WAVEFORM_HEIGHT, bg="black", highlightthickness=0
+        )
+        self.waveform_canvas.pack(pady=(10, 0))
+        self.waveform_canvas.create_line(0, 0, 0, WAVEFORM_HEIGHT, fill="blue", width=2, tags="position")
+
         # Slider for controlling the current song position
-        self.song_slider = ttk.Scale(right_frame, from_=0, to=100, orient=tk.HORIZONTAL, value=0, command=self.slide, length=360)
-        self.song_slider.pack(pady=10)
+        self.song_slider = ttk.Scale(right_frame, from_=0, to=100, orient=tk.HORIZONTAL, value=0, command=self.slide, length=WAVEFORM_WIDTH)
+        self.song_slider.pack(pady=(0, 10))
 
         # Volume control slider and label
         volume_frame = tk.Frame(right_frame)
@@ -167,25 +289,208 @@ class MusicPlayer:
         Adjusts the playback volume based on the value of the volume slider.
         Updates the volume label to show the percentage value.
         """
-        pygame.mixer.music.set_volume(self.volume_slider.get() / 100)  # Scale volume (0.0 to 1.0)
+        # Scale volume (0.0 to 1.0) and apply the song's loudness gain, which cannot go past full volume
+        self.engine.set_volume(min(self.volume_slider.get() / 100 * self.song_gain, 1.0))
         self.volume_label.config(text=f"{int(self.volume_slider.get())}%")  # Update label text
 
     def load_songs(self):
         """
-        Loads all MP3 files from the designated music folder into the folder playlist.
+        Loads all MP3 files from the designated music folder and its subfolders into the folder playlist.
         Resets and refreshes the song mapping and playlist display.
         """
         self.folder_playlist.delete(0, tk.END)  # Clear the current playlist display
+        self.folder_rows = []  # Track numbers of the songs shown in the folder playlist, in row order
         self.song_mapping = {}  # Reset the mapping of song display names to file paths
+        self.display_names = {}  # Reverse mapping, to find the song of a file that changed
+        self.library_keys = {}
+        self.songs_by_key = {}
+        self.track_count = 0  # Highest track number given out so far
+        self.hidden_duplicates = {}  # File of a hidden copy -> file of the song that is listed instead
+
+        # Index library tracks by title once so each song is matched with a dict lookup
+        self.keys_by_title = {item.name.lower(): key for key, item in lib.library.items()}
+
+        # The folder watcher already knows the files, so the folder is not listed again here
+        display_names = [self.add_song(file) for file in self.watcher.paths()]
+        self.folder_playlist.insert(tk.END, *display_names)  # Add them to the playlist display in one call
+        self.folder_rows = [self.track_number(name) for name in display_names]
+        self.find_duplicates()
+
+    def add_song(self, file, track_number=None):
+        """
+        Records a song file under a display name and returns the name.
+        New songs get the next track number; renamed songs keep theirs.
+            file (str): Path of the file relative to the music folder.
+        """
+        if track_number is None:
+            self.track_count += 1
+            track_number = self.track_count
+        song_title = os.path.splitext(os.path.basename(file))[0]  # Extract the song title (without extension)
+        display_name = f"Track {track_number:02d} {song_title}"  # Combine track number and title
+        self.song_mapping[display_name] = file  # Map the display name to the actual file
+        self.display_names[file] = display_name
+
+        key = self.keys_by_title.get(song_title.lower())  # Matching library track, if any
+        if key is not None:
+            self.library_keys[display_name] = key
+            self.songs_by_key.setdefault(key, []).append(display_name)
+        return display_name
+
+    def forget_song(self, file):
+        """
+        Drops a song file from the mappings and returns the display name it had.
+        """
+        display_name = self.display_names.pop(file)
+        del self.song_mapping[display_name]
+        key = self.library_keys.pop(display_name, None)
+        if key is not None:
+            self.songs_by_key[key].remove(display_name)
+        return display_name
+
+    def poll_folder(self):
+        """
+        Applies the songs added to, removed from or renamed in the music folder since the last poll.
+        Only the changed entries of the song mapping and the listboxes are touched.
+        """
+        added, removed, renamed = self.watcher.poll()
+        for old_file, new_file in renamed:
+            if old_file in self.hidden_duplicates:
+                self.hidden_duplicates[new_file] = self.hidden_duplicates.pop(old_file)
+                continue
+            self.rename_song(old_file, new_file)
+            for hidden, kept in self.hidden_duplicates.items():
+                if kept == old_file:
+                    self.hidden_duplicates[hidden] = new_file
+        self.duplicate_finder.forget(os.path.join(self.MUSIC_FOLDER, file) for file in removed)
+        self.covers.forget(os.path.join(self.MUSIC_FOLDER, file) for file in removed + [old for old, _ in renamed])
+        self.remove_songs([file for file in removed if self.hidden_duplicates.pop(file, None) is None])
+        # Copies of a removed song are listed again until the next search decides which one to keep
+        restored = [hidden for hidden, kept in self.hidden_duplicates.items() if kept in removed]
+        for file in restored:
+            del self.hidden_duplicates[file]
+        added = restored + added
+
+        # New songs are shown right away if they match the current search
+        query = self.search_entry.get().lower()
+        display_names = [self.add_song(file) for file in added]
+        shown = [name for name in display_names if query in name.lower()]
+        self.folder_playlist.insert(tk.END, *shown)  # New songs have the highest track numbers, so rows stay in order
+        self.folder_rows.extend(self.track_number(name) for name in shown)
+
+        # New and moved files need their waveform and loudness worked out
+        changed_paths = [os.path.join(self.MUSIC_FOLDER, file) for file in added + [new for _, new in renamed]]
+        if changed_paths:
+            self.generate_peaks(changed_paths)
+            self.analyze_loudness(changed_paths)
+        if added or renamed:
+            self.find_duplicates()  # Only new and changed files are read again
+        self.window.after(folder_watcher.POLL_MS, self.poll_folder)
+
+    def find_duplicates(self):
+        """
+        Looks for songs with identical audio in a background thread, then hides all but one copy of each.
+        """
+        song_paths = [os.path.join(self.MUSIC_FOLDER, file) for file in self.display_names]
+        self.tasks.submit(
+            "duplicates",
+            lambda: self.duplicate_finder.find(song_paths),
+            self.hide_duplicates,
+            on_error=lambda error: None,  # A song that cannot be read is simply listed as it is
+        )
 
-        # Iterate through all files in the music folder
-        for index, file in enumerate(os.listdir(self.MUSIC_FOLDER), start=1):
-            if file.endswith(".mp3"):  # Only process MP3 files
-                track_number = f"Track {index:02d}"  # Assign a track number
-                song_title = os.path.splitext(file)[0]  # Extract the song title (without extension)
-                display_name = f"{track_number} {song_title}"  # Combine track number and title
-                self.folder_playlist.insert(tk.END, display_name)  # Add to the playlist display
-                self.song_mapping[display_name] = file  # Map the display name to the actual file
+    def hide_duplicates(self, groups):
+        """
+        Keeps one song of each group of identical files in the song mapping and removes the others.
+        A copy in the added playlist is kept in preference, otherwise the one with the lowest track number.
+        """
+        hidden = []
+        for group in groups:
+            files = [os.path.relpath(path, self.MUSIC_FOLDER) for path in group]
+            files = [file for file in files if file in self.display_names]  # Still listed since the search started
+            if len(files) < 2:
+                continue
+            kept = min(files, key=lambda file: (self.display_names[file] not in self.playlist,
+                                                self.track_number(self.display_names[file])))
+            for file in files:
+                if file != kept:
+                    hidden.append(file)
+                    self.hidden_duplicates[file] = kept
+        self.remove_songs(hidden)
+        if hidden and self.start_time is None:
+            self.status_bar.config(text=f"{len(self.hidden_duplicates)} duplicate song(s) hidden")
+
+    @staticmethod
+    def track_number(display_name):
+        """
+        Returns the track number of a display name, which starts with "Track NN".
+        """
+        return int(display_name.split(" ", 2)[1])
+
+    def folder_row(self, display_name):
+        """
+        Returns the row of a song in the folder playlist, or None if it is not shown.
+        Rows are in track number order, so the row is found by bisection instead of reading the listbox.
+        """
+        track_number = self.track_number(display_name)
+        row = bisect.bisect_left(self.folder_rows, track_number)
+        if row < len(self.folder_rows) and self.folder_rows[row] == track_number:
+            return row
+        return None
+
+    def remove_songs(self, files):
+        """
+        Removes songs whose files were deleted or hidden from the folder playlist and the added playlist.
+        The added playlist is searched in one pass for all of them.
+        """
+        display_names = {self.forget_song(file) for file in files}
+        rows = [self.folder_row(name) for name in display_names]
+        for row in sorted((row for row in rows if row is not None), reverse=True):
+            self.folder_playlist.delete(row)  # Delete from the end so earlier rows stay valid
+            del self.folder_rows[row]
+        if any(name in self.playlist for name in display_names):
+            indexes = [index for index, name in enumerate(self.playlist) if name in display_names]
+            removing_current = self.playlist.position in indexes
+            self.playlist.remove_at(indexes)
+            for index in reversed(indexes):
+                self.added_playlist.delete(index)
+            if removing_current:
+                self.stop()
+            self.show_current()
+
+    def rename_song(self, old_file, new_file):
+        """
+        Shows a renamed or moved song under its new title, keeping its track number and playlist place.
+        """
+        old_name = self.forget_song(old_file)
+        new_name = self.add_song(new_file, self.track_number(old_name))
+        index = self.folder_row(old_name)  # The row keeps its track number, so folder_rows is unchanged
+        if index is not None:
+            self.folder_playlist.delete(index)
+            self.folder_playlist.insert(index, new_name)
+        if self.playlist.rename(old_name, new_name):
+            index = self.playlist.index(new_name)
+            self.added_playlist.delete(index)
+            self.added_playlist.insert(index, new_name)
+            self.show_current()
+        if self.song_path == os.path.join(self.MUSIC_FOLDER, old_file):
+            self.song_path = os.path.join(self.MUSIC_FOLDER, new_file)
+
+    def song_weight(self, display_name):
+        """
+        Returns how likely a song is to be picked in the weighted playback mode.
+        Songs rated in the track library count for more; unknown songs get the lowest weight.
+        """
+        key = self.library_keys.get(display_name)
+        rating = lib.get_rating(key) if key is not None else -1
+        return rating + 1 if rating > 0 else 1
+
+    def on_library_change(self, key, field, old, new):
+        """
+        Library listener that updates the playback weights of songs whose rating changed.
+        """
+        if field == "rating":
+            for display_name in self.songs_by_key.get(key, ()):
+                self.queue.refresh_weight(display_name)
 
     def search_songs(self):
         """
@@ -195,21 +500,49 @@ class MusicPlayer:
         query = self.search_entry.get().lower()  # Get the search query in lowercase
         self.folder_playlist.delete(0, tk.END)  # Clear the playlist display
 
-        # Iterate through all songs and match against the query
-        for display_name, file in self.song_mapping.items():
-            if query in display_name.lower():  # Case-insensitive match
-                self.folder_playlist.insert(tk.END, display_name)  # Display matching songs
+        # Match all songs against the query, listing them in track number order as load_songs does
+        matches = sorted((name for name in self.song_mapping if query in name.lower()), key=self.track_number)
+        self.folder_playlist.insert(tk.END, *matches)  # Display matching songs
+        self.folder_rows = [self.track_number(name) for name in matches]
 
     def add_to_playlist(self):
         """
-        Adds the currently selected song from the folder playlist to the added playlist.
+        Adds the selected songs from the folder playlist to the added playlist.
         Prevents duplicate additions.
         """
-        selected_song = self.folder_playlist.get(tk.ACTIVE)  # Get the selected song from the folder playlist
-        if selected_song in self.added_playlist.get(0, tk.END):  # Check for duplicates
-            messagebox.showwarning("Duplicate Song", f"'{selected_song}' is already in the playlist.")
-        else:
-            self.added_playlist.insert(tk.END, selected_song)  # Add the song to the added playlist
+        # Get the selected songs from the folder playlist, or the active one if none are selected
+        selected_songs = [self.folder_playlist.get(index) for index in self.folder_playlist.curselection()]
+        if not selected_songs:
+            selected_songs = [song for song in [self.folder_playlist.get(tk.ACTIVE)] if song]
+
+        added = self.playlist.extend(selected_songs)  # Duplicates are rejected by the playlist model
+        if added:
+            self.added_playlist.insert(tk.END, *added)  # Add all new songs to the listbox in one call
+
+        skipped = len(selected_songs) - len(added)
+        if skipped == 1 and len(selected_songs) == 1:
+            messagebox.showwarning("Duplicate Song", f"'{selected_songs[0]}' is already in the playlist.")
+        elif skipped:
+            messagebox.showwarning("Duplicate Song", f"{skipped} song(s) already in the playlist were skipped.")
+
+    def remove_from_playlist(self):
+        """
+        Removes the selected songs from the added playlist.
+        Stops playback if the current song is among them.
+        """
+        indexes = self.added_playlist.curselection()
+        if not indexes:
+            messagebox.showwarning("No Song Selected", "Please select songs to remove.")
+            return
+
+        removing_current = self.playlist.position in indexes
+        self.playlist.remove_at(indexes)  # Remove all selected songs in one pass
+        for index in reversed(indexes):  # Delete from the end so earlier indexes stay valid
+            self.added_playlist.delete(index)
+
+        if removing_current:
+            self.stop()
+        self.show_current()
 
     def reset_playlist(self):
         """
@@ -217,8 +550,108 @@ class MusicPlayer:
         Mimics the behavior of the stop button.
         """
         self.stop()  # Stop playback and reset all playback-related states
+        self.cancel_playlist_load()  # A file still loading must not refill the playlist
+        self.playlist.clear()  # Forget the queued songs and the current position
         self.added_playlist.delete(0, tk.END)  # Clear the added playlist
 
+    def save_playlist(self):
+        """
+        Writes the added playlist to an M3U or JSON lines file chosen by the user.
+        Entries are streamed to the file one at a time.
+        """
+        if not self.playlist:
+            messagebox.showwarning("Empty Playlist", "Please add songs before saving the playlist.")
+            return
+
+        path = filedialog.asksaveasfilename(defaultextension=".m3u8", filetypes=playlist_io.PLAYLIST_FILETYPES)
+        if not path:
+            return  # The user cancelled the dialog
+
+        # Store the full path of each song so other players can open the playlist too
+        entries = (
+            (os.path.join(self.MUSIC_FOLDER, self.song_mapping.get(name, name)), name)
+            for name in self.playlist
+        )
+        try:
+            playlist_io.save_playlist(path, entries)
+        except OSError as error:
+            messagebox.showerror("File Error", f"Could not save the playlist: {error}")
+            return
+        self.status_bar.config(text=f"Playlist saved to {os.path.basename(path)}")
+        self.recommender.add_playlist(self.playlist_keys())
+
+    def load_playlist(self):
+        """
+        Replaces the added playlist with one read from an M3U or JSON lines file.
+        Songs are resolved through the song mapping and shown chunk by chunk as the file is read.
+        """
+        path = filedialog.askopenfilename(filetypes=playlist_io.PLAYLIST_FILETYPES)
+        if not path:
+            return  # The user cancelled the dialog
+
+        entries = playlist_io.load_playlist(path)  # Read lazily; errors reach on_playlist_error
+        self.reset_playlist()  # Stop playback and clear the current playlist
+        resolver = playlist_io.PlaylistResolver.for_song_mapping(self.song_mapping)  # Index song files once
+        self.playlist_load = playlist_io.load_progressively(
+            self.window, entries, resolver, self.on_playlist_chunk, self.on_playlist_loaded, self.on_playlist_error
+        )
+
+    def cancel_playlist_load(self):
+        """
+        Stops a playlist file that is still being loaded from adding more songs.
+        """
+        if self.playlist_load is not None:
+            self.playlist_load.cancel()
+            self.playlist_load = None
+
+    def on_playlist_chunk(self, songs):
+        """
+        Adds a chunk of loaded songs to the playlist model and the added playlist display.
+        """
+        added = self.playlist.extend(songs)
+        if added:
+            self.added_playlist.insert(tk.END, *added)
+        self.status_bar.config(text=f"Loading playlist... {len(self.playlist)} songs")
+
+    def on_playlist_loaded(self, loaded, skipped):
+        """
+        Reports how many songs were loaded once the whole file has been read.
+        """
+        self.status_bar.config(text=f"Playlist loaded: {loaded} song(s), {skipped} unknown entries skipped")
+        self.recommender.add_playlist(self.playlist_keys())
+
+    def playlist_keys(self):
+        """
+        Returns the keys the songs of the added playlist are recorded under in the play history.
+        """
+        return [self.library_keys.get(name) or track_key(self.song_mapping[name])
+                for name in self.playlist if name in self.song_mapping]
+
+    def on_playlist_error(self, error):
+        """
+        Reports a playlist file that could not be read; the songs read before the error are kept.
+        """
+        self.status_bar.config(text=f"Playlist partly loaded: {len(self.playlist)} song(s)")
+        messagebox.showerror("File Error", f"Could not load the playlist: {error}")
+
+    def on_playlist_select(self, event):
+        """
+        Makes the first song selected in the added playlist the current song.
+        """
+        indexes = self.added_playlist.curselection()
+        if indexes:
+            self.playlist.select(indexes[0])
+
+    def show_current(self):
+        """
+        Highlights the current song of the playlist model in the added playlist.
+        """
+        self.added_playlist.selection_clear(0, tk.END)  # Clear the current selection
+        if self.playlist.position is not None:
+            self.added_playlist.activate(self.playlist.position)  # Highlight the current song
+            self.added_playlist.selection_set(self.playlist.position)  # Select the current song
+            self.added_playlist.see(self.playlist.position)  # Scroll it into view
+
 
     def play(self):
         """
@@ -226,8 +659,13 @@ class MusicPlayer:
         Initializes and synchronizes the slider and status bar for the song's duration.
         Handles errors if no song is selected or the file is missing.
         """
-        # Get the song selected by the user in the "Added Playlist"
-        selected_song = self.added_playlist.get(tk.ACTIVE)
+        # Start from the first song if the user has not picked one yet
+        if self.playlist.current() is None and self.playlist:
+            self.playlist.select(0)
+            self.show_current()
+
+        # Get the current song of the "Added Playlist"
+        selected_song = self.playlist.current()
         if not selected_song:
             messagebox.showwarning("No Song Selected", "Please select a song to play.")
             return
@@ -241,55 +679,213 @@ class MusicPlayer:
         # Construct the full path to the song file
         song_path = os.path.join(self.MUSIC_FOLDER, original_file_name)
 
-        # Load the song into the mixer and start playback
-        pygame.mixer.music.load(song_path)
-        pygame.mixer.music.play(loops=0)
-
-        # Retrieve and store the song's total duration in seconds
-        self.song_length = MP3(song_path).info.length
+        # Record how long the previous song was listened to before switching
+        self.log_play()
+        self.song_key = self.library_keys.get(selected_song) or track_key(original_file_name)
+
+        # Ask the engine to decode and play the song; this returns immediately.
+        # With crossfading on, a song still playing fades out under the new one
+        crossfade = CROSSFADE_SECONDS if self.crossfade_value.get() else 0.0
+        self.engine.load(song_path, crossfade=crossfade)
+        self.song_path = song_path
+        self.song_gain = self.loudness.gain_factor(song_path)  # Stored gain, so nothing is measured here
+        self.set_volume(None)
+        self.show_waveform(song_path)
+        self.show_cover()
+
+        # Reset the playback states; the slider and timer start once the song is decoded
+        self.stopped = False
+        self.paused = False
+        self.cancel_play_time()  # Only one update loop may run at a time
+        self.song_slider.config(value=0, state='normal')
+        self.status_bar.config(text="Loading...")
 
-        # Record the playback start time
+    def poll_engine(self):
+        """
+        Handles events from the audio engine: a song finished decoding, failed to load,
+        reached its crossfade or ended.
+        Reschedules itself for as long as the window is open.
+        """
+        self.poll_peaks()
+        self.poll_loudness()
+        if self.covers.poll():
+            self.show_cover()
+        for event in self.engine.poll():
+            if event[0] == "loaded":
+                self.song_loaded(event[3])
+            elif event[0] == "error":
+                self.stop()
+                messagebox.showerror("File Error", f"Could not play the song: {event[3]}")
+            elif event[0] == "ending" and self.queue.auto_advance():
+                self.next_song(auto=True)  # Start the next song now, so the two crossfade
+            elif event[0] == "ended":
+                self.song_ended()
+        self.window.after(ENGINE_POLL_MS, self.poll_engine)
+
+    def song_loaded(self, length):
+        """
+        Starts the slider and playback timer once the engine has decoded the song.
+            length (float): Length of the song in seconds.
+        """
+        # Store the song's total duration and record the playback start time
+        self.song_length = length
         self.start_time = time.time()
-
-        # Reset the stopped state and enable the slider
-        self.stopped = False
-        self.song_slider.config(to=self.song_length, value=0, state='normal')
+        self.song_slider.config(to=self.song_length, value=0)
 
         # Start updating the playback time on the slider and status bar
-        self.play_time(song_path)
+        self.play_time(self.song_path)
+
+    def generate_peaks(self, song_paths):
+        """
+        Queues waveform peak generation for the songs that have no cached peaks yet.
+        The work is spread over a process pool with one worker per core.
+        """
+        missing = [path for path in waveform.missing_peaks(song_paths) if path not in self.peak_jobs]
+        if not missing:
+            return
+        for path in missing:
+            self.peak_jobs[path] = self.get_decode_pool().submit(waveform.generate_peaks, path)
+
+    def get_decode_pool(self):
+        """
+        Returns the process pool for background decoding, with one worker per core, starting it on first use.
+        """
+        if self.decode_pool is None:
+            self.decode_pool = media_cache.decode_pool()
+        return self.decode_pool
+
+    def analyze_loudness(self, song_paths):
+        """
+        Queues loudness analysis for the songs that have not been measured yet.
+        Unknown files are hashed first, and only content that was never measured is decoded.
+        """
+        for path in song_paths:
+            if path in self.loudness_jobs:
+                continue
+            job = self.loudness.next_job(path)
+            if job is not None:
+                self.loudness_jobs[path] = self.get_decode_pool().submit(job, path)
+
+    def poll_loudness(self):
+        """
+        Stores finished loudness jobs, queues the measurement of newly hashed songs and
+        saves the cache once everything is done. Applies a new gain to the current song.
+        """
+        finished = [path for path, job in self.loudness_jobs.items() if job.done()]
+        for path in finished:
+            job = self.loudness_jobs.pop(path)
+            if job.exception() is not None:
+                continue  # Unreadable files simply keep their volume
+            self.loudness.record(job.result())
+            self.analyze_loudness([path])  # A hashed song may still need measuring
+            if path == self.song_path:
+                self.song_gain = self.loudness.gain_factor(path)
+                self.set_volume(None)
+        if finished and not self.loudness_jobs:
+            self.loudness.save()
+
+    def poll_peaks(self):
+        """
+        Collects finished peak jobs and draws the waveform if it belongs to the current song.
+        """
+        for path, job in list(self.peak_jobs.items()):
+            if job.done():
+                del self.peak_jobs[path]
+                if path == self.song_path and job.exception() is None:
+                    self.show_waveform(path)
+
+    def show_waveform(self, song_path):
+        """
+        Draws the waveform of a song from its cached peaks, or queues their generation.
+        """
+        peaks = waveform.load_peaks(song_path)  # A few kilobytes; the audio is not decoded here
+        waveform.draw_peaks(self.waveform_canvas, peaks)
+        self.waveform_canvas.tag_raise("position")
+        if peaks is None:
+            self.generate_peaks([song_path])
+
+    def hover_song(self, event):
+        """
+        Shows the cover of the song under the pointer in either playlist.
+        Only the row under the pointer is looked up, so moving over or scrolling the list stays cheap.
+        """
+        listbox = event.widget
+        index = listbox.nearest(event.y)
+        box = listbox.bbox(index) if index >= 0 else None
+        path = None
+        if box is not None and box[1] <= event.y < box[1] + box[3]:  # nearest() also answers below the last row
+            original_file_name = self.song_mapping.get(listbox.get(index))
+            if original_file_name:
+                path = os.path.join(self.MUSIC_FOLDER, original_file_name)
+        if path != self.hovered_path:
+            self.hovered_path = path
+            self.show_cover()
+
+    def hover_end(self, event):
+        """
+        Goes back to the current song's cover when the pointer leaves a playlist.
+        """
+        self.hovered_path = None
+        self.show_cover()
+
+    def show_cover(self):
+        """
+        Shows the cover of the hovered song, or else of the current song, once its thumbnail is ready.
+        """
+        path = self.hovered_path or self.song_path
+        image = self.covers.get(path) if path else None
+        self.cover_label.config(image=image or self.no_cover)
+        self.covers.keep_only({self.hovered_path, self.song_path})  # Rows the pointer has left are not loaded
+
+    def song_ended(self):
+        """
+        Moves on to the next song or stops, depending on the playback mode, when a song finishes.
+        """
+        self.log_play()  # The song played to the end
+        if self.queue.auto_advance():
+            # Move on by itself in the repeat, shuffle and weighted modes
+            self.next_song(auto=True)
+        else:
+            # Stop playback when the song finishes
+            self.stop()
 
     def play_time(self, song_path):
         """
         Tracks and updates the current playback time of the song.
         Synchronizes the slider and status bar with the song's current position and duration.
-        Stops playback and resets states when the song ends.
+        The end of the song is reported by the audio engine rather than this timer.
             song_path (str): The path of the currently playing song.
         """
         if self.stopped:  # Exit if playback has been stopped
             return
 
-        # Calculate the elapsed time since the song started playing
-        current_time = time.time() - self.start_time
+        # Calculate the elapsed time since the song started playing, capped at its length
+        current_time = min(time.time() - self.start_time, self.song_length)
 
         # If the song is paused, skip updates but continue checking periodically
         if self.paused:
-            self.status_bar.after(500, lambda: self.play_time(song_path))
+            self.play_time_job = self.status_bar.after(500, lambda: self.play_time(song_path))
             return
 
-        # Update the slider and status bar if the song is still within its duration
-        if current_time <= self.song_length:
-            self.song_slider.config(value=current_time)  # Update the slider to match current time
-            self.status_bar.config(
-                text=f"{self.format_time(current_time)} / {self.format_time(self.song_length)}"
-            )  # Update the playback time display
+        # Update the slider, waveform marker and status bar with the current position
+        self.song_slider.config(value=current_time)  # Update the slider to match current time
+        x = current_time / self.song_length * WAVEFORM_WIDTH if self.song_length else 0
+        self.waveform_canvas.coords("position", x, 0, x, WAVEFORM_HEIGHT)
+        self.status_bar.config(
+            text=f"{self.format_time(current_time)} / {self.format_time(self.song_length)}"
+        )  # Update the playback time display
 
-            # Schedule the next update in 500 milliseconds
-            self.status_bar.after(500, lambda: self.play_time(song_path))
-        else:
-            # Stop playback when the song finishes
-            self.stop()
+        # Schedule the next update in 500 milliseconds
+        self.play_time_job = self.status_bar.after(500, lambda: self.play_time(song_path))
 
 
+    def cancel_play_time(self):
+        """
+        Cancels the pending playback time update, if there is one.
+        """
+        if self.play_time_job is not None:
+            self.status_bar.after_cancel(self.play_time_job)
+            self.play_time_job = None
 
     def format_time(self, seconds):
         """
@@ -303,45 +899,36 @@ class MusicPlayer:
         Seeks to the specified position in the song and resumes playback.
             x (float): The current value of the slider.
         """
-        if self.stopped:  # Ignore slider adjustments if playback has been stopped
+        if self.stopped or self.start_time is None:  # Ignore slider adjustments until a song is playing
             return
 
-        # Retrieve the currently selected song in the playlist
-        selected_song = self.added_playlist.get(tk.ACTIVE)
-        if not selected_song:
-            return  # Exit if no song is selected
-
-        # Map the song's display name to its file path
-        original_file_name = self.song_mapping.get(selected_song)
-        if not original_file_name:
-            return  # Exit if the song file is missing
-
-        # Construct the full file path of the song
-        song_path = os.path.join(self.MUSIC_FOLDER, original_file_name)
-
         # Retrieve the new playback position from the slider
         new_position = int(self.song_slider.get())
 
-        # Reload and play the song from the new position
-        pygame.mixer.music.load(song_path)
-        pygame.mixer.music.play(loops=0, start=new_position)
+        # The engine already holds the decoded song, so seeking needs no reload
+        self.engine.seek(new_position)
 
         # Adjust the start time to account for the new playback position
         self.start_time = time.time() - new_position
+        if self.paused:
+            self.pause_time = time.time()  # The paused time before the seek no longer counts
 
     def stop(self):
         """
         Stops the current song playback and resets playback-related states.
         Clears the slider and duration display.
         """
-        # Stop the music playback
-        pygame.mixer.music.stop()
+        # Record how far the song got, then stop the music playback
+        self.log_play()
+        self.engine.stop()
 
-        # Set the stopped state to True
+        # Set the stopped state to True and stop the playback time updates
         self.stopped = True
+        self.cancel_play_time()
 
-        # Reset the slider to its initial state and disable it
+        # Reset the slider and waveform marker to their initial state and disable the slider
         self.song_slider.config(value=0, state='disabled')
+        self.waveform_canvas.coords("position", 0, 0, 0, WAVEFORM_HEIGHT)
 
         # Clear the status bar to remove duration display
         self.status_bar.config(text="")
@@ -349,46 +936,72 @@ class MusicPlayer:
         # Reset the playback start time to None
         self.start_time = None
 
+    def log_play(self):
+        """
+        Records the current song in the play history with how far it got, once per play.
+        """
+        if self.start_time is None or self.song_key is None:
+            return  # Nothing has played since the last record
+        end_time = self.pause_time if self.paused else time.time()
+        listened = min(max(end_time - self.start_time, 0), self.song_length)
+        self.history.record(self.song_key, listened)
+        self.start_time = None
+
     def pause(self, is_paused):
         """
         Pauses or resumes playback based on the current state.
         Toggles the pause state each time it is called.
         """
         if is_paused:
-            pygame.mixer.music.unpause()  # Resume playback
+            self.engine.resume()  # Resume playback
             self.paused = False  # Update state
             # Update start_time to account for the paused duration
             self.start_time += time.time() - self.pause_time  
         else:
-            pygame.mixer.music.pause()  # Pause playback
+            self.engine.pause()  # Pause playback
             self.paused = True  # Update state
             self.pause_time = time.time()  # Record when the pause happened
 
 
-    def next_song(self):
+    def close(self):
         """
-        Skips to the next song in the added playlist.
-        Loops back to the first song if at the end of the playlist.
+        Shuts down the audio engine and its worker process, then closes the window.
         """
+        self.log_play()
+        self.cancel_playlist_load()
+        self.engine.close()
+        self.history.close()
+        self.loudness.save()  # Keep whatever was measured before the window closed
+        self.watcher.save_snapshot()  # The next start only lists folders that changed
+        self.tasks.close()
+        if self.decode_pool is not None:
+            self.decode_pool.shutdown(wait=False, cancel_futures=True)
+        self.window.destroy()
+
+    def next_song(self, auto=False):
+        """
+        Skips to the next song in the added playlist, chosen by the playback mode.
+        In order, loops back to the first song if at the end of the playlist.
+            auto (bool): True when called because the previous song finished.
+        """
+        if not self.playlist:
+            return  # Nothing to skip to
         self.song_slider.config(value=0)  # Reset the slider position
-        current_index = self.added_playlist.curselection()[0]  # Get the current song index
-        next_index = (current_index + 1) % self.added_playlist.size()  # Calculate the next index
-        self.added_playlist.selection_clear(0, tk.END)  # Clear the current selection
-        self.added_playlist.activate(next_index)  # Highlight the next song
-        self.added_playlist.selection_set(next_index)  # Select the next song
+        self.queue.next(auto=auto)  # Advance the current position for the playback mode
+        self.show_current()  # Highlight the next song
         self.play()  # Play the next song
 
     def previous_song(self):
         """
         Goes back to the previous song in the added playlist.
-        Loops to the last song if at the beginning of the playlist.
+        In the random modes this is the song played before; otherwise the one above,
+        looping to the last song if at the beginning of the playlist.
         """
+        if not self.playlist:
+            return  # Nothing to go back to
         self.song_slider.config(value=0)  # Reset the slider position
-        current_index = self.added_playlist.curselection()[0]  # Get the current song index
-        prev_index = (current_index - 1) % self.added_playlist.size()  # Calculate the previous index
-        self.added_playlist.selection_clear(0, tk.END)  # Clear the current selection
-        self.added_playlist.activate(prev_index)  # Highlight the previous song
-        self.added_playlist.selection_set(prev_index)  # Select the previous song
+        self.queue.previous()  # Step the current position back
+        self.show_current()  # Highlight the previous song
         self.play()  # Play the previous song
 
 
@@ -398,5 +1011,8 @@ if __name__ == "__main__":
     Creates the main window and initializes the MusicPlayer class.
     """
     window = tk.Tk()  # Create the main application window
+    watchdog = tk_watchdog.from_environment(window)  # Times handlers; must start before the widgets are created
     app = MusicPlayer(window)  # Initialize the MusicPlayer app
     window.mainloop()  # Start the Tkinter event loop
+    if watchdog is not None:
+        watchdog.close()  # Finish the trace file and print the slowest handlers
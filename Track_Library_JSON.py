@@ -1,6 +1,12 @@
 from library_item import LibraryItem
+from library_snapshot import LibrarySnapshot, replace_item
+import library_shards
+import index_cache
+import collections
 import json
 import os
+import threading
+import traceback
 
 class LibraryItem:
     def __init__(self, name, artist, rating):
@@ -14,8 +20,76 @@ class LibraryItem:
         return f"{self.name} - {self.artist} {stars}"
 
 
-# Initialize an empty library
-library = {}
+# Initialize an empty library. Each change publishes a new snapshot instead of
+# modifying this one, so readers on other threads never see a half-done change.
+library = LibrarySnapshot()
+write_lock = threading.Lock()  # Writers take turns, so no change is lost
+# (path, snapshot, content hash) of the last library.json read; indexes of that snapshot can be cached against the file
+library_source = None
+
+# Callbacks notified as callback(key, field, old, new) after a track changes.
+# A reload is announced with key=None and field="reload".
+listeners = []
+
+
+def add_listener(callback):
+    """Register a callback to be told about rating, play count and reload changes."""
+    listeners.append(callback)
+
+
+def remove_listener(callback):
+    """Unregister a callback previously passed to add_listener."""
+    try:
+        listeners.remove(callback)
+    except ValueError:
+        pass
+
+
+# Changes published but not yet delivered to the listeners, in the order of their snapshots
+undelivered = collections.deque()
+delivery_lock = threading.Lock()  # One thread delivers at a time, so listeners hear changes in publish order
+_delivery = threading.local()
+delivered_version = None  # Library version of the change the listeners are being told about
+
+
+def publish(key, field, old, new):
+    """Queue a change for the listeners. Called with write_lock held, right after its snapshot is published."""
+    undelivered.append((library.version, key, field, old, new))
+
+
+def deliver():
+    """
+    Call every listener with each queued change, oldest first. Writers call this after releasing
+    write_lock; while another thread is delivering it waits, so a writer's own change has been
+    delivered when it returns. A change made by a listener is delivered by the loop already running.
+    """
+    global delivered_version
+    if getattr(_delivery, "active", False):
+        return
+    with delivery_lock:
+        _delivery.active = True
+        try:
+            while undelivered:
+                delivered_version, key, field, old, new = undelivered.popleft()
+                for callback in list(listeners):
+                    try:
+                        callback(key, field, old, new)
+                    except Exception:
+                        traceback.print_exc()  # The change is already published; the other listeners still hear of it
+        finally:
+            _delivery.active = False
+
+
+def item_from_record(value):
+    """Build a library item from its record in library.json or a shard."""
+    item = LibraryItem(value["title"], value["artist"], value["rating"])
+    item.play_count = value.get("play_count", 0)
+    return item
+
+
+def record_of(item):
+    """The record stored for a library item in library.json or a shard."""
+    return {"title": item.name, "artist": item.artist, "rating": item.rating, "play_count": item.play_count}
 
 
 def load_library_from_json(file_path=None):
@@ -23,7 +97,7 @@ def load_library_from_json(file_path=None):
     Load the library data from a JSON file.
     :param file_path: Optional file path for the library JSON file. If not provided, uses default paths.
     """
-    global library
+    global library, library_source
     # Default relative path
     default_file_path = os.path.join(os.path.dirname(__file__), "library.json")
     # Fallback to the absolute path
@@ -38,13 +112,106 @@ def load_library_from_json(file_path=None):
         raise FileNotFoundError("JSON file not found in the provided, default, or fallback locations.")
 
     # Load data from the chosen file
-    with open(chosen_path, 'r') as file:
-        data = json.load(file)
+    with open(chosen_path, 'rb') as file:
+        content = file.read()
+    data = json.loads(content)
     
-    # Populate the library dictionary
-    library.clear()
-    for key, value in data.items():
-        library[key] = LibraryItem(value["title"], value["artist"], value["rating"])
+    # Build the new library on the side and publish it in one step
+    items = [(key, item_from_record(value)) for key, value in data.items()]
+    with write_lock:
+        library = LibrarySnapshot.from_items(items, library.version + 1)
+        library_source = (chosen_path, library, index_cache.content_hash(content))  # The bytes parsed, not the file later
+        publish(None, "reload", None, None)
+    deliver()
+
+
+def clear_library():
+    """Replace the library with an empty one."""
+    global library
+    with write_lock:
+        library = LibrarySnapshot(version=library.version + 1)
+        publish(None, "reload", None, None)
+    deliver()
+
+
+def snapshot():
+    """Return the current library version, which stays the same however the library changes later."""
+    return library
+
+
+def save_library_to_json(file_path=None):
+    """
+    Write the whole library to a JSON file in one go.
+    :param file_path: Optional file path for the library JSON file. Defaults to library.json next to this module.
+    """
+    chosen_path = file_path or os.path.join(os.path.dirname(__file__), "library.json")
+    data = {key: record_of(item) for key, item in snapshot().items()}
+    # Write to a temporary file first so an interrupted save never leaves a truncated library
+    temporary_path = chosen_path + ".tmp"
+    with open(temporary_path, 'w') as file:
+        json.dump(data, file, indent=4)
+    os.replace(temporary_path, chosen_path)
+
+
+def load_library_from_shards(directory, max_loaded=library_shards.MAX_LOADED_TRACKS):
+    """
+    Open a library stored as shards (see library_shards.write_shards) without reading any tracks yet.
+    Each shard is read the first time a track in its key range is looked up, and at most
+    max_loaded tracks of unchanged shards are kept in memory.
+    """
+    global library
+    store = library_shards.ShardStore(directory, item_from_record, record_of, max_loaded)
+    with write_lock:
+        library = library_shards.ShardedSnapshot(store, version=library.version + 1)
+        publish(None, "reload", None, None)
+    deliver()
+
+
+def save_library_to_shards(directory=None):
+    """
+    Save the library as shards.
+    :param directory: Where to split the current library into new shards. If not provided, the
+        library must have been loaded from shards, and only the shards with changes are rewritten.
+    """
+    global library
+    with write_lock:
+        if directory is not None:
+            library_shards.write_shards(directory, ((key, record_of(item)) for key, item in library.items()))
+        elif isinstance(library, library_shards.ShardedSnapshot):
+            library = library.save()
+        else:
+            raise ValueError("The library was not loaded from shards; give a directory to save them in.")
+
+
+def merge_tracks(tracks):
+    """
+    Merge (key, title, artist) entries into the library in one batch.
+    A track already in the library under the same title and artist keeps its key and rating;
+    new tracks are added unrated. Listeners hear about the batch once, as a reload.
+    :return: (added, updated) counts.
+    """
+    global library
+    with write_lock:
+        # Index the existing tracks once so each entry is matched with dict lookups
+        keys_by_track = {(item.name.lower(), item.artist.lower()): key for key, item in library.items()}
+        changes = {}
+        added = updated = 0
+        for key, title, artist in tracks:
+            existing = key if key in library or key in changes else keys_by_track.get((title.lower(), artist.lower()))
+            if existing is None:
+                changes[key] = LibraryItem(title, artist, 0)
+                keys_by_track[(title.lower(), artist.lower())] = key
+                added += 1
+            else:
+                item = changes.get(existing) or library[existing]
+                if (item.name, item.artist) != (title, artist):
+                    changes[existing] = replace_item(item, name=title, artist=artist)
+                    updated += 1
+        if changes:
+            library = library.update(changes)  # Published as one new version
+            publish(None, "reload", None, None)
+    deliver()
+    return added, updated
 
 def list_all():
     """List all items in the library."""
@@ -83,11 +250,44 @@ def get_rating(key):
 
 def set_rating(key, rating):
     """Set a new rating for a track."""
-    try:
-        item = library[key]
-        item.rating = rating
-    except KeyError:
-        pass
+    global library
+    with write_lock:
+        try:
+            item = library[key]
+        except KeyError:
+            return
+        library = library.set(key, replace_item(item, rating=rating))
+        publish(key, "rating", item.rating, rating)
+    deliver()
+
+
+def update_tracks(changes):
+    """
+    Change the titles, artists and ratings of many tracks in one batch.
+    :param changes: Dict of key -> {attribute: new value}, with attributes "name", "artist" or "rating".
+    Listeners hear about every value that changed, as they do from set_rating.
+    :return: (updated, missing): the number of tracks changed and the keys not in the library.
+    """
+    global library
+    missing = []
+    changed = []  # (key, field, old, new) of every value that changed
+    with write_lock:
+        items = {}
+        for key, values in changes.items():
+            item = library.get(key)
+            if item is None:
+                missing.append(key)
+                continue
+            values = {field: value for field, value in values.items() if getattr(item, field) != value}
+            if values:
+                items[key] = replace_item(item, **values)
+                changed.extend((key, field, getattr(item, field), value) for field, value in values.items())
+        if items:
+            library = library.update(items)  # Published as one new version
+            for change in changed:
+                publish(*change)
+    deliver()
+    return len(items), missing
 
 
 def get_play_count(key):
@@ -101,8 +301,12 @@ def get_play_count(key):
 
 def increment_play_count(key):
     """Increment the play count of a track."""
-    try:
-        item = library[key]
-        item.play_count += 1
-    except KeyError:
-        pass
+    global library
+    with write_lock:
+        try:
+            item = library[key]
+        except KeyError:
+            return
+        library = library.set(key, replace_item(item, play_count=item.play_count + 1))
+        publish(key, "play_count", item.play_count, item.play_count + 1)
+    deliver()
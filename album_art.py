@@ -0,0 +1,131 @@
+import collections
+import hashlib
+import io
+import os
+
+from mutagen import MutagenError
+from mutagen.id3 import ID3
+from PIL import Image
+
+import media_cache
+
+COVER_SIZE = 120  # Thumbnails fit in a square this many pixels wide
+MAX_IMAGES = 64  # Thumbnails kept as Tk images; each costs about COVER_SIZE² * 4 bytes
+FRONT_COVER = 3  # APIC picture type of the front cover
+_UNKNOWN = object()  # A file whose cover has not been looked up yet
+
+
+def read_cover(path):
+    """Return the image data of an MP3 file's embedded cover, preferring the front cover, or None."""
+    try:
+        pictures = ID3(path).getall("APIC")
+    except (MutagenError, OSError):
+        return None  # No ID3 tag, or the file cannot be read
+    if not pictures:
+        return None
+    front = [picture for picture in pictures if picture.type == FRONT_COVER]
+    return (front or pictures)[0].data
+
+
+def thumbnail_path(digest, size):
+    """Cache file for a thumbnail, named by the hash of the cover it was made from."""
+    return media_cache.cache_path("covers", f"{digest}-{size}", ".png")
+
+
+def load_thumbnail(path, size=COVER_SIZE):
+    """
+    Return (path, digest, ppm) for the cover of an MP3 file, or (path, None, None) if it has none.
+    Runs in a decode_pool() worker. Thumbnails are cached by the hash of the cover's data, so
+    the tracks of an album share one file; ppm is the thumbnail in a format Tk reads without
+    decompressing, so creating the Tk image on the GUI thread is cheap.
+    """
+    data = read_cover(path)
+    if data is None:
+        return path, None, None
+    digest = hashlib.sha1(data).hexdigest()
+    cache_file = thumbnail_path(digest, size)
+    try:
+        image = Image.open(cache_file)
+        image.load()
+    except OSError:
+        try:
+            image = Image.open(io.BytesIO(data))
+            image.thumbnail((size, size))
+            image = image.convert("RGB")
+        except (OSError, ValueError):
+            return path, None, None  # Not an image PIL can read
+        media_cache.write_atomically(cache_file, lambda file: image.save(file, "PNG"))
+    ppm = io.BytesIO()
+    image.convert("RGB").save(ppm, "PPM")
+    return path, digest, ppm.getvalue()
+
+
+class CoverArt:
+    """
+    Cover thumbnails of songs for the GUI. Looking a cover up never waits: get() returns
+    the Tk image when it is ready and otherwise queues load_thumbnail in a worker pool,
+    and poll() turns finished jobs into images. Images are kept in an LRU of at most
+    max_images, shared by the songs of an album; an evicted image is loaded again from
+    the disk cache when next needed. Use from the Tk thread only.
+    """
+    def __init__(self, submit, make_image, max_images=MAX_IMAGES, size=COVER_SIZE):
+        self.submit = submit  # submit(function, *args) -> Future, e.g. a process pool's submit
+        self.make_image = make_image  # PPM data -> Tk image
+        self.max_images = max_images
+        self.size = size
+        self.digests = {}  # Song path -> cover digest, or None for songs without a cover
+        self.images = collections.OrderedDict()  # Cover digest -> Tk image, least recently used first
+        self.jobs = {}  # Song path -> Future of its load_thumbnail job
+
+    def get(self, path):
+        """The Tk image of a song's cover, or None if it has no cover or it is still loading."""
+        digest = self.digests.get(path, _UNKNOWN)
+        if digest is None:
+            return None
+        image = self.images.get(digest)
+        if image is not None:
+            self.images.move_to_end(digest)
+            return image
+        if path not in self.jobs:
+            self.jobs[path] = self.submit(load_thumbnail, path, self.size)
+        return None
+
+    def keep_only(self, paths):
+        """Cancel the queued jobs of songs other than the given ones, e.g. rows the pointer has left."""
+        for path, job in list(self.jobs.items()):
+            if path not in paths and job.cancel():
+                del self.jobs[path]
+
+    def poll(self):
+        """Store the finished jobs' images and return the paths of their songs."""
+        finished = [path for path, job in self.jobs.items() if job.done()]
+        for path in finished:
+            job = self.jobs.pop(path)
+            if job.cancelled() or job.exception() is not None:
+                self.digests[path] = None  # Shown without a cover rather than retried on every hover
+                continue
+            _, digest, ppm = job.result()
+            self.digests[path] = digest
+            if digest is not None and digest not in self.images:
+                self.images[digest] = self.make_image(ppm)
+                while len(self.images) > self.max_images:
+                    self.images.popitem(last=False)
+        return finished
+
+    def forget(self, paths):
+        """Drop what is known about songs that were removed or renamed."""
+        for path in paths:
+            self.digests.pop(path, None)
+            job = self.jobs.pop(path, None)
+            if job is not None:
+                job.cancel()
+
+
+if __name__ == "__main__":
+    import sys
+    # Usage: python album_art.py [music folder]
+    folder = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(os.path.abspath(__file__)), "MusicPlayer")
+    for name in sorted(os.listdir(folder)):
+        if name.lower().endswith(".mp3"):
+            _, digest, ppm = load_thumbnail(os.path.join(folder, name))
+            print(f"{name}: {'cover ' + digest[:12] if digest else 'no cover'}")
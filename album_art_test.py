@@ -0,0 +1,69 @@
+import io
+from concurrent.futures import Future
+
+import pytest
+from mutagen.id3 import APIC, ID3
+from PIL import Image
+
+import album_art
+import media_cache
+
+
+def cover_bytes(color, size=(300, 200)):
+    image = io.BytesIO()
+    Image.new("RGB", size, color).save(image, "JPEG")
+    return image.getvalue()
+
+
+def song_with_cover(path, data):
+    """Write a stand-in MP3: an ID3 tag with a front cover and a few bytes of 'audio'."""
+    path.write_bytes(b"\xff\xfb" * 64)
+    tag = ID3()
+    tag.add(APIC(encoding=3, mime="image/jpeg", type=album_art.FRONT_COVER, desc="", data=data))
+    tag.save(str(path))
+    return str(path)
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(media_cache, "CACHE_DIR", str(tmp_path / "cache"))
+    return tmp_path / "cache"
+
+
+def run_now(function, *args):
+    """Stand-in for a pool's submit that runs the job straight away."""
+    future = Future()
+    future.set_result(function(*args))
+    return future
+
+
+def test_load_thumbnail_caches_by_content(tmp_path, cache_dir):
+    """Test that two songs with the same cover share one cached thumbnail of the right size."""
+    data = cover_bytes("red")
+    first = album_art.load_thumbnail(song_with_cover(tmp_path / "a.mp3", data), size=60)
+    second = album_art.load_thumbnail(song_with_cover(tmp_path / "b.mp3", data), size=60)
+    assert first[1] == second[1] and first[2] == second[2]
+    assert len(list(cache_dir.rglob("*.png"))) == 1
+    assert Image.open(io.BytesIO(first[2])).size == (60, 40)
+
+
+def test_load_thumbnail_without_cover(tmp_path, cache_dir):
+    """Test that files without a tag or a cover report no cover."""
+    path = tmp_path / "plain.mp3"
+    path.write_bytes(b"\xff\xfb" * 64)
+    assert album_art.load_thumbnail(str(path)) == (str(path), None, None)
+
+
+def test_cover_art_lru(tmp_path, cache_dir):
+    """Test that covers are loaded on request, shared by digest and evicted least recently used first."""
+    covers = album_art.CoverArt(run_now, make_image=lambda ppm: ppm, max_images=2, size=30)
+    paths = [song_with_cover(tmp_path / f"{color}.mp3", cover_bytes(color)) for color in ("red", "green", "blue")]
+    assert covers.get(paths[0]) is None  # Queued, not ready yet
+    assert covers.poll() == [paths[0]]
+    assert covers.get(paths[0]) is not None
+    for path in paths[1:]:
+        covers.get(path)
+    covers.poll()
+    assert len(covers.images) == 2
+    assert covers.digests[paths[0]] not in covers.images  # Evicted; a later get() loads it again
+    assert covers.get(paths[0]) is None and paths[0] in covers.jobs
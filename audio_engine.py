@@ -0,0 +1,341 @@
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+import pygame
+
+from dsp_chain import Crossfader, DspChain
+
+# Output format shared by the decoder process and the mixer
+SAMPLE_RATE = 44100
+CHANNELS = 2
+BLOCK_FRAMES = 2048  # Frames per ring block, about 46 ms
+RING_BLOCKS = 16  # Blocks decoded ahead of playback, about 0.75 s
+BLOCK_SECONDS = BLOCK_FRAMES / SAMPLE_RATE
+META_FIELDS = 3  # Per block: generation, frame count, last-block flag
+HOLD_SECONDS = 0.4  # How long a song's last seconds wait for the next song to crossfade into them
+
+
+def init_decoder():
+    """Prepare the current process to decode audio; no sound device is opened."""
+    os.environ["SDL_AUDIODRIVER"] = "dummy"
+    if not pygame.mixer.get_init():
+        pygame.mixer.init(frequency=SAMPLE_RATE, size=-16, channels=CHANNELS)
+
+
+def decode_file(path):
+    """
+    Decode an audio file into an int16 array of shape (frames, CHANNELS) at SAMPLE_RATE.
+    The process must have been prepared with init_decoder() or an open mixer.
+    """
+    return pygame.sndarray.array(pygame.mixer.Sound(path))
+
+
+class PcmRing:
+    """
+    Single-producer, single-consumer ring of PCM blocks in shared memory.
+    The producer fills a slot and then bumps the write counter; the consumer
+    copies a slot out and then bumps the read counter, so no lock is needed.
+    Every block carries the generation of the command that produced it, which
+    lets the consumer drop audio that a later load, seek or stop made stale.
+    """
+    def __init__(self, shm, counters, meta, owner=False):
+        self.shm = shm
+        self.blocks = np.ndarray((RING_BLOCKS, BLOCK_FRAMES, CHANNELS), dtype=np.int16, buffer=shm.buf)
+        self.counters = counters  # [blocks written, blocks read]
+        self.meta = meta  # META_FIELDS values per slot
+        self.owner = owner
+
+    @classmethod
+    def create(cls, ctx):
+        """Allocate a new ring; the creating process is responsible for unlinking it."""
+        shm = shared_memory.SharedMemory(create=True, size=RING_BLOCKS * BLOCK_FRAMES * CHANNELS * 2)
+        return cls(shm, ctx.RawArray("q", 2), ctx.RawArray("q", RING_BLOCKS * META_FIELDS), owner=True)
+
+    @classmethod
+    def attach(cls, name, counters, meta):
+        """Open a ring created by another process from its handle()."""
+        return cls(shared_memory.SharedMemory(name=name), counters, meta)
+
+    def handle(self):
+        """Picklable description of the ring for attach() in a child process."""
+        return self.shm.name, self.counters, self.meta
+
+    def space(self):
+        """Number of free slots."""
+        return RING_BLOCKS - (self.counters[0] - self.counters[1])
+
+    def write(self, frames, generation, last):
+        """Copy up to BLOCK_FRAMES frames into the next free slot. Producer only."""
+        slot = self.counters[0] % RING_BLOCKS
+        count = len(frames)
+        self.blocks[slot, :count] = frames
+        self.meta[slot * META_FIELDS:(slot + 1) * META_FIELDS] = [generation, count, int(last)]
+        self.counters[0] += 1  # Publish only once the slot is complete
+
+    def read(self, out):
+        """
+        Copy the oldest block into out, a (BLOCK_FRAMES, CHANNELS) int16 buffer, and return
+        (frames, generation, last) with frames a view of out, or None if empty. Consumer only.
+        """
+        if self.counters[0] == self.counters[1]:
+            return None
+        slot = self.counters[1] % RING_BLOCKS
+        generation, count, last = self.meta[slot * META_FIELDS:(slot + 1) * META_FIELDS]
+        frames = out[:count]
+        frames[:] = self.blocks[slot, :count]
+        self.counters[1] += 1
+        return frames, generation, bool(last)
+
+    def close(self):
+        self.blocks = None  # Drop the view before the buffer goes away
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+def decoder_main(commands, events, ring_handle):
+    """
+    Body of the decoder process. Loads and decodes files on command and streams
+    the PCM into the ring as space becomes free.
+    Commands are tuples (name, generation, *args) with name "load" (path, start
+    seconds, crossfade seconds), "seek" (seconds), "stop" or "quit". Events sent back are
+    ("loaded", generation, path, length seconds), ("error", generation, path, message)
+    and ("ending", generation, seconds left).
+    With a crossfade, the last crossfade seconds of a song are held back for up to
+    HOLD_SECONDS after "ending" is sent. A load with a crossfade that arrives while part
+    of the previous song is still unwritten fades that part out under the new song.
+    """
+    init_decoder()
+    ring = PcmRing.attach(*ring_handle)
+    samples = None  # Decoded frames of the current file
+    position = 0  # Next frame to write
+    writing = False  # True while frames of the current file remain to be written
+    generation = 0
+    crossfade_frames = 0
+    tail = None  # Frame where the current song's crossfade would start, until "ending" is sent
+    holding_until = None  # Monotonic time until which the tail waits for the next song
+    fader = None  # Fades the previous song out under the start of the current one
+
+    while True:
+        try:
+            if not writing:
+                command = commands.get()  # Nothing to do until told otherwise
+            elif holding_until is not None:
+                command = commands.get(timeout=max(holding_until - time.monotonic(), 0))
+            elif ring.space() == 0:
+                command = commands.get(timeout=BLOCK_SECONDS / 4)  # Wait for the consumer, but stay responsive
+            else:
+                command = commands.get_nowait()
+        except queue.Empty:
+            command = None
+            if holding_until is not None and time.monotonic() >= holding_until:
+                holding_until = None  # No next song came, so the tail plays on its own
+
+        if command is not None:
+            name, generation, *args = command
+            holding_until = None
+            if name == "quit":
+                break
+            if name == "load":
+                path, start, crossfade = args
+                outgoing = samples[position:] if crossfade and writing else None
+                try:
+                    samples = decode_file(path)
+                except Exception as error:  # Any file the decoder cannot handle must not end the process
+                    samples = None
+                    writing = False
+                    fader = None
+                    events.put(("error", generation, path, str(error)))
+                    continue
+                crossfade_frames = int(crossfade * SAMPLE_RATE)
+                fader = Crossfader(outgoing, crossfade_frames, BLOCK_FRAMES, CHANNELS) if outgoing is not None else None
+                position = min(int(start * SAMPLE_RATE), len(samples))
+                writing = True
+                events.put(("loaded", generation, path, len(samples) / SAMPLE_RATE))
+            elif name == "seek" and samples is not None:
+                position = min(int(args[0] * SAMPLE_RATE), len(samples))
+                writing = True
+                fader = None
+            elif name == "stop":
+                writing = False
+                fader = None
+            if samples is not None:
+                tail = len(samples) - crossfade_frames
+                tail = tail if crossfade_frames and tail > position else None
+            continue  # Handle any further queued commands before writing
+
+        if writing and holding_until is None and ring.space() > 0:
+            end = min(position + BLOCK_FRAMES, len(samples))
+            if tail is not None:
+                end = min(end, tail)
+            if end > position:
+                frames = samples[position:end]
+                if fader is not None:
+                    frames = fader.mix(frames)
+                    fader = None if fader.done else fader
+                ring.write(frames, generation, end == len(samples))
+                position = end
+                writing = end < len(samples)
+            if tail is not None and position >= tail:
+                tail = None
+                holding_until = time.monotonic() + HOLD_SECONDS
+                events.put(("ending", generation, (len(samples) - position) / SAMPLE_RATE))
+
+    ring.close()
+
+
+class AudioEngine:
+    """
+    Plays audio files with decoding done in a separate process.
+    The GUI thread only sends commands; a decoder process turns files into PCM
+    blocks in a shared ring buffer, crossfading between songs, and an output thread
+    runs those blocks through the EQ and volume of a DspChain and feeds them to a
+    pygame mixer channel. Results come back through poll().
+    """
+    def __init__(self):
+        pygame.mixer.init(frequency=SAMPLE_RATE, size=-16, channels=CHANNELS)
+        pygame.mixer.set_reserved(1)
+        self.channel = pygame.mixer.Channel(0)
+        self.dsp = DspChain(SAMPLE_RATE, BLOCK_FRAMES, CHANNELS)
+        self.block = np.zeros((BLOCK_FRAMES, CHANNELS), dtype=np.int16)  # Ring blocks are copied out into this
+
+        # Spawn rather than fork, so the decoder never inherits this process's audio device
+        self.ctx = multiprocessing.get_context("spawn")
+        self.ring = PcmRing.create(self.ctx)
+        self.start_decoder()
+
+        self.generation = 0  # Generation of the latest command; events of older ones are dropped
+        self.audible = 0  # Oldest generation whose audio may still play; raised by every command but a crossfade
+        self.processed_audible = 0  # Value of audible when the EQ was last reset
+        self.paused = False
+        self.running = True
+        self.lock = threading.Lock()  # Orders channel changes between the GUI and output threads
+        self.output_events = queue.Queue()  # "ended" events raised by the output thread
+        self.thread = threading.Thread(target=self.output_loop, daemon=True)
+        self.thread.start()
+
+    def start_decoder(self):
+        """Start a decoder process with fresh command and event queues."""
+        self.commands = self.ctx.Queue()
+        self.events = self.ctx.Queue()
+        self.process = self.ctx.Process(
+            target=decoder_main, args=(self.commands, self.events, self.ring.handle()), daemon=True
+        )
+        self.process.start()
+
+    def send(self, name, *args):
+        with self.lock:
+            self.generation += 1
+            self.audible = self.generation
+            self.channel.stop()
+            self.commands.put((name, self.generation, *args))
+
+    def load(self, path, start=0.0, crossfade=0.0):
+        """
+        Start playing a file from start seconds once it is decoded.
+        With a crossfade, the song playing now fades out over that many seconds under the
+        new one instead of stopping, and the new song raises "ending" that long before its end.
+        """
+        if crossfade and not self.paused:
+            with self.lock:
+                self.generation += 1  # Audio already queued keeps playing, so audible stays as it is
+                self.commands.put(("load", self.generation, path, start, crossfade))
+            return
+        self.paused = False
+        self.send("load", path, start, crossfade)
+
+    def seek(self, seconds):
+        """Continue the current file from a new position."""
+        self.send("seek", seconds)
+
+    def stop(self):
+        self.paused = False
+        self.send("stop")
+
+    def pause(self):
+        self.paused = True
+        self.channel.pause()
+
+    def resume(self):
+        self.paused = False
+        self.channel.unpause()
+
+    def set_volume(self, volume):
+        """Set the output volume from 0.0 to 1.0; it ramps to the new level over the next block."""
+        self.dsp.volume.set_volume(volume)
+
+    def set_eq(self, gains_db):
+        """Set the EQ band gains in dB, one per dsp_chain.EQ_BANDS; all zero turns the EQ off."""
+        self.dsp.equalizer.set_gains(gains_db)
+
+    def poll(self):
+        """
+        Return the events raised since the last call that belong to the latest command:
+        ("loaded", generation, path, length), ("error", generation, path, message),
+        ("ending", generation, seconds left) or ("ended", generation).
+        If the decoder process has died, an ("error", generation, None, message) event is
+        returned and a new decoder is started, so the next load works again.
+        """
+        found = []
+        if self.running and not self.process.is_alive():
+            found.append(("error", self.generation, None,
+                          f"The audio decoder stopped unexpectedly (exit code {self.process.exitcode})"))
+            with self.lock:
+                self.start_decoder()
+        for source in (self.events, self.output_events):
+            while True:
+                try:
+                    event = source.get_nowait()
+                except queue.Empty:
+                    break
+                if event[1] == self.generation:
+                    found.append(event)
+        return found
+
+    def output_loop(self):
+        """Move blocks from the ring to the mixer channel, keeping one block queued."""
+        ending = None  # Generation whose last block has been handed to the channel
+        while self.running:
+            if self.paused or self.channel.get_queue() is not None:
+                time.sleep(BLOCK_SECONDS / 4)
+                continue
+            block = self.ring.read(self.block)
+            if block is None:
+                if ending is not None and not self.channel.get_busy():
+                    self.output_events.put(("ended", ending))
+                    ending = None
+                time.sleep(BLOCK_SECONDS / 4)
+                continue
+
+            frames, generation, last = block
+            if generation < self.audible:
+                continue  # Stale audio from before a load, seek or stop
+            if self.processed_audible != self.audible:
+                self.dsp.reset()  # Do not let the EQ carry audio from before the jump into the new block
+                self.processed_audible = self.audible
+            sound = pygame.sndarray.make_sound(self.dsp.process(frames))
+            with self.lock:
+                if generation < self.audible:
+                    continue  # A command arrived while the block was being processed
+                if self.channel.get_busy():
+                    self.channel.queue(sound)
+                else:
+                    self.channel.play(sound)
+            if last:
+                ending = generation
+
+    def close(self):
+        """Stop the output thread and the decoder process and free the ring."""
+        self.running = False
+        self.commands.put(("quit", 0))
+        self.thread.join(timeout=1)
+        self.process.join(timeout=1)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.channel.stop()
+        self.ring.close()
@@ -0,0 +1,79 @@
+import multiprocessing
+import queue
+
+import numpy as np
+import pygame
+import pytest
+
+import audio_engine
+from audio_engine import BLOCK_FRAMES, CHANNELS, RING_BLOCKS, PcmRing
+
+
+@pytest.fixture
+def ring():
+    pcm_ring = PcmRing.create(multiprocessing.get_context("spawn"))
+    yield pcm_ring
+    pcm_ring.close()
+
+
+def block(value, frames=BLOCK_FRAMES):
+    return np.full((frames, CHANNELS), value, dtype=np.int16)
+
+
+def test_ring_keeps_blocks_in_order_across_the_wrap(ring):
+    """Test that blocks come out in the order written, with their metadata, after the slots wrap round."""
+    out = np.zeros((BLOCK_FRAMES, CHANNELS), dtype=np.int16)
+    assert ring.read(out) is None
+    for value in range(RING_BLOCKS):
+        ring.write(block(value), generation=1, last=False)
+    assert ring.space() == 0
+    for value in range(3):
+        frames, generation, last = ring.read(out)
+        assert (frames == value).all() and generation == 1 and not last
+    for value in range(RING_BLOCKS, RING_BLOCKS + 3):  # Into the slots just read
+        ring.write(block(value, frames=100 if value == RING_BLOCKS + 2 else BLOCK_FRAMES), 2, value == RING_BLOCKS + 2)
+    assert ring.space() == 0
+    values = []
+    while (result := ring.read(out)) is not None:
+        frames, generation, last = result
+        values.append((int(frames[0, 0]), len(frames), generation, last))
+    assert values[:RING_BLOCKS - 3] == [(value, BLOCK_FRAMES, 1, False) for value in range(3, RING_BLOCKS)]
+    assert values[RING_BLOCKS - 3:] == [(RING_BLOCKS, BLOCK_FRAMES, 2, False), (RING_BLOCKS + 1, BLOCK_FRAMES, 2, False),
+                                        (RING_BLOCKS + 2, 100, 2, True)]
+    assert ring.space() == RING_BLOCKS
+
+
+def test_decoder_reports_any_decode_failure(ring, monkeypatch):
+    """Test that an unexpected exception from decoding is sent as an error event and the decoder keeps going."""
+    def decode_file(path):
+        if path == "broken.mp3":
+            raise ValueError("unsupported sample format")
+        return block(7, frames=10)
+
+    monkeypatch.setattr(audio_engine, "init_decoder", lambda: None)
+    monkeypatch.setattr(audio_engine, "decode_file", decode_file)
+    commands, events = queue.Queue(), queue.Queue()
+    for command in (("load", 1, "broken.mp3", 0.0, 0.0), ("load", 2, "good.mp3", 0.0, 0.0), ("quit", 0)):
+        commands.put(command)
+    audio_engine.decoder_main(commands, events, ring.handle())
+    assert events.get_nowait() == ("error", 1, "broken.mp3", "unsupported sample format")
+    assert events.get_nowait() == ("loaded", 2, "good.mp3", 10 / audio_engine.SAMPLE_RATE)
+
+
+def test_poll_reports_a_dead_decoder_and_restarts_it(monkeypatch):
+    """Test that poll() turns a decoder process that died into an error event and starts a new one."""
+    monkeypatch.setenv("SDL_AUDIODRIVER", "dummy")
+    try:
+        engine = audio_engine.AudioEngine()
+    except pygame.error as error:
+        pytest.skip(f"No audio output: {error}")
+    try:
+        engine.process.terminate()
+        engine.process.join()
+        events = engine.poll()
+        assert len(events) == 1 and events[0][0] == "error" and events[0][1:3] == (engine.generation, None)
+        assert engine.process.is_alive()
+        assert engine.poll() == []
+    finally:
+        engine.close()
+        pygame.mixer.quit()
@@ -1,6 +1,13 @@
 import tkinter as tk
 import tkinter.scrolledtext as tkst
+from tkinter import filedialog
 import track_library as lib  # Use the functions from the original track_library.py
+from playlist import Playlist  # Ordered playlist model with O(1) membership checks
+from playlist_view import PlaylistView  # Row-by-row playlist rendering in a text area
+import playlist_io  # Streaming M3U and JSON lines playlist files
+import play_history  # Log of when each track was played
+import recommender  # Learns which tracks go together from played and saved playlists
+import tk_watchdog  # Optional tracing of slow handlers, enabled with TK_WATCHDOG_TRACE
 
 class CreateTrackList:
     def __init__(self, window):
@@ -14,7 +21,8 @@ class CreateTrackList:
         self.window.title("Create Track List")
 
         # Initialize playlist
-        self.playlist = []
+        self.playlist = Playlist()
+        self.playlist_load = None # Playlist file still being read in chunks, cancelled by a reset or another load
 
         # Entry for track number
         tk.Label(self.window, text="Enter Track Number:").grid(row=0, column=0, padx=10, pady=10)
@@ -26,9 +34,21 @@ class CreateTrackList:
         tk.Button(self.window, text="Play Playlist", command=self.play_playlist).grid(row=1, column=0, padx=10, pady=10)
         tk.Button(self.window, text="Reset Playlist", command=self.reset_playlist).grid(row=1, column=1, padx=10, pady=10)
 
+        # Buttons for saving the playlist to and loading it from M3U or JSON lines files
+        file_frame = tk.Frame(self.window)
+        file_frame.grid(row=1, column=2, padx=10, pady=10)
+        tk.Button(file_frame, text="Save Playlist", command=self.save_playlist).pack(side=tk.LEFT, padx=5)
+        tk.Button(file_frame, text="Load Playlist", command=self.load_playlist).pack(side=tk.LEFT, padx=5)
+
         # Scrolled text area to display the playlist
         self.text_area = tkst.ScrolledText(self.window, width=85, height=15)
         self.text_area.grid(row=2, column=0, columnspan=3, padx=10, pady=10)
+        # Renders the playlist into the text area, redrawing only rows that change
+        self.playlist_view = PlaylistView(self.text_area, lib)
+
+        # Every play is also logged with its time
+        self.history = play_history.shared_history()
+        self.recommender = recommender.shared_recommender()
 
     def add_track(self):
         """
@@ -39,13 +59,17 @@ class CreateTrackList:
             self.display_message("Error: Track number cannot be empty.")
             return
         
-        track_name = lib.get_name(track_number)
+        self.track_found(track_number, lib.get_name(track_number)) # A dictionary lookup, quick enough for the Tk thread
 
+    def track_found(self, track_number, track_name):
+        """
+        Adds a track to the playlist, or reports that it does not exist.
+        """
         # Check if the track exists
         if track_name is not None:
-            self.playlist.append(track_number) # Add track to the playlist
+            self.playlist.add(track_number) # Add track to the playlist
             self.display_message(f"Track added: {track_name}")
-            self.update_playlist_display() # Update the display to show the new playlist
+            self.playlist_view.append([track_number]) # Append only the new row to the display
         else:
             self.display_message("Error: Invalid track number.")
 
@@ -57,57 +81,122 @@ class CreateTrackList:
             self.display_message("Error: Playlist is empty. Add tracks first.")
             return
 
+        self.play_tracks([(track_number, lib.get_name(track_number) is not None) for track_number in self.playlist])
+
+    def play_tracks(self, tracks):
+        """
+        Increments the play counts of the tracks that exist and reports the result.
+        tracks (list): (track number, exists) pairs for the playlist.
+        """
         # Keep track of the number of tracks successfully played
         tracks_played = 0
+        played = []
 
-        for track_number in self.playlist:
+        for track_number, exists in tracks:
             # Check if the track exists before incrementing play count
-            if lib.get_name(track_number) is not None:
+            if exists:
                 lib.increment_play_count(track_number) # Increment the play count
+                played.append(track_number)
                 tracks_played += 1
             else:
                 self.display_message(f"Warning: Track {track_number} does not exist and was skipped.")
 
+        self.history.record_many(played) # Log the run with one timestamp
+        self.recommender.add_playlist(played) # The playlist's tracks belong together
+
         if tracks_played > 0:
             self.display_message(f"{tracks_played} track(s) played successfully.")
         else:
             self.display_message("No valid tracks found to play.")
-        self.update_playlist_display()  # Update the display to reflect the new play counts
+        # The view redraws the rows of the played tracks itself, once the event loop is idle
 
     def reset_playlist(self):
         """
         Clears the playlist and resets the display.
         """
+        self.cancel_playlist_load() # A file still loading must not refill the playlist
         self.playlist.clear() # Empty the playlist
+        self.playlist_view.clear() # Remove the playlist rows from the display
         self.display_message("Playlist reset.")
-        self.update_playlist_display() # Update the display to show the empty playlist
 
 
-    def update_playlist_display(self):
+    def save_playlist(self):
         """
-        Updates the text area to show the current playlist.
+        Writes the playlist to an M3U or JSON lines file chosen by the user.
         """
-        content = "Current Playlist:\n"
-        for track_number in self.playlist:
-            track_name = lib.get_name(track_number)
-            if track_name is not None:
-                artist = lib.get_artist(track_number)
-                rating = lib.get_rating(track_number)
-                play_count = lib.get_play_count(track_number)
-                content += f"{track_name} by {artist} - {rating} stars, Played {play_count} times\n"
-            else:
-                content += f"Track {track_number} not found.\n"
-        self.text_area.delete(1.0, tk.END) # Clear previous content
-        self.text_area.insert(tk.END, content) # Insert updated content
+        if not self.playlist: # Check if the playlist is empty
+            self.display_message("Error: Playlist is empty. Add tracks first.")
+            return
+
+        path = filedialog.asksaveasfilename(defaultextension=".m3u8", filetypes=playlist_io.PLAYLIST_FILETYPES)
+        if not path: # The user cancelled the dialog
+            return
+
+        # Entries are generated lazily and streamed to the file
+        entries = ((key, f"{lib.get_artist(key)} - {lib.get_name(key)}") for key in self.playlist)
+        try:
+            playlist_io.save_playlist(path, entries)
+            self.display_message(f"Playlist saved: {len(self.playlist)} track(s).")
+            self.recommender.add_playlist(self.playlist)
+        except OSError as error:
+            self.display_message(f"Error: Could not save playlist ({error}).")
+
+    def load_playlist(self):
+        """
+        Replaces the playlist with one read from an M3U or JSON lines file, chunk by chunk.
+        """
+        path = filedialog.askopenfilename(filetypes=playlist_io.PLAYLIST_FILETYPES)
+        if not path: # The user cancelled the dialog
+            return
+
+        entries = playlist_io.load_playlist(path) # Read lazily; errors reach on_playlist_error
+        self.cancel_playlist_load() # Only the newest file may add tracks
+        self.playlist.clear()
+        self.playlist_view.clear()
+        resolver = playlist_io.PlaylistResolver.for_library(lib) # Index the library once for lookups
+        self.playlist_load = playlist_io.load_progressively(
+            self.window, entries, resolver, self.on_playlist_chunk, self.on_playlist_loaded, self.on_playlist_error
+        )
+
+    def cancel_playlist_load(self):
+        """
+        Stops a playlist file that is still being loaded from adding more tracks.
+        """
+        if self.playlist_load is not None:
+            self.playlist_load.cancel()
+            self.playlist_load = None
+
+    def on_playlist_chunk(self, keys):
+        """
+        Adds a chunk of loaded tracks to the playlist and appends their rows to the display.
+        """
+        self.playlist.extend(keys)
+        self.playlist_view.append(keys)
+
+    def on_playlist_loaded(self, loaded, skipped):
+        """
+        Reports how many tracks were loaded once the whole file has been read.
+        """
+        self.display_message(f"Playlist loaded: {loaded} track(s), {skipped} unknown entries skipped.")
+        self.recommender.add_playlist(self.playlist)
+
+    def on_playlist_error(self, error):
+        """
+        Reports a playlist file that could not be read; the tracks read before the error are kept.
+        """
+        self.display_message(f"Error: Could not load playlist ({error}). {len(self.playlist)} track(s) loaded.")
 
     def display_message(self, message):
         """
-        Displays a message in the text area.
+        Displays a message in the text area, above the playlist.
         """
-        self.text_area.insert(tk.END, f"{message}\n")
+        self.playlist_view.show_message(message)
 
 # Main code to run the application
 if __name__ == "__main__":
     window = tk.Tk()
+    watchdog = tk_watchdog.from_environment(window)  # Must start before the widgets register their callbacks
     app = CreateTrackList(window)
     window.mainloop()
+    if watchdog is not None:
+        watchdog.close()
@@ -0,0 +1,73 @@
+import tracemalloc
+
+import numpy as np
+
+from dsp_chain import Crossfader, DspChain, EQ_PRESETS
+
+RATE, FRAMES, CHANNELS = 44100, 1024, 2
+
+
+def tone(frequency, seconds, amplitude=8000):
+    t = np.arange(int(RATE * seconds)) / RATE
+    wave = (amplitude * np.sin(2 * np.pi * frequency * t)).astype(np.int16)
+    return np.repeat(wave[:, None], CHANNELS, axis=1)
+
+
+def run(chain, audio):
+    return np.concatenate([chain.process(audio[start:start + FRAMES]).copy()
+                           for start in range(0, len(audio), FRAMES)])
+
+
+def test_flat_chain_passes_audio_through():
+    audio = tone(440, 0.5)
+    assert np.array_equal(run(DspChain(RATE, FRAMES, CHANNELS), audio), audio)
+
+
+def test_bass_boost_raises_low_tones_only():
+    chain = DspChain(RATE, FRAMES, CHANNELS)
+    chain.equalizer.set_gains(EQ_PRESETS["Bass boost"])
+    delay = FRAMES // 2  # The linear-phase filter delays audio by half its length
+    for frequency, low, high in ((60, 5, 6.5), (8000, -0.5, 0.5)):
+        chain.reset()
+        audio = tone(frequency, 1.0, amplitude=4000)
+        output = run(chain, audio)[RATE // 4 + delay:].astype(float)
+        gain = 20 * np.log10(np.sqrt(np.mean(output ** 2)) / np.sqrt(np.mean(audio[RATE // 4:].astype(float) ** 2)))
+        assert low < gain < high
+
+
+def test_short_blocks_filter_like_full_ones():
+    """Test that splitting audio into blocks of other sizes, as before a crossfade, changes nothing."""
+    audio = tone(200, 0.5, amplitude=6000)
+    chain = DspChain(RATE, FRAMES, CHANNELS)
+    chain.equalizer.set_gains(EQ_PRESETS["Bass boost"])
+    expected = run(chain, audio)
+    chain.reset()
+    sizes = [FRAMES] * 5 + [300, FRAMES, 1, 700, FRAMES]
+    edges = np.cumsum([0] + sizes * (len(audio) // sum(sizes) + 1))
+    edges = edges[edges < len(audio)].tolist() + [len(audio)]
+    output = np.concatenate([chain.process(audio[start:end]).copy() for start, end in zip(edges[:-1], edges[1:])])
+    assert np.abs(output.astype(int) - expected).max() <= 1
+
+
+def test_processing_allocates_no_buffers():
+    chain = DspChain(RATE, FRAMES, CHANNELS)
+    chain.equalizer.set_gains(EQ_PRESETS["Loudness"])
+    block = tone(440, FRAMES / RATE)
+    chain.process(block)
+    tracemalloc.start()
+    for number in range(50):
+        chain.volume.set_volume(0.5 + 0.4 * (number % 2))
+        chain.process(block)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert peak < block.nbytes  # Only small Python objects, never a block-sized array
+
+
+def test_crossfade_keeps_power_and_ends_on_incoming():
+    outgoing = np.full((3000, CHANNELS), 10000, dtype=np.int16)
+    incoming = np.full((FRAMES, CHANNELS), 10000, dtype=np.int16)
+    fader = Crossfader(outgoing, 2048, FRAMES, CHANNELS)
+    mixed = np.concatenate([fader.mix(incoming).copy() for _ in range(3)])
+    assert fader.done
+    assert mixed[0, 0] == 10000 and mixed[1023, 0] > 10000  # Equal power: louder mid-fade for correlated audio
+    assert np.array_equal(mixed[2048:], incoming[:1024])
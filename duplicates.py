@@ -0,0 +1,150 @@
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+SAMPLE_BYTES = 16 * 1024  # Audio read from each end of a file for the quick comparison
+CHUNK_SIZE = 1024 * 1024  # Read size when hashing the whole audio
+MAX_WORKERS = 8  # Threads; file reads release the GIL, so they overlap
+ID3V1_SIZE = 128
+
+
+def audio_span(path):
+    """
+    Return the (start, end) byte offsets of the audio in an MP3 file, without the ID3v2 tag
+    at the start and the ID3v1 tag at the end. Reads 10 bytes at the start and 3 near the end.
+    """
+    with open(path, "rb") as file:
+        size = os.fstat(file.fileno()).st_size
+        start = 0
+        header = file.read(10)
+        if len(header) == 10 and header[:3] == b"ID3" and all(byte < 0x80 for byte in header[6:]):
+            # The tag size is stored in four 7-bit bytes and leaves out the 10-byte header
+            start = 10 + (header[6] << 21 | header[7] << 14 | header[8] << 7 | header[9])
+            if header[5] & 0x10:
+                start += 10  # Footer
+        end = size
+        if size - ID3V1_SIZE >= start:
+            file.seek(size - ID3V1_SIZE)
+            if file.read(3) == b"TAG":
+                end = size - ID3V1_SIZE
+    return min(start, end), end
+
+
+def hash_range(file, start, end):
+    """Hash bytes start to end of an open file in chunks."""
+    digest = hashlib.blake2b(digest_size=16)
+    file.seek(start)
+    remaining = end - start
+    while remaining > 0:
+        chunk = file.read(min(CHUNK_SIZE, remaining))
+        if not chunk:
+            break
+        digest.update(chunk)
+        remaining -= len(chunk)
+    return digest.digest()
+
+
+class AudioFile:
+    """What is known about one file, worked out only as far as the comparison needs."""
+    __slots__ = ("path", "stat", "start", "end", "sample", "payload")
+
+    def __init__(self, path, stat):
+        self.path = path
+        self.stat = stat  # (size, mtime_ns); the cached hashes are only valid while it matches
+        self.start, self.end = audio_span(path)
+        self.sample = None
+        self.payload = None
+
+    @property
+    def audio_size(self):
+        return self.end - self.start
+
+    def sample_hash(self):
+        """Hash of the first and last SAMPLE_BYTES of the audio, or of all of it if it is short."""
+        if self.sample is None:
+            with open(self.path, "rb") as file:
+                if self.audio_size <= 2 * SAMPLE_BYTES:
+                    self.sample = hash_range(file, self.start, self.end)
+                else:
+                    self.sample = hash_range(file, self.start, self.start + SAMPLE_BYTES) + \
+                        hash_range(file, self.end - SAMPLE_BYTES, self.end)
+        return self.sample
+
+    def payload_hash(self):
+        """Hash of all of the audio. Short files were already covered by the sample."""
+        if self.audio_size <= 2 * SAMPLE_BYTES:
+            return self.sample_hash()
+        if self.payload is None:
+            with open(self.path, "rb") as file:
+                self.payload = hash_range(file, self.start, self.end)
+        return self.payload
+
+
+class DuplicateFinder:
+    """
+    Finds files with identical audio in stages, each reading more of fewer files:
+    first the size of the audio without its tags, then a hash of a few kilobytes at
+    each end of the audio, and finally a hash of the whole audio, only for files that
+    matched on everything so far. Copies that differ only in their ID3 tags count as
+    duplicates. The reads run in a thread pool, and what was learnt about each file is
+    kept until the file changes, so later searches read nothing for unchanged files.
+    """
+    def __init__(self, max_workers=MAX_WORKERS):
+        self.max_workers = max_workers
+        self.files = {}  # Path -> AudioFile
+
+    def file(self, path):
+        """The AudioFile for a path, reusing what is known while the file is unchanged, or None if unreadable."""
+        try:
+            stat = os.stat(path)
+            known = self.files.get(path)
+            if known is not None and known.stat == (stat.st_size, stat.st_mtime_ns):
+                return known
+            known = self.files[path] = AudioFile(path, (stat.st_size, stat.st_mtime_ns))
+            return known
+        except OSError:
+            self.files.pop(path, None)
+            return None
+
+    def find(self, paths):
+        """
+        Return the groups of paths whose audio is identical, as lists of two or more paths
+        in the order they were given. Unreadable files are left out.
+        """
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="duplicates") as pool:
+            files = [file for file in pool.map(self.file, paths) if file is not None]
+            groups = split_groups([files], lambda file: file.audio_size)
+            for stage in (AudioFile.sample_hash, AudioFile.payload_hash):
+                candidates = [file for group in groups for file in group]
+                keys = dict(zip((file.path for file in candidates), pool.map(stage, candidates)))
+                groups = split_groups(groups, lambda file: keys[file.path])
+        return [[file.path for file in group] for group in groups]
+
+    def forget(self, paths):
+        """Drop what is known about files that were removed."""
+        for path in paths:
+            self.files.pop(path, None)
+
+
+def split_groups(groups, key):
+    """Split each group by key, keeping only the parts with more than one member, in order."""
+    result = []
+    for group in groups:
+        parts = {}
+        for member in group:
+            parts.setdefault(key(member), []).append(member)
+        result.extend(part for part in parts.values() if len(part) > 1)
+    return result
+
+
+if __name__ == "__main__":
+    import sys
+    # Usage: python duplicates.py [music folder]
+    folder = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(os.path.abspath(__file__)), "MusicPlayer")
+    songs = []
+    for root, _, files in os.walk(folder):
+        songs.extend(os.path.join(root, name) for name in files if name.lower().endswith(".mp3"))
+    groups = DuplicateFinder().find(songs)
+    for group in groups:
+        print("\n  ".join(os.path.relpath(path, folder) for path in group))
+    print(f"{sum(len(group) - 1 for group in groups)} duplicate(s) in {len(groups)} group(s) among {len(songs)} songs")
@@ -0,0 +1,35 @@
+import os
+
+from duplicates import SAMPLE_BYTES, DuplicateFinder
+
+
+def id3v2_tag(text):
+    body = text.encode("utf-8")
+    size = len(body)
+    return b"ID3\x03\x00\x00" + bytes([size >> 21 & 0x7F, size >> 14 & 0x7F, size >> 7 & 0x7F, size & 0x7F]) + body
+
+
+def write(path, data):
+    with open(path, "wb") as file:
+        file.write(data)
+    return str(path)
+
+
+def test_copies_with_different_tags_are_duplicates(tmp_path):
+    """Test that only files with the same audio are grouped, whatever their tags say."""
+    audio = os.urandom(SAMPLE_BYTES * 5)
+    changed = bytearray(audio)
+    changed[len(audio) // 2] ^= 1  # Same size, same ends, different middle
+    original = write(tmp_path / "a.mp3", id3v2_tag("Title A") + audio)
+    copy = write(tmp_path / "b.mp3", id3v2_tag("A much longer title") + audio + b"TAG" + bytes(125))
+    other = write(tmp_path / "c.mp3", bytes(changed))
+    finder = DuplicateFinder()
+    assert finder.find([original, copy, other]) == [[original, copy]]
+
+
+def test_full_hash_only_for_files_that_match_on_samples(tmp_path):
+    """Test that files told apart by their ends are never read in full."""
+    paths = [write(tmp_path / f"{number}.mp3", bytes([number]) * (SAMPLE_BYTES * 4)) for number in range(3)]
+    finder = DuplicateFinder()
+    assert finder.find(paths) == []
+    assert all(finder.files[path].payload is None for path in paths)
@@ -0,0 +1,159 @@
+import hashlib
+import json
+import os
+import time
+
+import media_cache
+
+POLL_MS = 1000  # How often a window polls the folder for changes
+# Directories changed this recently are listed again on the next poll, since a
+# second change within the filesystem's timestamp resolution leaves the mtime as it was
+SETTLE_NS = 2_000_000_000
+
+
+class FolderWatcher:
+    """
+    Follows the files under a folder by polling directory modification times.
+    Adding, removing or renaming an entry changes the mtime of the directory
+    holding it, so a poll costs one stat per directory and only directories whose
+    mtime moved are listed again and compared with the snapshot. A file that
+    disappears and appears elsewhere with the same inode, size and mtime was renamed.
+    The snapshot can be saved, so a restart only lists directories that changed.
+    """
+    def __init__(self, folder, suffixes=(".mp3",), snapshot_path=None):
+        self.folder = folder
+        self.suffixes = tuple(suffix.lower() for suffix in suffixes)
+        self.snapshot_path = snapshot_path
+        self.mtimes = {}  # Relative directory ("" for the folder itself) -> mtime_ns when it was last listed
+        self.subdirs = {}  # Relative directory -> names of its subdirectories
+        self.entries = {}  # Relative directory -> {file name: identity}
+        self.dirty = False
+        self.load_snapshot()
+        if "" not in self.mtimes:
+            self.mtimes[""] = None  # Nothing known yet; the first poll lists everything
+        self.poll()
+
+    def paths(self):
+        """Relative paths of every watched file, sorted."""
+        return sorted(
+            os.path.join(directory, name) for directory, names in self.entries.items() for name in names
+        )
+
+    def poll(self):
+        """
+        Bring the snapshot up to date and return the changes as
+        (added paths, removed paths, renamed (old path, new path) pairs).
+        """
+        added = {}  # Relative path -> identity
+        removed = {}
+        pending = list(self.mtimes)
+        while pending:
+            directory = pending.pop()
+            if directory not in self.mtimes:
+                continue  # Dropped together with its parent
+            try:
+                mtime = os.stat(os.path.join(self.folder, directory)).st_mtime_ns
+            except OSError:
+                self.drop_directory(directory, removed)
+                continue
+            if mtime != self.mtimes[directory]:
+                pending.extend(self.rescan(directory, mtime, added, removed))
+
+        # A file seen leaving one place and arriving in another is a rename
+        arrivals = {identity: path for path, identity in added.items()}
+        renamed = []
+        for path, identity in list(removed.items()):
+            new_path = arrivals.pop(identity, None)
+            if new_path is not None:
+                renamed.append((path, new_path))
+                del removed[path]
+                del added[new_path]
+        if added or removed or renamed:
+            self.dirty = True
+        return sorted(added), sorted(removed), sorted(renamed)
+
+    def rescan(self, directory, mtime, added, removed):
+        """List one directory, record its differences and return subdirectories that are new."""
+        entries = {}
+        subdirs = set()
+        try:
+            with os.scandir(os.path.join(self.folder, directory)) as scan:
+                for entry in scan:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.add(entry.name)
+                    elif entry.name.lower().endswith(self.suffixes):
+                        entries[entry.name] = self.identity(entry)
+        except OSError:
+            self.drop_directory(directory, removed)
+            return []
+
+        old_entries = self.entries.get(directory, {})
+        for name in old_entries.keys() - entries.keys():
+            removed[os.path.join(directory, name)] = old_entries[name]
+        for name in entries.keys() - old_entries.keys():
+            added[os.path.join(directory, name)] = entries[name]
+        for name in self.subdirs.get(directory, set()) - subdirs:
+            self.drop_directory(os.path.join(directory, name), removed)
+
+        new_subdirs = []
+        for name in subdirs - self.subdirs.get(directory, set()):
+            path = os.path.join(directory, name)
+            self.mtimes[path] = None
+            new_subdirs.append(path)
+        self.entries[directory] = entries
+        self.subdirs[directory] = subdirs
+        self.mtimes[directory] = None if time.time_ns() - mtime < SETTLE_NS else mtime
+        self.dirty = True
+        return new_subdirs
+
+    def identity(self, entry):
+        """Values that stay the same when a file is renamed or moved within the folder."""
+        stat = entry.stat(follow_symlinks=False)
+        if not stat.st_ino:
+            stat = os.stat(entry.path, follow_symlinks=False)  # scandir leaves the inode out on Windows
+        return stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+    def drop_directory(self, directory, removed):
+        """Forget a directory and everything under it, recording its files as removed."""
+        for name in self.subdirs.pop(directory, ()):
+            self.drop_directory(os.path.join(directory, name), removed)
+        for name, identity in self.entries.pop(directory, {}).items():
+            removed[os.path.join(directory, name)] = identity
+        self.mtimes.pop(directory, None)
+        self.dirty = True
+
+    def load_snapshot(self):
+        if self.snapshot_path is None:
+            return
+        try:
+            with open(self.snapshot_path, "r") as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            return
+        if data.get("folder") != os.path.abspath(self.folder):
+            return
+        self.mtimes = data["mtimes"]
+        self.subdirs = {directory: set(names) for directory, names in data["subdirs"].items()}
+        self.entries = {
+            directory: {name: tuple(identity) for name, identity in names.items()}
+            for directory, names in data["entries"].items()
+        }
+
+    def save_snapshot(self):
+        """Write the snapshot if a snapshot path was given and anything changed."""
+        if self.snapshot_path is None or not self.dirty:
+            return
+        data = json.dumps({
+            "folder": os.path.abspath(self.folder),
+            "mtimes": self.mtimes,
+            "subdirs": {directory: sorted(names) for directory, names in self.subdirs.items()},
+            "entries": self.entries,
+        }).encode("utf-8")
+        media_cache.write_atomically(self.snapshot_path, lambda file: file.write(data))
+        self.dirty = False
+
+
+def snapshot_path_for(folder):
+    """Cache file for the snapshot of a folder."""
+    name = hashlib.sha1(os.path.abspath(folder).encode("utf-8")).hexdigest()
+    return media_cache.cache_path("folders", name, ".json")
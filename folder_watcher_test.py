@@ -0,0 +1,58 @@
+import os
+
+from folder_watcher import FolderWatcher
+
+
+def touch(path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as file:
+        file.write(os.urandom(16))
+
+
+def test_initial_listing_skips_other_files(tmp_path):
+    """Test that the watcher lists matching files in the folder and its subfolders."""
+    touch(tmp_path / "a.mp3")
+    touch(tmp_path / "cover.jpg")
+    touch(tmp_path / "album" / "b.MP3")
+    watcher = FolderWatcher(str(tmp_path))
+    assert watcher.paths() == ["a.mp3", os.path.join("album", "b.MP3")]
+    assert watcher.poll() == ([], [], [])
+
+
+def test_adds_removes_and_renames(tmp_path):
+    """Test that changes are reported as deltas, with moves reported as renames."""
+    touch(tmp_path / "a.mp3")
+    touch(tmp_path / "b.mp3")
+    watcher = FolderWatcher(str(tmp_path))
+
+    touch(tmp_path / "new" / "c.mp3")
+    os.remove(tmp_path / "a.mp3")
+    os.rename(tmp_path / "b.mp3", tmp_path / "new" / "b2.mp3")
+    added, removed, renamed = watcher.poll()
+    assert added == [os.path.join("new", "c.mp3")]
+    assert removed == ["a.mp3"]
+    assert renamed == [("b.mp3", os.path.join("new", "b2.mp3"))]
+    assert watcher.paths() == [os.path.join("new", "b2.mp3"), os.path.join("new", "c.mp3")]
+
+
+def test_removed_folder_removes_its_files(tmp_path):
+    """Test that deleting a subfolder reports every file that was in it."""
+    touch(tmp_path / "album" / "disc 1" / "a.mp3")
+    watcher = FolderWatcher(str(tmp_path))
+    os.remove(tmp_path / "album" / "disc 1" / "a.mp3")
+    os.rmdir(tmp_path / "album" / "disc 1")
+    os.rmdir(tmp_path / "album")
+    assert watcher.poll() == ([], [os.path.join("album", "disc 1", "a.mp3")], [])
+    assert watcher.paths() == []
+
+
+def test_snapshot_reports_changes_made_while_closed(tmp_path):
+    """Test that a saved snapshot lets a new watcher pick up where the last one stopped."""
+    music = tmp_path / "music"
+    touch(music / "a.mp3")
+    snapshot = str(tmp_path / "snapshot.json")
+    FolderWatcher(str(music), snapshot_path=snapshot).save_snapshot()
+
+    touch(music / "b.mp3")
+    watcher = FolderWatcher(str(music), snapshot_path=snapshot)
+    assert watcher.paths() == ["a.mp3", "b.mp3"]
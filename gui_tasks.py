@@ -0,0 +1,142 @@
+import queue
+import threading
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+
+POLL_MS = 20  # How often finished tasks are collected while any are running
+MAX_WORKERS = 4
+
+# The task a worker thread is running, so cancelled() can be asked from anywhere inside it
+_current = threading.local()
+
+
+def cancelled():
+    """
+    True if the task running in this thread has been superseded.
+    Long loops can check this and return early; the result would be dropped anyway.
+    """
+    task = getattr(_current, "task", None)
+    return task is not None and task.cancelled
+
+
+class Task:
+    def __init__(self, name, work, on_done, on_error):
+        self.name = name
+        self.work = work
+        self.on_done = on_done
+        self.on_error = on_error
+        self.cancelled = False
+        self.future = None
+
+    def run(self):
+        _current.task = self
+        try:
+            return self.work()
+        finally:
+            _current.task = None
+
+
+class TaskRunner:
+    """
+    Runs slow library calls in a thread pool so Tk handlers return immediately.
+    Results are handed back through a queue that the window drains with after(),
+    so on_done and on_error always run on the Tk thread. Submitting a task under a
+    name supersedes the previous task of that name: it is cancelled if it has not
+    started, and its result is dropped if it has. Tasks submitted with
+    supersede=False instead run one at a time, in order, per name.
+    Work should only read the library. Changes notify listeners that redraw
+    widgets, so they belong in on_done.
+    """
+    def __init__(self, window, on_busy=None, max_workers=MAX_WORKERS):
+        self.window = window
+        self.on_busy = on_busy or self.show_busy_cursor  # Called with True when work starts and False when all is done
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="gui-task")
+        self.results = queue.Queue()  # (task, result, error) from the workers
+        self.latest = {}  # Name -> the newest task submitted under it
+        self.serial_pools = {}  # Name -> single worker for tasks that must not be superseded
+        self.running = 0
+        self.poll_job = None
+        window.bind("<Destroy>", self.on_destroy, add="+")  # Stop with the window, however it is closed
+
+    def on_destroy(self, event):
+        if event.widget is self.window:  # The binding also fires for each child widget destroyed
+            self.close()
+
+    def submit(self, name, work, on_done, on_error=None, supersede=True):
+        """
+        Run work() in a worker thread and call on_done(result) on the Tk thread.
+        If work raises, on_error(exception) is called instead, or the exception is re-raised
+        on the Tk thread when there is no on_error.
+        """
+        task = Task(name, work, on_done, on_error)
+        if supersede:
+            previous = self.latest.get(name)
+            if previous is not None:
+                previous.cancelled = True
+                previous.future.cancel()
+            self.latest[name] = task
+            task.future = self.pool.submit(task.run)
+        else:
+            pool = self.serial_pools.get(name)
+            if pool is None:
+                pool = self.serial_pools[name] = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"gui-task-{name}")
+            task.future = pool.submit(task.run)
+        task.future.add_done_callback(lambda future: self.finished(task, future))
+        self.running += 1
+        if self.running == 1:
+            self.on_busy(True)
+        if self.poll_job is None:
+            self.poll_job = self.window.after(POLL_MS, self.poll)
+        return task
+
+    def finished(self, task, future):
+        # Runs in the worker thread (or in submit() for a cancelled task), so only queue the outcome
+        try:
+            self.results.put((task, future.result(), None))
+        except CancelledError:
+            self.results.put((task, None, CancelledError()))
+        except Exception as error:
+            self.results.put((task, None, error))
+
+    def poll(self):
+        """Deliver finished tasks on the Tk thread, and keep polling while any are running."""
+        self.poll_job = None
+        try:
+            self.deliver()
+        finally:
+            # An exception from a callback must not leave later results undelivered
+            if self.running:
+                self.poll_job = self.window.after(POLL_MS, self.poll)
+            else:
+                self.on_busy(False)
+
+    def deliver(self):
+        while True:
+            try:
+                task, result, error = self.results.get_nowait()
+            except queue.Empty:
+                return
+            self.running -= 1
+            if self.latest.get(task.name) is task:
+                del self.latest[task.name]
+            if task.cancelled:
+                continue  # Superseded by a newer request
+            if error is None:
+                task.on_done(result)
+            elif task.on_error is not None:
+                task.on_error(error)
+            else:
+                raise error
+
+    def show_busy_cursor(self, busy):
+        """Default progress indicator: a busy cursor over the window while work is running."""
+        self.window.configure(cursor="watch" if busy else "")
+
+    def close(self):
+        """Cancel queued work and stop polling; running work is left to finish on its own."""
+        for task in self.latest.values():
+            task.cancelled = True
+        for pool in [self.pool, *self.serial_pools.values()]:
+            pool.shutdown(wait=False, cancel_futures=True)
+        if self.poll_job is not None:
+            self.window.after_cancel(self.poll_job)
+            self.poll_job = None
@@ -0,0 +1,89 @@
+import threading
+import time
+
+import gui_tasks
+from gui_tasks import TaskRunner
+
+
+class FakeWindow:
+    """Stands in for a Tk window: after() callbacks run when run_pending() is called."""
+    def __init__(self):
+        self.pending = []
+        self.cursor = ""
+
+    def after(self, ms, callback):
+        self.pending.append(callback)
+        return len(self.pending)
+
+    def after_cancel(self, job):
+        pass
+
+    def bind(self, sequence, callback, add=None):
+        self.on_destroy = callback
+
+    def configure(self, cursor):
+        self.cursor = cursor
+
+    def run_pending(self, timeout=5):
+        deadline = time.time() + timeout
+        while self.pending and time.time() < deadline:
+            time.sleep(gui_tasks.POLL_MS / 1000)
+            self.pending.pop(0)()
+
+
+def test_newer_task_supersedes_older():
+    """Test that only the last of several tasks with the same name is delivered."""
+    window = FakeWindow()
+    runner = TaskRunner(window)
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow():
+        started.set()
+        release.wait(5)
+        return "old" if gui_tasks.cancelled() else "not cancelled"
+
+    results = []
+    runner.submit("search", slow, results.append)
+    started.wait(5)
+    runner.submit("search", lambda: "new", results.append)
+    assert window.cursor == "watch"
+    release.set()
+    window.run_pending()
+    assert results == ["new"]
+    assert window.cursor == ""
+
+
+def test_serial_tasks_keep_their_order():
+    """Test that tasks submitted with supersede=False are all delivered in order."""
+    window = FakeWindow()
+    runner = TaskRunner(window)
+    results = []
+    for number in range(5):
+        runner.submit("add", lambda number=number: (time.sleep(0.01 * (5 - number)), number)[1], results.append,
+                      supersede=False)
+    window.run_pending()
+    assert results == [0, 1, 2, 3, 4]
+
+
+def test_errors_are_delivered_on_the_tk_thread():
+    """Test that an exception in a task is passed to on_error."""
+    window = FakeWindow()
+    runner = TaskRunner(window)
+    errors = []
+    runner.submit("view", lambda: 1 / 0, lambda result: None, on_error=errors.append)
+    window.run_pending()
+    assert isinstance(errors[0], ZeroDivisionError)
+
+
+def test_destroying_the_window_closes_the_runner():
+    """Test that queued work is cancelled once the window is destroyed."""
+    window = FakeWindow()
+    runner = TaskRunner(window, max_workers=1)
+    release = threading.Event()
+    runner.submit("slow", lambda: release.wait(5), lambda result: None)
+    queued = runner.submit("queued", lambda: "late", lambda result: None)
+    window.on_destroy(type("Event", (), {"widget": window})())
+    release.set()
+    assert queued.future.cancelled() and runner.poll_job is None
+
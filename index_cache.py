@@ -0,0 +1,88 @@
+import gc
+import hashlib
+import json
+import os
+import pickle
+
+import media_cache
+
+HASH_CHUNK = 1 << 20
+
+
+def source(lib, library):
+    """
+    (path, content hash) of the file a library version was read from, or None if the library
+    has changed since it was read or was not read from a single file. Library modules record
+    what they read as library_source = (path, snapshot, content hash), hashing the bytes they
+    parsed, so a file edited after it was read is never mistaken for the version in memory.
+    """
+    source = getattr(lib, "library_source", None)
+    if source is None or source[1] is not library:
+        return None
+    return source[0], source[2]
+
+
+def content_hash(data):
+    """Hash of a library file's contents, as recorded in library_source."""
+    return hashlib.sha1(data).hexdigest()
+
+
+def file_hash(path):
+    """content_hash() of a file, read in chunks."""
+    content = hashlib.sha1()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(HASH_CHUNK), b""):
+            content.update(chunk)
+    return content.hexdigest()
+
+
+def cache_file(index, lib, path):
+    """One cache file per kind of index, library module and source file; a rebuild overwrites it."""
+    name = f"{type(index).__name__}|{lib.__name__}|{os.path.abspath(path)}"
+    return media_cache.cache_path("indexes", hashlib.sha1(name.encode("utf-8")).hexdigest(), ".idx")
+
+
+def header(index, digest):
+    return {"format": index.CACHE_FORMAT, "source": digest}
+
+
+def load(index, lib, library):
+    """
+    Restore an index from its cache file if the file was written by the same index format
+    from the same source file contents as the given library version. Returns True if restored.
+    The file is a JSON header line followed by a pickle of index.cache_state(), read in one go.
+    """
+    found = source(lib, library)
+    if found is None:
+        return False
+    path, digest = found
+    try:
+        with open(cache_file(index, lib, path), "rb") as file:
+            data = file.read()
+        end = data.index(b"\n")
+        if json.loads(data[:end]) != header(index, digest):
+            return False
+        gc.disable()  # Unpickling creates millions of objects, none of them garbage
+        try:
+            state = pickle.loads(memoryview(data)[end + 1:])
+        finally:
+            gc.enable()
+    except (OSError, ValueError, EOFError, pickle.UnpicklingError):
+        return False  # Missing, stale or damaged; the caller rebuilds
+    index.restore_cache_state(state)
+    return True
+
+
+def save(index, lib, library):
+    """Write an index built from the given library version, if that version is a file as read."""
+    found = source(lib, library)
+    if found is None:
+        return
+    path, digest = found
+    first_line = json.dumps(header(index, digest)).encode("utf-8") + b"\n"
+
+    def write(file):
+        file.write(first_line)
+        pickle.dump(index.cache_state(), file, protocol=pickle.HIGHEST_PROTOCOL)
+
+    media_cache.write_atomically(cache_file(index, lib, path), write)
@@ -0,0 +1,83 @@
+import json
+import os
+import subprocess
+import sys
+import pytest
+import Track_Library_JSON as lib
+import index_cache
+import media_cache
+from track_index import TrackIndex
+from track_query import QueryIndex, parse_query
+
+TRACKS = {
+    "01": {"title": "Another Brick in the Wall", "artist": "Pink Floyd", "rating": 4},
+    "02": {"title": "Wish You Were Here", "artist": "Pink Floyd", "rating": 5},
+    "03": {"title": "Someone Like You", "artist": "Adele", "rating": 3},
+}
+
+
+@pytest.fixture
+def library_file(tmp_path, monkeypatch):
+    """A library.json of our own, with the index cache in a temporary directory."""
+    monkeypatch.setattr(media_cache, "CACHE_DIR", str(tmp_path / "cache"))
+    path = tmp_path / "library.json"
+    path.write_text(json.dumps(TRACKS))
+    lib.load_library_from_json(str(path))
+    return path
+
+
+def found(index, text):
+    return parse_query(text).keys(index, lib.library)
+
+
+def test_warm_start_skips_building(library_file, monkeypatch):
+    """Test that a second index of the same file is restored without indexing any track."""
+    QueryIndex(lib).close()
+    monkeypatch.setattr(index_cache, "save", lambda *args: pytest.fail("index was rebuilt"))
+    index = QueryIndex(lib)
+    index.close()
+    assert found(index, "artist:'pink floyd' rating>=5") == ["02"]
+
+
+def test_changed_source_rebuilds(library_file):
+    """Test that editing library.json makes the cached index stale."""
+    QueryIndex(lib).close()
+    library_file.write_text(json.dumps({**TRACKS, "04": {"title": "Wall of Sound", "artist": "Adele", "rating": 1}}))
+    lib.load_library_from_json(str(library_file))
+    index = QueryIndex(lib)
+    assert found(index, "title~wall") == ["01", "04"]
+    index.close()
+
+
+def test_format_version_and_changes(library_file, monkeypatch):
+    """Test that other index formats are not restored and a changed library is never cached."""
+    index = TrackIndex(lib)
+    assert index_cache.load(index, lib, lib.library)
+    monkeypatch.setattr(TrackIndex, "CACHE_FORMAT", TrackIndex.CACHE_FORMAT + 1)
+    assert not index_cache.load(index, lib, lib.library)
+    lib.set_rating("03", 5)
+    assert index_cache.source(lib, lib.library) is None
+    index.close()
+
+
+def test_file_edited_after_loading_is_not_cached_as_read(library_file):
+    """Test that an index saved after library.json changed on disk is keyed to the contents that were loaded."""
+    library_file.write_text(json.dumps({**TRACKS, "04": {"title": "Wall of Sound", "artist": "Adele", "rating": 1}}))
+    QueryIndex(lib).close()  # Built from the three tracks read before the edit
+    lib.load_library_from_json(str(library_file))
+    index = QueryIndex(lib)
+    assert found(index, "title~wall") == ["01", "04"]
+    index.close()
+
+
+
+def test_built_in_library_is_hashed_on_first_use():
+    """Test that importing track_library leaves its file unread until an index asks for its source."""
+    check = """
+import sys
+import track_library
+assert "index_cache" not in sys.modules and "library_source" not in vars(track_library)
+import index_cache
+assert index_cache.source(track_library, track_library.library)[1] == index_cache.file_hash(track_library.__file__)
+"""
+    subprocess.run([sys.executable, "-c", check], check=True, cwd=os.path.dirname(os.path.abspath(__file__)))
@@ -0,0 +1,141 @@
+import numpy as np
+
+from library_columns import columns_for
+
+MAX_RATING = 5
+# Lower edges of the play count buckets; the last bucket is open ended
+PLAY_BUCKET_EDGES = np.array([0, 1, 2, 5, 10, 25, 100])
+TOP_ARTISTS = 10  # Number of artists listed in the report
+
+
+def play_bucket_labels():
+    """Labels such as '2-4' and '100+' for the play count buckets."""
+    labels = []
+    for low, high in zip(PLAY_BUCKET_EDGES[:-1], PLAY_BUCKET_EDGES[1:]):
+        labels.append(str(low) if high - low == 1 else f"{low}-{high - 1}")
+    labels.append(f"{PLAY_BUCKET_EDGES[-1]}+")
+    return labels
+
+
+def play_bucket(play_count):
+    """Index of the play count bucket a count falls into."""
+    return int(np.searchsorted(PLAY_BUCKET_EDGES, play_count, side="right")) - 1
+
+
+class LibraryStats:
+    """
+    Rating histogram, play count distribution and per-artist totals for a library.
+    Everything is computed once with NumPy group-bys over the library columns and
+    then kept current in O(1) per set_rating or increment_play_count call.
+    """
+    def __init__(self, lib):
+        self.lib = lib
+        self.columns = columns_for(lib)
+        self.recompute()
+        # Registered after the columns, so a reload is seen once they are rebuilt
+        lib.add_listener(self.on_change)
+
+    def recompute(self):
+        """Recompute every statistic from the columns."""
+        columns = self.columns
+        artist_count = len(columns.artists)
+        # A few comparisons over the narrow columns beat a general group-by for these small histograms
+        rating = np.clip(columns.rating, 0, MAX_RATING)
+        self.rating_histogram = np.array(
+            [np.count_nonzero(rating == value) for value in range(MAX_RATING + 1)], dtype=np.int64
+        )
+        at_least = np.array([np.count_nonzero(columns.play_count >= edge) for edge in PLAY_BUCKET_EDGES], dtype=np.int64)
+        self.play_histogram = at_least - np.append(at_least[1:], 0)
+        self.artist_tracks = np.bincount(columns.artist_id, minlength=artist_count).astype(np.int64)
+        self.artist_plays = np.bincount(columns.artist_id, weights=columns.play_count, minlength=artist_count).astype(np.int64)
+        self.artist_ratings = np.bincount(columns.artist_id, weights=columns.rating, minlength=artist_count).astype(np.int64)
+        self.total_plays = int(self.artist_plays.sum())
+
+    def on_change(self, key, field, old, new):
+        """Library listener that applies one change to the aggregates."""
+        if field == "reload":
+            self.recompute()
+            return
+        row = self.columns.rows.get(key)
+        if row is None:
+            return
+        artist_id = self.columns.artist_id[row]
+        if field == "rating":
+            self.rating_histogram[min(max(old, 0), MAX_RATING)] -= 1
+            self.rating_histogram[min(max(new, 0), MAX_RATING)] += 1
+            self.artist_ratings[artist_id] += new - old
+        elif field == "play_count":
+            self.play_histogram[play_bucket(old)] -= 1
+            self.play_histogram[play_bucket(new)] += 1
+            self.artist_plays[artist_id] += new - old
+            self.total_plays += new - old
+        elif field == "artist":
+            # The columns have already moved the row to the new artist, who may be new to them
+            old_id = self.columns.artist_ids[old]
+            grow = len(self.columns.artists) - len(self.artist_tracks)
+            if grow > 0:
+                self.artist_tracks, self.artist_plays, self.artist_ratings = (
+                    np.append(totals, np.zeros(grow, dtype=np.int64))
+                    for totals in (self.artist_tracks, self.artist_plays, self.artist_ratings)
+                )
+            for totals, value in ((self.artist_tracks, 1), (self.artist_plays, self.columns.play_count[row]),
+                                  (self.artist_ratings, self.columns.rating[row])):
+                totals[old_id] -= value
+                totals[artist_id] += value
+
+    def close(self):
+        """Stop following the library."""
+        self.lib.remove_listener(self.on_change)
+
+    def artist_averages(self):
+        """Average rating and average plays per track for every artist ID."""
+        tracks = np.maximum(self.artist_tracks, 1)
+        return self.artist_ratings / tracks, self.artist_plays / tracks
+
+    def top_artists(self, n=TOP_ARTISTS):
+        """IDs of the n most played artists, most played first."""
+        n = min(n, len(self.artist_plays))
+        if n == 0:
+            return np.array([], dtype=np.int64)
+        top = np.argpartition(-self.artist_plays, n - 1)[:n]
+        return top[np.argsort(-self.artist_plays[top], kind="stable")]
+
+    def top_artist_share(self, n=TOP_ARTISTS):
+        """Fraction of all plays that went to the n most played artists."""
+        if not self.total_plays:
+            return 0.0
+        return float(self.artist_plays[self.top_artists(n)].sum()) / self.total_plays
+
+
+def format_report(stats, n=TOP_ARTISTS):
+    """Format the statistics as text for display."""
+    output = "Rating histogram:\n"
+    for rating, count in enumerate(stats.rating_histogram):
+        output += f"  {rating} {'*' * rating:<5} {count}\n"
+
+    output += "\nPlay count distribution:\n"
+    for label, count in zip(play_bucket_labels(), stats.play_histogram):
+        output += f"  {label:>6} plays: {count}\n"
+
+    average_ratings, average_plays = stats.artist_averages()
+    output += f"\nTop {n} artists by plays (total plays: {stats.total_plays}):\n"
+    for artist_id in stats.top_artists(n):
+        output += (
+            f"  {stats.columns.artists[artist_id]}: {stats.artist_plays[artist_id]} plays, "
+            f"{stats.artist_tracks[artist_id]} tracks, avg rating {average_ratings[artist_id]:.1f}, "
+            f"avg plays {average_plays[artist_id]:.1f}\n"
+        )
+    output += f"\nShare of plays going to the top {n} artists: {stats.top_artist_share(n):.0%}\n"
+    return output
+
+
+# One shared set of statistics per library module, created on first use
+_stats = {}
+
+
+def stats_for(lib):
+    """Return the shared LibraryStats for a library module, building them if needed."""
+    stats = _stats.get(lib.__name__)
+    if stats is None:
+        stats = _stats[lib.__name__] = LibraryStats(lib)
+    return stats
@@ -0,0 +1,45 @@
+import os
+
+import Track_Library_JSON as lib
+import library_columns
+from library_analytics import LibraryStats, format_report, play_bucket, play_bucket_labels
+
+
+def load():
+    lib.load_library_from_json(os.path.join(os.path.dirname(__file__), "library.json"))
+
+
+def aggregates(stats):
+    return [totals.tolist() for totals in (stats.rating_histogram, stats.play_histogram, stats.artist_tracks,
+                                           stats.artist_plays, stats.artist_ratings)] + [stats.total_plays]
+
+
+def test_play_buckets():
+    """Test that play counts fall into the bucket whose label covers them."""
+    assert play_bucket_labels() == ["0", "1", "2-4", "5-9", "10-24", "25-99", "100+"]
+    assert [play_bucket(count) for count in (0, 1, 2, 4, 5, 24, 25, 99, 100, 5000)] == [0, 1, 2, 2, 3, 4, 5, 5, 6, 6]
+
+
+def test_changes_match_a_recompute(monkeypatch):
+    """Test that ratings and play counts kept current one change at a time match a full recompute."""
+    load()
+    columns = library_columns.LibraryColumns(lib)
+    monkeypatch.setitem(library_columns._columns, lib.__name__, columns)  # Not left following the library
+    stats = LibraryStats(lib)
+    try:
+        keys = list(lib.library)
+        for step in range(60):
+            key = keys[step % len(keys)]
+            lib.set_rating(key, (step * 3) % 6)
+            lib.increment_play_count(keys[step % 3])  # A few tracks climb through several buckets
+        assert stats.total_plays == int(columns.play_count.sum())
+        kept = aggregates(stats)
+        stats.recompute()
+        assert aggregates(stats) == kept
+        assert "Share of plays going to the top" in format_report(stats)
+        load()
+        assert aggregates(stats) != kept and stats.total_plays == int(columns.play_count.sum())
+    finally:
+        stats.close()
+        columns.close()
+        load()
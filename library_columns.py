@@ -0,0 +1,85 @@
+import numpy as np
+
+
+class LibraryColumns:
+    """
+    Column arrays of a track library module (track_library or Track_Library_JSON).
+    Each track gets a row; rating, play count and artist ID live in NumPy arrays so
+    whole-library questions can be answered with vectorized operations. The
+    columns follow the library through its listeners and pass single-row changes
+    on to their own listeners.
+    """
+    def __init__(self, lib):
+        self.lib = lib
+        self.version = 0  # Bumped on every change, so derived results can tell they are stale
+        self.listeners = []  # Callbacks called as callback(row, field); row is None after a rebuild
+        self.rebuild()
+        lib.add_listener(self.on_change)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def rebuild(self):
+        """Rebuild every column from the library."""
+        library = self.lib.library  # One consistent version of the library for every column
+        self.keys = list(library)
+        self.rows = {key: row for row, key in enumerate(self.keys)}
+        self.artists = []  # Artist ID -> artist name
+        self.artist_ids = {}  # Artist name -> artist ID
+        items = library.values()
+        size = len(self.keys)
+        self.rating = np.fromiter((item.rating for item in items), dtype=np.int32, count=size)
+        self.play_count = np.fromiter((item.play_count for item in items), dtype=np.int32, count=size)
+        self.artist_id = np.fromiter((self.artist_id_of(item.artist) for item in items), dtype=np.int32, count=size)
+        self.changed(None, "reload")
+
+    def artist_id_of(self, artist):
+        """Return the ID of an artist, giving new artists the next free ID."""
+        artist_id = self.artist_ids.get(artist)
+        if artist_id is None:
+            artist_id = self.artist_ids[artist] = len(self.artists)
+            self.artists.append(artist)
+        return artist_id
+
+    def on_change(self, key, field, old, new):
+        """Library listener that copies a single change into the columns."""
+        if field == "reload":
+            self.rebuild()
+            return
+        row = self.rows.get(key)
+        if row is None:
+            return
+        if field == "rating":
+            self.rating[row] = new
+        elif field == "play_count":
+            self.play_count[row] = new
+        elif field == "artist":
+            self.artist_id[row] = self.artist_id_of(new)
+        else:
+            return
+        self.changed(row, field)
+
+    def changed(self, row, field):
+        self.version += 1
+        for callback in list(self.listeners):
+            callback(row, field)
+
+    def close(self):
+        """Stop following the library."""
+        self.lib.remove_listener(self.on_change)
+
+    def keys_at(self, rows):
+        """Return the library keys of the given rows."""
+        return [self.keys[row] for row in rows]
+
+
+# One shared set of columns per library module, created on first use
+_columns = {}
+
+
+def columns_for(lib):
+    """Return the shared LibraryColumns for a library module, building them if needed."""
+    columns = _columns.get(lib.__name__)
+    if columns is None:
+        columns = _columns[lib.__name__] = LibraryColumns(lib)
+    return columns
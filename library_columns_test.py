@@ -0,0 +1,40 @@
+import os
+
+import Track_Library_JSON as lib
+from library_columns import LibraryColumns
+
+
+def test_columns_follow_the_library():
+    """Test that the columns mirror the library and pass single-row changes and reloads on."""
+    lib.load_library_from_json(os.path.join(os.path.dirname(__file__), "library.json"))
+    columns = LibraryColumns(lib)
+    changes = []
+    columns.listeners.append(lambda row, field: changes.append((row, field)))
+    try:
+        assert columns.keys == list(lib.library)
+        assert columns.rating.tolist() == [item.rating for item in lib.library.values()]
+        row = columns.rows["03"]
+        lib.set_rating("03", 5)
+        lib.increment_play_count("03")
+        lib.update_tracks({"03": {"artist": "Adele"}})
+        assert (columns.rating[row], columns.play_count[row]) == (5, 1)
+        assert columns.artist_id[row] == columns.artist_id[columns.rows["05"]]
+        assert changes == [(row, "rating"), (row, "play_count"), (row, "artist")]
+        version = columns.version
+        lib.load_library_from_json(os.path.join(os.path.dirname(__file__), "library.json"))
+        assert changes[-1] == (None, "reload") and columns.version > version
+        assert columns.rating[row] == lib.get_rating("03")
+    finally:
+        columns.close()
+
+
+def test_columns_hold_ratings_outside_the_star_range():
+    """Test that a rating an 8-bit column cannot hold still reaches the columns."""
+    lib.load_library_from_json(os.path.join(os.path.dirname(__file__), "library.json"))
+    columns = LibraryColumns(lib)
+    try:
+        lib.set_rating("03", 200)
+        assert columns.rating[columns.rows["03"]] == 200
+    finally:
+        columns.close()
+        lib.load_library_from_json(os.path.join(os.path.dirname(__file__), "library.json"))
@@ -0,0 +1,245 @@
+import codecs
+import csv
+import json
+
+IMPORT_BATCH_ROWS = 10_000  # Rows validated and applied to the library as one batch
+MAX_REPORTED_ERRORS = 1000  # Errors kept with their line numbers; the rest are only counted
+FILE_BUFFER = 1 << 20
+MAX_RATING = 5
+EXPORT_FIELDS = ["key", "title", "artist", "rating", "play_count"]
+# Importable columns and the track attribute each one sets; play_count is read back from exports but ignored
+IMPORT_FIELDS = {"title": "name", "artist": "artist", "rating": "rating"}
+
+LIBRARY_FILETYPES = [
+    ("CSV file", "*.csv"),
+    ("JSON lines file", "*.jsonl"),
+]
+
+
+def track_rows(library):
+    """Yield the export row of every track, in library order."""
+    for key, item in library.items():
+        yield key, item.name, item.artist, item.rating, item.play_count
+
+
+def write_csv(path, rows):
+    """Write export rows to a CSV file with a header line."""
+    with open(path, "w", encoding="utf-8", newline="", buffering=FILE_BUFFER) as file:
+        writer = csv.writer(file)
+        writer.writerow(EXPORT_FIELDS)
+        writer.writerows(rows)
+
+
+def write_jsonl(path, rows):
+    """Write export rows as one JSON object per line."""
+    encode = json.JSONEncoder(ensure_ascii=False).encode
+    with open(path, "w", encoding="utf-8", buffering=FILE_BUFFER) as file:
+        for key, title, artist, rating, play_count in rows:
+            file.write(encode({"key": key, "title": title, "artist": artist, "rating": rating, "play_count": play_count}))
+            file.write("\n")
+
+
+def export_library(lib, path):
+    """
+    Write every track of a library module with its rating and play count, as JSON lines
+    if the file name ends in .jsonl and as CSV otherwise. The tracks come from one version
+    of the library and are written as they are read, so changes made meanwhile are not
+    seen and memory use does not grow with the library. Returns the number of tracks.
+    """
+    library = lib.library
+    if path.lower().endswith(".jsonl"):
+        write_jsonl(path, track_rows(library))
+    else:
+        write_csv(path, track_rows(library))
+    return len(library)
+
+
+def decoded_lines(file, bad_lines):
+    """Yield the lines of a binary file as text, adding the numbers of lines that are not UTF-8 to bad_lines."""
+    for line_number, line in enumerate(file, start=1):
+        if line_number == 1:
+            line = line.removeprefix(codecs.BOM_UTF8)
+        try:
+            yield line.decode("utf-8")
+        except UnicodeDecodeError:
+            bad_lines.add(line_number)
+            yield line.decode("utf-8", errors="replace")
+
+
+def read_csv(path):
+    """
+    Yield (line number, record) for the rows of a CSV file with a header line; blank cells
+    are left out. A row that cannot be parsed or is not UTF-8 is yielded as an error message.
+    """
+    bad_lines = set()
+    with open(path, "rb", buffering=FILE_BUFFER) as file:
+        reader = csv.reader(decoded_lines(file, bad_lines))
+        header = [name.strip().lower() for name in next(reader, [])]
+        if bad_lines:
+            raise ValueError("The CSV header is not UTF-8 text")
+        if "key" not in header:
+            raise ValueError("The CSV file has no 'key' column")
+        while True:
+            first_line = reader.line_num + 1  # A quoted cell can span several lines
+            try:
+                row = next(reader)
+            except StopIteration:
+                return
+            except csv.Error as error:
+                yield reader.line_num, f"Malformed CSV row: {error}"
+                continue
+            if bad_lines and not bad_lines.isdisjoint(range(first_line, reader.line_num + 1)):
+                yield reader.line_num, "Invalid UTF-8 text"
+            elif row:
+                yield reader.line_num, {name: value for name, value in zip(header, row) if value != ""}
+
+
+def read_jsonl(path):
+    """
+    Yield (line number, record) for the lines of a JSON lines file. A line that is not an
+    object is yielded as is, and one that cannot be decoded as an error message.
+    """
+    with open(path, "rb", buffering=FILE_BUFFER) as file:
+        for line_number, line in enumerate(file, start=1):
+            if line_number == 1:
+                line = line.removeprefix(codecs.BOM_UTF8)
+            if not line.strip():
+                continue
+            try:
+                yield line_number, json.loads(line)  # Decodes the bytes, raising a ValueError if they are not UTF-8
+            except ValueError as error:
+                yield line_number, f"Invalid JSON: {error}"
+
+
+def read_records(path):
+    """Return a lazy iterator over the records of a CSV or JSON lines file, by extension."""
+    if path.lower().endswith(".jsonl"):
+        return read_jsonl(path)
+    return read_csv(path)
+
+
+def validate(record):
+    """
+    Turn a record into (key, {attribute: value}) for a library module's update_tracks.
+    Raises ValueError with a message for the report if the record cannot be imported.
+    """
+    if not isinstance(record, dict):
+        raise ValueError(record if isinstance(record, str) else "Expected an object")
+    key = record.get("key")
+    if isinstance(key, int) and not isinstance(key, bool):
+        key = str(key)
+    if not isinstance(key, str) or not key.strip():
+        raise ValueError("Missing key")
+    values = {}
+    for field, attribute in IMPORT_FIELDS.items():
+        value = record.get(field)
+        if value is None:
+            continue
+        if field == "rating":
+            try:
+                value = int(value) if isinstance(value, str) else value
+            except ValueError:
+                raise ValueError(f"Rating must be a whole number, not {value!r}") from None
+            if not isinstance(value, int) or isinstance(value, bool) or not 0 <= value <= MAX_RATING:
+                raise ValueError(f"Rating must be between 0 and {MAX_RATING}, not {value!r}")
+        elif not isinstance(value, str) or not value.strip():
+            raise ValueError(f"{field.capitalize()} must be a non-empty text")
+        values[attribute] = value
+    if not values:
+        raise ValueError("Nothing to change: expected a title, artist or rating")
+    return key.strip(), values
+
+
+class ImportReport:
+    """Counts of an import and the first MAX_REPORTED_ERRORS errors as (line number, message)."""
+    def __init__(self):
+        self.rows = 0
+        self.updated = 0  # Tracks whose title, artist or rating changed
+        self.error_count = 0
+        self.errors = []
+
+    def error(self, line_number, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line_number, message))
+
+    def summary(self):
+        text = f"{self.rows} rows read, {self.updated} tracks updated, {self.error_count} errors"
+        lines = [f"Line {line_number}: {message}" for line_number, message in self.errors]
+        if self.error_count > len(self.errors):
+            lines.append(f"... and {self.error_count - len(self.errors)} more")
+        return "\n".join([text] + lines)
+
+
+def import_batches(lib, path, report, batch_rows=IMPORT_BATCH_ROWS):
+    """
+    Apply the titles, artists and ratings in a CSV or JSON lines file to a library module.
+    Rows are read and validated until batch_rows tracks have changes or batch_rows rows
+    have been read, whichever comes first; the changes are applied as one batch and the
+    generator yields, so a caller such as a Tk loop can do other work in between even when
+    most rows are invalid or repeat a key. Rows that are invalid or name a track not in the
+    library are recorded in the report and skipped; the rest of the file is still imported.
+    When a key appears more than once the last row wins.
+    """
+    batch = {}  # Key -> changes
+    lines = {}  # Key -> line number, to report keys the library does not have
+    unyielded = 0  # Rows read since the last yield
+
+    def apply():
+        updated, missing = lib.update_tracks(batch)
+        report.updated += updated
+        for key in missing:
+            report.error(lines[key], f"No track with key {key!r}")
+        batch.clear()
+        lines.clear()
+
+    try:
+        for line_number, record in read_records(path):
+            report.rows += 1
+            unyielded += 1
+            try:
+                key, values = validate(record)
+            except ValueError as error:
+                report.error(line_number, str(error))
+            else:
+                batch.setdefault(key, {}).update(values)
+                lines[key] = line_number
+            if len(batch) == batch_rows or unyielded == batch_rows:
+                if batch:
+                    apply()
+                unyielded = 0
+                yield report
+    except Exception:
+        if batch:
+            apply()  # Rows read before a failure, e.g. a disk error, are still imported
+        raise
+    if batch:
+        apply()
+    yield report
+
+
+def import_library(lib, path, batch_rows=IMPORT_BATCH_ROWS):
+    """
+    Import a whole CSV or JSON lines file into a library module and return its ImportReport.
+    Raises OSError if the file cannot be read and ValueError if a CSV file has no key column.
+    """
+    report = ImportReport()
+    for _ in import_batches(lib, path, report, batch_rows):
+        pass
+    return report
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+    import Track_Library_JSON as lib
+    # Usage: python library_io.py export|import <file.csv or file.jsonl> [library.json]
+    command, path = sys.argv[1], sys.argv[2]
+    lib.load_library_from_json(sys.argv[3] if len(sys.argv) > 3 else None)
+    start = time.perf_counter()
+    if command == "export":
+        print(f"Exported {export_library(lib, path)} tracks")
+    else:
+        print(import_library(lib, path).summary())
+        lib.save_library_to_json(sys.argv[3] if len(sys.argv) > 3 else None)
+    print(f"Took {time.perf_counter() - start:.2f} s")
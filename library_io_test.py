@@ -0,0 +1,82 @@
+import os
+
+import Track_Library_JSON as lib
+import library_io
+import library_columns
+from library_analytics import LibraryStats
+
+
+def load():
+    lib.load_library_from_json(os.path.join(os.path.dirname(__file__), "library.json"))
+
+
+def test_export_then_import_round_trips(tmp_path):
+    """Test that an exported library imports back without changes, in both formats."""
+    load()
+    for name in ("tracks.csv", "tracks.jsonl"):
+        path = str(tmp_path / name)
+        assert library_io.export_library(lib, path) == len(lib.library)
+        report = library_io.import_library(lib, path)
+        assert (report.rows, report.updated, report.error_count) == (len(lib.library), 0, 0)
+    records = [record for _, record in library_io.read_jsonl(str(tmp_path / "tracks.jsonl"))]
+    assert records[0] == {"key": "01", **lib.record_of(lib.library["01"])}
+
+
+def test_import_reports_bad_rows_and_applies_the_rest(tmp_path):
+    """Test that invalid rows are reported by line and valid ones are applied in batches."""
+    load()
+    path = tmp_path / "changes.csv"
+    path.write_text("key,rating,artist\n01,5,\n02,six,\n99,1,\n03,,\n04,2,Ed\n01,3,\n", encoding="utf-8")
+    report = library_io.import_library(lib, str(path), batch_rows=2)
+    assert report.rows == 6 and report.updated == 3
+    assert sorted(line for line, _ in report.errors) == [3, 4, 5]  # Missing keys are found when their batch is applied
+    assert lib.get_rating("01") == 3 and (lib.get_rating("04"), lib.get_artist("04")) == (2, "Ed")
+    load()
+
+
+def test_malformed_lines_are_reported_not_fatal(tmp_path):
+    """Test that undecodable bytes and oversized CSV cells fail their own rows only."""
+    load()
+    path = tmp_path / "changes.jsonl"
+    path.write_bytes(b'{"key": "01", "rating": 1}\n{"key": "02", "title": "\xff"}\n{"key": "03", "rating": 1}\n')
+    report = library_io.import_library(lib, str(path))
+    assert [line for line, _ in report.errors] == [2] and report.updated == 2
+    path = tmp_path / "changes.csv"
+    path.write_bytes(b"key,title\n04,\xffx\n05," + b"x" * 200_000 + b"\n02,Fine\n")
+    report = library_io.import_library(lib, str(path))
+    assert [line for line, _ in report.errors] == [2, 3] and lib.get_name("02") == "Fine"
+    load()
+
+
+def test_invalid_rows_still_yield_between_batches(tmp_path):
+    """Test that a file of bad and repeated rows is read in several steps, not in one."""
+    load()
+    path = tmp_path / "changes.jsonl"
+    path.write_text('{"key": "01", "rating": 9}\n' * 25 + '{"key": "01", "rating": 1}\n' * 25, encoding="utf-8")
+    report = library_io.ImportReport()
+    steps = [(report.rows, report.error_count, report.updated)
+             for _ in library_io.import_batches(lib, str(path), report, batch_rows=10)]
+    assert steps[:3] == [(10, 10, 0), (20, 20, 0), (30, 25, 1)]
+    assert len(steps) == 6 and report.updated == 1 and lib.get_rating("01") == 1
+    load()
+
+
+def test_artist_changes_reach_columns_and_stats(monkeypatch):
+    """Test that an imported artist moves the track's totals to the new artist."""
+    load()
+    columns = library_columns.LibraryColumns(lib)
+    monkeypatch.setitem(library_columns._columns, lib.__name__, columns)  # Not left following the library
+    stats = LibraryStats(lib)
+    try:
+        played = lib.get_play_count("02")
+        lib.update_tracks({"02": {"artist": "Someone New"}})
+        new_id = columns.artist_id[columns.rows["02"]]
+        assert columns.artists[new_id] == "Someone New"
+        assert stats.artist_tracks[new_id] == 1 and stats.artist_plays[new_id] == played
+        kept = stats.artist_tracks.copy(), stats.artist_ratings.copy()
+        stats.recompute()
+        assert (stats.artist_tracks.tolist(), stats.artist_ratings.tolist()) == (kept[0].tolist(), kept[1].tolist())
+    finally:
+        stats.close()
+        columns.close()
+        load()
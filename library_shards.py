@@ -0,0 +1,235 @@
+import bisect
+import collections
+import gzip
+import json
+import lzma
+import os
+import threading
+
+from library_snapshot import LibrarySnapshot
+
+MANIFEST = "manifest.json"
+FORMAT = 1
+SHARD_TRACKS = 2048  # Tracks per shard when a library is split
+MAX_LOADED_TRACKS = 50_000  # Memory budget: unchanged shards are evicted beyond this many tracks
+CODECS = {".gz": gzip.open, ".xz": lzma.open}
+
+
+def open_shard(path, mode):
+    """Open a shard file as text, compressed with gzip or lzma according to its extension."""
+    return CODECS[os.path.splitext(path)[1]](path, mode + "t", encoding="utf-8")
+
+
+def write_shard(path, records):
+    """Write (key, record) pairs as compressed JSON lines, replacing the file only once complete."""
+    temporary_path = f"{path}.{os.getpid()}.tmp{os.path.splitext(path)[1]}"
+    with open_shard(temporary_path, "w") as file:
+        for key, record in records:
+            file.write(json.dumps({"key": key, **record}) + "\n")
+    os.replace(temporary_path, path)
+
+
+def read_shard(path):
+    """Yield (key, record) pairs from a shard, decompressing it as a stream."""
+    with open_shard(path, "r") as file:
+        for line in file:
+            record = json.loads(line)
+            yield record.pop("key"), record
+
+
+def write_manifest(directory, shards):
+    temporary_path = os.path.join(directory, MANIFEST + ".tmp")
+    with open(temporary_path, "w", encoding="utf-8") as file:
+        json.dump({"format": FORMAT, "shards": shards}, file, indent=1)
+    os.replace(temporary_path, os.path.join(directory, MANIFEST))
+
+
+def write_shards(directory, records, shard_tracks=SHARD_TRACKS, extension=".gz"):
+    """
+    Split (key, record) pairs into shards of consecutive key ranges and write them with a manifest.
+    Records are the dicts stored in library.json, e.g. {"title": ..., "artist": ..., "rating": ...}.
+    """
+    os.makedirs(directory, exist_ok=True)
+    records = sorted(records, key=lambda pair: pair[0])
+    shards = []
+    for start in range(0, len(records), shard_tracks):
+        chunk = records[start:start + shard_tracks]
+        name = f"shard-{len(shards):05d}.jsonl{extension}"
+        write_shard(os.path.join(directory, name), chunk)
+        shards.append({"file": name, "first": chunk[0][0], "last": chunk[-1][0], "count": len(chunk)})
+    write_manifest(directory, shards)
+
+
+class ShardStore:
+    """
+    A library split into compressed shards of consecutive key ranges, described by a
+    small manifest. A shard is read on the first lookup of a key in its range and kept
+    as a LibrarySnapshot in an LRU cache; once more than max_loaded tracks are cached,
+    the least recently used shards are dropped and read again when next needed.
+    Changed shards are never evicted: they live in the ShardedSnapshot that changed
+    them until they are saved.
+    """
+    def __init__(self, directory, item_from_record, record_of, max_loaded=MAX_LOADED_TRACKS):
+        self.directory = directory
+        self.item_from_record = item_from_record  # record dict -> library item
+        self.record_of = record_of  # library item -> record dict
+        self.max_loaded = max_loaded
+        with open(os.path.join(directory, MANIFEST), "r", encoding="utf-8") as file:
+            manifest = json.load(file)
+        if manifest.get("format") != FORMAT:
+            raise ValueError(f"Unsupported shard manifest format {manifest.get('format')!r}")
+        self.shards = manifest["shards"]
+        self.firsts = [shard["first"] for shard in self.shards]  # Sorted; a key belongs to the last shard starting at or before it
+        self.cache = collections.OrderedDict()  # Shard index -> LibrarySnapshot, least recently used first
+        self.loaded = 0  # Tracks in the cache
+        self.lock = threading.Lock()
+
+    def shard_for(self, key):
+        """Index of the shard whose key range holds key, or would hold it if it were added."""
+        return max(bisect.bisect_right(self.firsts, key) - 1, 0)
+
+    def count(self, index):
+        return self.shards[index]["count"] if index < len(self.shards) else 0
+
+    def load(self, index):
+        """The tracks of a shard as a LibrarySnapshot, read from disk unless cached."""
+        with self.lock:
+            shard = self.cache.get(index)
+            if shard is not None:
+                self.cache.move_to_end(index)
+                return shard
+            if index < len(self.shards):
+                path = os.path.join(self.directory, self.shards[index]["file"])
+                shard = LibrarySnapshot.from_items(
+                    (key, self.item_from_record(record)) for key, record in read_shard(path)
+                )
+            else:
+                shard = LibrarySnapshot()  # A library with no shards yet
+            self.remember(index, shard)
+            return shard
+
+    def remember(self, index, shard):
+        """Cache a shard and evict the least recently used ones beyond the budget. Holds the lock."""
+        previous = self.cache.pop(index, None)
+        if previous is not None:
+            self.loaded -= len(previous)
+        self.cache[index] = shard
+        self.loaded += len(shard)
+        while self.loaded > self.max_loaded and len(self.cache) > 1:
+            _, evicted = self.cache.popitem(last=False)
+            self.loaded -= len(evicted)
+
+    def save(self, changed):
+        """Write changed shards (index -> LibrarySnapshot) and the manifest, then cache them as saved."""
+        with self.lock:
+            for index, shard in sorted(changed.items()):
+                if index >= len(self.shards):
+                    self.shards.append({"file": f"shard-{index:05d}.jsonl.gz"})
+                entry = self.shards[index]
+                records = sorted((key, self.record_of(item)) for key, item in shard.items())
+                write_shard(os.path.join(self.directory, entry["file"]), records)
+                if records:
+                    entry.update(first=records[0][0], last=records[-1][0])  # Only the first shard can start earlier
+                entry["count"] = len(records)
+                self.remember(index, shard)
+            self.firsts = [shard["first"] for shard in self.shards]
+            write_manifest(self.directory, self.shards)
+
+
+class ShardedSnapshot:
+    """
+    A version of a sharded library with the read-only interface of a LibrarySnapshot.
+    Unchanged shards are read through the shared ShardStore, so a lookup only loads the
+    shard holding its key; shards changed since the last save are kept here, each as
+    its own LibrarySnapshot. Changing a track builds a new ShardedSnapshot and leaves
+    this one as it was. A full scan (items(), values(), iteration) reads every shard
+    as a stream, keeping no more of them in memory than the store's budget allows.
+    Saving rewrites shard files, so a version older than the save reads the saved
+    tracks from any shard it had not loaded before.
+    """
+    __slots__ = ("store", "changed", "version")
+
+    def __init__(self, store, changed=None, version=0):
+        self.store = store
+        self.changed = changed if changed is not None else {}  # Shard index -> LibrarySnapshot, never modified
+        self.version = version
+
+    def shard(self, index):
+        changed = self.changed.get(index)
+        return changed if changed is not None else self.store.load(index)
+
+    def shard_indexes(self):
+        return range(max(len(self.store.shards), max(self.changed, default=-1) + 1))
+
+    def __getitem__(self, key):
+        return self.shard(self.store.shard_for(key))[key]
+
+    def get(self, key, default=None):
+        return self.shard(self.store.shard_for(key)).get(key, default)
+
+    def __contains__(self, key):
+        return key in self.shard(self.store.shard_for(key))
+
+    def __len__(self):
+        return sum(len(self.changed[index]) if index in self.changed else self.store.count(index)
+                   for index in self.shard_indexes())
+
+    def __iter__(self):
+        for index in self.shard_indexes():
+            yield from self.shard(index)
+
+    def keys(self):
+        return ShardedView(self, lambda shard: shard.keys())
+
+    def values(self):
+        return ShardedView(self, lambda shard: shard.values())
+
+    def items(self):
+        return ShardedView(self, lambda shard: shard.items())
+
+    def set(self, key, item):
+        """New snapshot with one track changed or added."""
+        return self.update({key: item})
+
+    def update(self, changes):
+        """New snapshot with several tracks changed or added; only the shards they fall in are copied."""
+        by_shard = {}
+        for key, item in changes.items():
+            by_shard.setdefault(self.store.shard_for(key), {})[key] = item
+        changed = dict(self.changed)
+        for index, shard_changes in by_shard.items():
+            changed[index] = self.shard(index).update(shard_changes)
+        return ShardedSnapshot(self.store, changed, self.version + 1)
+
+    def save(self):
+        """Write the changed shards and return the same library with nothing left to save."""
+        self.store.save(self.changed)
+        return ShardedSnapshot(self.store, {}, self.version)
+
+
+class ShardedView:
+    """Keys, values or items of a sharded snapshot, shard by shard; can be iterated more than once."""
+    __slots__ = ("snapshot", "part")
+
+    def __init__(self, snapshot, part):
+        self.snapshot = snapshot
+        self.part = part
+
+    def __len__(self):
+        return len(self.snapshot)
+
+    def __iter__(self):
+        for index in self.snapshot.shard_indexes():
+            yield from self.part(self.snapshot.shard(index))
+
+
+if __name__ == "__main__":
+    import sys
+    # Usage: python library_shards.py [library.json] [shard directory]
+    base = os.path.dirname(os.path.abspath(__file__))
+    source = sys.argv[1] if len(sys.argv) > 1 else os.path.join(base, "library.json")
+    target = sys.argv[2] if len(sys.argv) > 2 else os.path.join(base, "library_shards")
+    with open(source, "r", encoding="utf-8") as file:
+        data = json.load(file)
+    write_shards(target, data.items())
+    print(f"Wrote {len(data)} tracks to {target}")
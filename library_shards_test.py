@@ -0,0 +1,40 @@
+import os
+
+import Track_Library_JSON as lib
+import library_shards
+
+
+def test_lookups_load_only_their_shard(tmp_path):
+    """Test that a lookup reads one shard, and that changes are saved to their shard only."""
+    lib.load_library_from_json(os.path.join(os.path.dirname(__file__), "library.json"))
+    expected = {key: (lib.get_name(key), lib.get_rating(key)) for key in lib.snapshot()}
+    records = [(key, lib.record_of(item)) for key, item in lib.snapshot().items()]
+    library_shards.write_shards(str(tmp_path), records, shard_tracks=2)
+
+    lib.load_library_from_shards(str(tmp_path))
+    store = lib.snapshot().store
+    assert len(store.shards) > 2 and not store.cache
+    assert lib.get_name("01") == expected["01"][0]
+    assert list(store.cache) == [store.shard_for("01")]
+
+    before = os.path.getmtime(tmp_path / store.shards[-1]["file"])
+    lib.set_rating("01", 1)
+    lib.save_library_to_shards()
+    assert os.path.getmtime(tmp_path / store.shards[-1]["file"]) == before
+
+    lib.load_library_from_shards(str(tmp_path))
+    assert lib.get_rating("01") == 1
+    assert {key: (item.name, item.rating) for key, item in lib.snapshot().items()} == {**expected, "01": (expected["01"][0], 1)}
+    lib.load_library_from_json(os.path.join(os.path.dirname(__file__), "library.json"))
+
+
+def test_cache_stays_within_budget(tmp_path):
+    """Test that a full scan of an lzma-compressed library evicts shards beyond the memory budget."""
+    records = [(f"{number:04d}", {"title": f"T{number}", "artist": "A", "rating": 3}) for number in range(100)]
+    library_shards.write_shards(str(tmp_path), records, shard_tracks=10, extension=".xz")
+    store = library_shards.ShardStore(str(tmp_path), lib.item_from_record, lib.record_of, max_loaded=25)
+    snapshot = library_shards.ShardedSnapshot(store)
+    assert [key for key, _ in snapshot.items()] == [key for key, _ in records]
+    assert len(snapshot) == 100 and store.loaded <= 25
+    assert snapshot.set("0055", lib.item_from_record({"title": "X", "artist": "B", "rating": 1}))["0055"].name == "X"
+    assert snapshot["0055"].name == "T55"
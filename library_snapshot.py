@@ -0,0 +1,224 @@
+import copy
+
+BITS = 5
+WIDTH = 1 << BITS  # Children per trie node
+MASK = WIDTH - 1
+
+
+def _new_path(shift, value):
+    """A chain of single-child nodes from a node at the given shift down to a leaf holding value."""
+    node = (value,)
+    while shift > 0:
+        node = (node,)
+        shift -= BITS
+    return node
+
+
+class PersistentVector:
+    """
+    Immutable sequence stored as a 32-way trie of tuples.
+    set() and append() copy only the nodes on the path to one element, a handful
+    of small tuples, and share everything else with the vector they came from.
+    """
+    __slots__ = ("count", "shift", "root")
+
+    def __init__(self, count=0, shift=0, root=()):
+        self.count = count
+        self.shift = shift  # Bits consumed below the root; 0 when the root is itself a leaf
+        self.root = root
+
+    @classmethod
+    def from_values(cls, values):
+        """Build a vector bottom-up in one pass."""
+        level = [tuple(values[start:start + WIDTH]) for start in range(0, len(values), WIDTH)] or [()]
+        shift = 0
+        while len(level) > 1:
+            level = [tuple(level[start:start + WIDTH]) for start in range(0, len(level), WIDTH)]
+            shift += BITS
+        return cls(len(values), shift, level[0])
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        if not 0 <= index < self.count:
+            raise IndexError("vector index out of range")
+        node = self.root
+        for level in range(self.shift, 0, -BITS):
+            node = node[(index >> level) & MASK]
+        return node[index & MASK]
+
+    def __iter__(self):
+        return self._walk(self.root, self.shift)
+
+    def _walk(self, node, shift):
+        if shift == 0:
+            yield from node
+        else:
+            for child in node:
+                yield from self._walk(child, shift - BITS)
+
+    def set(self, index, value):
+        """New vector with the element at index replaced."""
+        if not 0 <= index < self.count:
+            raise IndexError("vector index out of range")
+
+        def assoc(node, shift):
+            slot = (index >> shift) & MASK
+            child = value if shift == 0 else assoc(node[slot], shift - BITS)
+            return node[:slot] + (child,) + node[slot + 1:]
+        return PersistentVector(self.count, self.shift, assoc(self.root, self.shift))
+
+    def set_many(self, changes):
+        """
+        New vector with the elements at several indexes replaced, given as a dict of index -> value.
+        Each node on the paths to them is copied once, however many of its elements change.
+        """
+        for index in changes:
+            if not 0 <= index < self.count:
+                raise IndexError("vector index out of range")
+
+        def assoc(node, shift, indexes):
+            node = list(node)
+            if shift == 0:
+                for index in indexes:
+                    node[index & MASK] = changes[index]
+            else:
+                slots = {}
+                for index in indexes:
+                    slots.setdefault((index >> shift) & MASK, []).append(index)
+                for slot, below in slots.items():
+                    node[slot] = assoc(node[slot], shift - BITS, below)
+            return tuple(node)
+        if not changes:
+            return self
+        return PersistentVector(self.count, self.shift, assoc(self.root, self.shift, changes))
+
+    def append(self, value):
+        """New vector with value added at the end."""
+        index = self.count
+        if index == 1 << (self.shift + BITS):
+            # The trie is full; grow it by one level
+            return PersistentVector(index + 1, self.shift + BITS, (self.root, _new_path(self.shift, value)))
+
+        def push(node, shift):
+            if shift == 0:
+                return node + (value,)
+            slot = (index >> shift) & MASK
+            if slot < len(node):
+                return node[:slot] + (push(node[slot], shift - BITS),) + node[slot + 1:]
+            return node + (_new_path(shift - BITS, value),)
+        return PersistentVector(index + 1, self.shift, push(self.root, self.shift))
+
+
+class LibrarySnapshot:
+    """
+    Immutable, versioned view of a track library with the read-only interface of a dict.
+    Items live in a PersistentVector in library order, found through a key -> position
+    dict that is never modified once published. Changing a track builds a new snapshot
+    that shares the position dict and all but one path of the vector, so readers can
+    hold on to any version for as long as they like without locks or copies.
+    Items must be treated as frozen; use replace_item() to change one.
+    """
+    __slots__ = ("positions", "items_vector", "version")
+
+    def __init__(self, positions=None, items_vector=None, version=0):
+        self.positions = positions if positions is not None else {}
+        self.items_vector = items_vector if items_vector is not None else PersistentVector()
+        self.version = version
+
+    @classmethod
+    def from_items(cls, pairs, version=0):
+        """Build a snapshot from (key, item) pairs; a repeated key keeps its first position and last item."""
+        positions = {}
+        values = []
+        for key, item in pairs:
+            if key in positions:
+                values[positions[key]] = item
+            else:
+                positions[key] = len(values)
+                values.append(item)
+        return cls(positions, PersistentVector.from_values(values), version)
+
+    def __getitem__(self, key):
+        return self.items_vector[self.positions[key]]
+
+    def get(self, key, default=None):
+        position = self.positions.get(key)
+        return default if position is None else self.items_vector[position]
+
+    def __contains__(self, key):
+        return key in self.positions
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __iter__(self):
+        return iter(self.positions)
+
+    def keys(self):
+        return self.positions.keys()
+
+    def values(self):
+        return self.items_vector  # Immutable, so it can be iterated as often as needed
+
+    def items(self):
+        return SnapshotItems(self)
+
+    def set(self, key, item):
+        """New snapshot with one track changed or added."""
+        position = self.positions.get(key)
+        if position is None:
+            return self.update({key: item})
+        return LibrarySnapshot(self.positions, self.items_vector.set(position, item), self.version + 1)
+
+    def update(self, changes):
+        """
+        New snapshot with several tracks changed or added at once.
+        Changes to existing tracks copy the trie paths to them once for the whole batch;
+        new tracks are appended and the key index is copied once for the whole batch.
+        """
+        positions = self.positions
+        replaced = {}  # Position -> item
+        added = []
+        for key, item in changes.items():
+            position = positions.get(key)
+            if position is None:
+                added.append((key, item))
+            else:
+                replaced[position] = item
+        vector = self.items_vector.set_many(replaced)
+        for key, item in added:
+            if positions is self.positions:
+                positions = dict(positions)  # The published index is never modified
+            positions[key] = len(vector)
+            vector = vector.append(item)
+        return LibrarySnapshot(positions, vector, self.version + 1)
+
+
+class SnapshotItems:
+    """The (key, item) pairs of a snapshot, like dict.items(), in library order."""
+    __slots__ = ("snapshot",)
+
+    def __init__(self, snapshot):
+        self.snapshot = snapshot
+
+    def __len__(self):
+        return len(self.snapshot)
+
+    def __iter__(self):
+        return zip(self.snapshot.positions, self.snapshot.items_vector)
+
+
+def replace_item(item, **changes):
+    """Copy of a library item with some attributes changed; the original is left untouched."""
+    if not hasattr(item, "__dict__"):
+        new_item = copy.copy(item)
+        for name, value in changes.items():
+            setattr(new_item, name, value)
+        return new_item
+    # Plain items are copied through their attribute dicts, several times faster than copy.copy
+    new_item = object.__new__(type(item))
+    new_item.__dict__.update(item.__dict__)
+    new_item.__dict__.update(changes)
+    return new_item
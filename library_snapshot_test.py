@@ -0,0 +1,115 @@
+import os
+import random
+import threading
+
+import Track_Library_JSON as lib
+from library_item import LibraryItem
+from library_snapshot import LibrarySnapshot, PersistentVector
+
+
+def test_vector_matches_a_list():
+    """Test that sets and appends across several trie levels behave like a list."""
+    rng = random.Random(1)
+    expected = list(range(40))
+    vector = PersistentVector.from_values(expected)
+    for step in range(1200):
+        if rng.random() < 0.5:
+            expected.append(step)
+            vector = vector.append(step)
+        else:
+            index = rng.randrange(len(expected))
+            expected[index] = -step
+            vector = vector.set(index, -step)
+    assert list(vector) == expected
+    assert [vector[index] for index in range(len(expected))] == expected
+
+
+def test_old_snapshots_never_change():
+    """Test that changing a track publishes a new version and leaves the old one as it was."""
+    old = LibrarySnapshot.from_items([("01", LibraryItem("A", "X", 1)), ("02", LibraryItem("B", "Y", 2))])
+    new = old.set("02", LibraryItem("B", "Y", 5)).set("03", LibraryItem("C", "Z", 3))
+    assert old["02"].rating == 2 and "03" not in old
+    assert new["02"].rating == 5 and list(new) == ["01", "02", "03"]
+    assert new["01"] is old["01"]  # Unchanged tracks are shared
+    assert new.version == old.version + 2
+
+
+def test_readers_see_whole_versions_during_reloads_and_updates():
+    """Test that a reader thread listing the library never sees a half-loaded or changing library."""
+    library_path = os.path.join(os.path.dirname(__file__), "library.json")
+    lib.load_library_from_json(library_path)
+    size = len(lib.snapshot())
+    stop = threading.Event()
+    problems = []
+
+    def reader():
+        while not stop.is_set():
+            snapshot = lib.snapshot()
+            ratings = [item.rating for item in snapshot.values()]
+            if len(snapshot) != size or [snapshot[key].rating for key in snapshot] != ratings:
+                problems.append(snapshot.version)
+
+    thread = threading.Thread(target=reader)
+    thread.start()
+    for step in range(300):
+        lib.set_rating("01", step % 5 + 1)
+        lib.increment_play_count("02")
+        if step % 50 == 0:
+            lib.load_library_from_json(library_path)
+    stop.set()
+    thread.join()
+    assert problems == []
+
+
+def test_listeners_hear_changes_in_publish_order():
+    """Test that a change published while another is being delivered reaches the listeners after it."""
+    library_path = os.path.join(os.path.dirname(__file__), "library.json")
+    lib.load_library_from_json(library_path)
+    heard = []
+    writers = []
+
+    def listener(key, field, old, new):
+        if field == "rating" and new == 1 and not writers:
+            writer = threading.Thread(target=lib.set_rating, args=("01", 2))
+            writers.append(writer)
+            writer.start()
+            while lib.get_rating("01") != 2:  # Published, and now waiting to be delivered
+                writer.join(timeout=0.01)
+            writer.join(timeout=0.2)
+        if field == "rating":
+            heard.append(new)
+
+    lib.add_listener(listener)
+    try:
+        lib.set_rating("01", 1)
+        writers[0].join()
+        assert heard == [1, 2]
+        lib.update_tracks({"01": {"rating": 3}, "02": {"rating": 4}})
+        assert heard == [1, 2, 3, 4] and not lib.undelivered
+    finally:
+        lib.remove_listener(listener)
+        lib.load_library_from_json(library_path)
+
+
+def test_a_failing_listener_does_not_stop_the_others(capsys):
+    """Test that a listener error is reported, and neither escapes the writer nor keeps the change from later listeners."""
+    library_path = os.path.join(os.path.dirname(__file__), "library.json")
+    lib.load_library_from_json(library_path)
+    heard = []
+
+    def failing(key, field, old, new):
+        raise OverflowError("rating out of range")
+
+    lib.add_listener(failing)
+    def listener(key, field, old, new):
+        heard.append((key, field, new))
+
+    lib.add_listener(listener)
+    try:
+        lib.set_rating("01", 200)
+        assert lib.get_rating("01") == 200 and heard == [("01", "rating", 200)]
+        assert "OverflowError" in capsys.readouterr().err
+    finally:
+        lib.remove_listener(failing)
+        lib.remove_listener(listener)
+        lib.load_library_from_json(library_path)
@@ -0,0 +1,189 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from audio_engine import SAMPLE_RATE, decode_file
+import media_cache
+
+TARGET_LOUDNESS = -18.0  # LUFS; the ReplayGain 2.0 reference level
+MAX_GAIN = 12.0  # dB; limits how far quiet or near-silent tracks are boosted
+SUB_BLOCK_SECONDS = 0.1  # Loudness is measured over 400 ms windows stepped by 100 ms
+ABSOLUTE_GATE = -70.0  # LUFS
+RELATIVE_GATE = -10.0  # LU below the absolutely gated loudness
+CACHE_FILE = os.path.join(media_cache.CACHE_DIR, "loudness.json")
+HASH_CHUNK = 1 << 20
+
+
+def content_hash(path):
+    """SHA-256 of a file's contents, read in 1 MB chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(HASH_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def k_weighting_power(size, sample_rate=SAMPLE_RATE):
+    """
+    Squared magnitude response of the BS.1770 K-weighting filter (shelf and
+    high-pass) at the rfft bins of a block of the given size.
+    """
+    # The standard's biquads are specified at 48 kHz; evaluate them at the same physical frequencies
+    frequencies = np.fft.rfftfreq(size, 1 / sample_rate)
+    z = np.exp(-1j * 2 * np.pi * frequencies / 48000)
+    shelf = (1.53512485958697 - 2.69169618940638 * z + 1.19839281085285 * z ** 2) / (
+        1 - 1.69065929318241 * z + 0.73248077421585 * z ** 2)
+    high_pass = (1 - 2 * z + z ** 2) / (1 - 1.99004745483398 * z + 0.99007225036621 * z ** 2)
+    return np.abs(shelf * high_pass) ** 2
+
+
+def integrated_loudness(samples, sample_rate=SAMPLE_RATE):
+    """
+    Gated integrated loudness in LUFS of int16 frames of shape (frames, channels).
+    Each 100 ms sub-block is K-weighted in the frequency domain and its mean
+    square taken via Parseval, all channels and sub-blocks in one batch.
+    """
+    size = int(sample_rate * SUB_BLOCK_SECONDS)
+    count = len(samples) // size
+    if count < 4:
+        return None  # Shorter than one 400 ms window
+    # (sub-blocks, channels, samples per sub-block)
+    blocks = samples[:count * size].reshape(count, size, -1).transpose(0, 2, 1).astype(np.float32) / 32768
+    spectrum = np.fft.rfft(blocks, axis=-1)
+    weights = k_weighting_power(size, sample_rate)
+    weights[1:-1 if size % 2 == 0 else None] *= 2  # Each interior bin stands for a +/- frequency pair
+    sub_power = (np.abs(spectrum) ** 2 @ weights) / (size * size)  # Mean square per sub-block and channel
+    sub_power = sub_power.sum(axis=1)  # Channels are summed with unit weights (front left/right)
+
+    # 400 ms windows with 75% overlap are the mean of four consecutive sub-blocks
+    cumulative = np.concatenate(([0.0], np.cumsum(sub_power)))
+    window_power = (cumulative[4:] - cumulative[:-4]) / 4
+    with np.errstate(divide="ignore"):
+        window_loudness = -0.691 + 10 * np.log10(window_power)
+
+    gated = window_power[window_loudness > ABSOLUTE_GATE]
+    if not len(gated):
+        return None  # Silence
+    relative_gate = -0.691 + 10 * np.log10(gated.mean()) + RELATIVE_GATE
+    gated = window_power[window_loudness > max(ABSOLUTE_GATE, relative_gate)]
+    return float(-0.691 + 10 * np.log10(gated.mean()))
+
+
+def measure_file(path):
+    """
+    Decode a file and measure it. Runs in a media_cache.decode_pool() worker.
+    Returns (path, content hash, loudness in LUFS or None).
+    """
+    return path, content_hash(path), integrated_loudness(decode_file(path))
+
+
+def hash_file(path):
+    """Returns (path, content hash). Much cheaper than measure_file, so known content is found first."""
+    return path, content_hash(path)
+
+
+def gain_for_loudness(loudness):
+    """Gain in dB that brings a track of the given loudness to the target level."""
+    if loudness is None:
+        return 0.0
+    return float(np.clip(TARGET_LOUDNESS - loudness, -MAX_GAIN, MAX_GAIN))
+
+
+class LoudnessCache:
+    """
+    Measured loudness by content hash, plus a fingerprint -> content hash map so
+    unchanged files are recognised with one stat. Stored as one JSON file.
+    """
+    def __init__(self, path=CACHE_FILE):
+        self.path = path
+        self.loudness = {}  # content hash -> LUFS, or None for silent or very short tracks
+        self.hashes = {}  # file fingerprint -> content hash
+        self.dirty = False
+        try:
+            with open(path, "r") as file:
+                data = json.load(file)
+            self.loudness = data.get("loudness", {})
+            self.hashes = data.get("hashes", {})
+        except (OSError, ValueError):
+            pass
+
+    def save(self):
+        """Write the cache if anything changed since it was loaded or last saved."""
+        if not self.dirty:
+            return
+        data = json.dumps({"loudness": self.loudness, "hashes": self.hashes}).encode("utf-8")
+        media_cache.write_atomically(self.path, lambda file: file.write(data))
+        self.dirty = False
+
+    def known_hash(self, path):
+        """The content hash of an unchanged file seen before, or None."""
+        try:
+            return self.hashes.get(media_cache.file_fingerprint(path))
+        except OSError:
+            return None
+
+    def record_hash(self, path, digest):
+        self.hashes[media_cache.file_fingerprint(path)] = digest
+        self.dirty = True
+
+    def record_loudness(self, path, digest, loudness):
+        self.record_hash(path, digest)
+        self.loudness[digest] = loudness
+
+    def is_measured(self, digest):
+        return digest in self.loudness
+
+    def next_job(self, path):
+        """The worker function a file still needs: hash_file, measure_file, or None once it is measured."""
+        digest = self.known_hash(path)
+        if digest is None:
+            return hash_file
+        return None if self.is_measured(digest) else measure_file
+
+    def record(self, result):
+        """Store the result of a hash_file or measure_file job."""
+        if len(result) == 2:
+            self.record_hash(*result)
+        else:
+            self.record_loudness(*result)
+
+    def gain(self, path):
+        """Gain in dB for a file, or 0.0 if it has not been analysed."""
+        digest = self.known_hash(path)
+        if digest is None or digest not in self.loudness:
+            return 0.0
+        return gain_for_loudness(self.loudness[digest])
+
+    def gain_factor(self, path):
+        """Linear amplitude factor for a file's gain."""
+        return 10 ** (self.gain(path) / 20)
+
+
+def analyze(paths, cache=None, max_workers=None):
+    """
+    Measure every file whose content has not been measured before, using all cores.
+    Files are hashed first, so renamed or touched copies of known content are not decoded again.
+    """
+    cache = cache or LoudnessCache()
+    with media_cache.decode_pool(max_workers) as pool:
+        for result in pool.map(hash_file, [path for path in paths if cache.next_job(path) is hash_file]):
+            cache.record(result)
+        pending = [path for path in paths if cache.next_job(path) is measure_file]
+        for path, digest, loudness in pool.map(measure_file, pending):
+            cache.record_loudness(path, digest, loudness)
+            level = "silent" if loudness is None else f"{loudness:.1f} LUFS"
+            print(f"{path}: {level}, gain {gain_for_loudness(loudness):+.1f} dB")
+    cache.save()
+    return cache
+
+
+if __name__ == "__main__":
+    import sys
+    # Usage: python loudness.py [music folder]
+    folder = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(os.path.abspath(__file__)), "MusicPlayer")
+    songs = []
+    for root, _, files in os.walk(folder):
+        songs.extend(os.path.join(root, name) for name in files if name.lower().endswith(".mp3"))
+    analyze(songs)
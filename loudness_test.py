@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+import loudness
+
+
+def sine(amplitude, frequency, seconds=5):
+    """Stereo int16 sine wave at the engine's sample rate."""
+    t = np.arange(int(loudness.SAMPLE_RATE * seconds)) / loudness.SAMPLE_RATE
+    wave = (amplitude * 32767 * np.sin(2 * np.pi * frequency * t)).astype(np.int16)
+    return np.stack([wave, wave], axis=1)
+
+
+def test_reference_tone_loudness():
+    """Test that a stereo 997 Hz tone at -20 dBFS measures -20 LUFS, as in BS.1770."""
+    assert loudness.integrated_loudness(sine(0.1, 997)) == pytest.approx(-20.0, abs=0.1)
+
+
+def test_low_frequencies_are_weighted_down():
+    """Test that the K-weighting high-pass makes a bass tone quieter than a 1 kHz tone."""
+    assert loudness.integrated_loudness(sine(0.1, 40)) < -25
+
+
+def test_silence_and_short_clips_get_no_gain():
+    """Test that silent or very short audio is left at its volume."""
+    assert loudness.integrated_loudness(np.zeros((loudness.SAMPLE_RATE, 2), dtype=np.int16)) is None
+    assert loudness.integrated_loudness(sine(0.1, 997, seconds=0.2)) is None
+    assert loudness.gain_for_loudness(None) == 0.0
+
+
+def test_gain_is_limited():
+    """Test that the gain moves toward the target but never beyond MAX_GAIN."""
+    assert loudness.gain_for_loudness(loudness.TARGET_LOUDNESS + 3) == pytest.approx(-3)
+    assert loudness.gain_for_loudness(-60) == loudness.MAX_GAIN
+
+
+def test_cache_skips_known_content(tmp_path):
+    """Test that a measured file needs no further jobs, and a copy of it only needs hashing."""
+    song = tmp_path / "song.mp3"
+    song.write_bytes(b"not really audio")
+    cache = loudness.LoudnessCache(str(tmp_path / "loudness.json"))
+    assert cache.next_job(str(song)) is loudness.hash_file
+
+    cache.record(loudness.hash_file(str(song)))
+    assert cache.next_job(str(song)) is loudness.measure_file
+    cache.record((str(song), loudness.content_hash(str(song)), -12.0))
+    cache.save()
+
+    copy = tmp_path / "copy.mp3"
+    copy.write_bytes(song.read_bytes())
+    reloaded = loudness.LoudnessCache(str(tmp_path / "loudness.json"))
+    assert reloaded.next_job(str(song)) is None
+    assert reloaded.gain(str(song)) == pytest.approx(-6.0)
+    assert reloaded.next_job(str(copy)) is loudness.hash_file
+    reloaded.record(loudness.hash_file(str(copy)))
+    assert reloaded.next_job(str(copy)) is None
@@ -0,0 +1,44 @@
+import hashlib
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+# Derived data (waveform peaks and the like) is cached next to the scripts
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache")
+
+
+def file_fingerprint(path):
+    """
+    Identify a file by its absolute path, size and modification time.
+    Cheap to compute with a single stat, and changes whenever the file is rewritten.
+    """
+    stat = os.stat(path)
+    text = f"{os.path.abspath(path)}|{stat.st_size}|{stat.st_mtime_ns}"
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def cache_path(kind, name, extension):
+    """Path of a cache entry of one kind, e.g. cache_path("peaks", fingerprint, ".npy")."""
+    return os.path.join(CACHE_DIR, kind, name[:2], name + extension)
+
+
+def write_atomically(path, write):
+    """Call write(file) on a temporary file and move it into place once complete."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary_path = f"{path}.{os.getpid()}.tmp"
+    with open(temporary_path, "wb") as file:
+        write(file)
+    os.replace(temporary_path, path)
+
+
+def decode_pool(max_workers=None):
+    """
+    Process pool whose workers can decode audio, one per core by default.
+    Workers are spawned so they never inherit the GUI's sound device.
+    """
+    from audio_engine import init_decoder  # Imported here, so modules that only cache files do not load pygame
+    return ProcessPoolExecutor(
+        max_workers=max_workers or os.cpu_count(),
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=init_decoder,
+    )
@@ -0,0 +1,242 @@
+import atexit
+import collections
+import multiprocessing
+import os
+import threading
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+PARALLEL_MIN_TRACKS = 100_000  # Smaller libraries are scanned in-process; a pool round trip costs more
+PARTITIONS_PER_WORKER = 4  # Several partitions per worker even out partitions that take longer
+MIN_PARTITION_ROWS = 25_000
+TEXT_FIELDS = ("name", "artist")
+NUMBER_FIELDS = {"rating": np.int32, "play_count": np.int32}
+
+
+class ScanColumns:
+    """
+    Compact columns of a library for scanning, in key order. Titles and artists are
+    lowercased into one UTF-8 buffer per field, each row preceded and followed by a newline,
+    with an array of row start offsets; ratings and play counts are NumPy arrays. The
+    arrays are either plain (in a worker, mapped from shared memory) or created in shared
+    memory by share(), so a whole library is handed to a pool as a few block names.
+    """
+    def __init__(self, arrays, blocks=()):
+        self.arrays = arrays  # Name -> array, e.g. "name_text", "name_starts", "rating"
+        self.blocks = list(blocks)  # SharedMemory blocks backing the arrays
+        self.rows = len(arrays["rating"])
+
+    @classmethod
+    def from_tracks(cls, names, artists, ratings, play_counts):
+        arrays = {}
+        for field, texts in (("name", names), ("artist", artists)):
+            encoded = [text.lower().replace("\n", " ").encode("utf-8") for text in texts]
+            lengths = np.fromiter((len(text) for text in encoded), dtype=np.int64, count=len(encoded))
+            starts = np.empty(len(encoded) + 1, dtype=np.int64)
+            starts[0] = 1
+            np.cumsum(lengths + 1, out=starts[1:])
+            starts[1:] += 1
+            arrays[f"{field}_text"] = np.frombuffer(b"\n" + b"\n".join(encoded) + b"\n", dtype=np.uint8)
+            arrays[f"{field}_starts"] = starts
+        arrays["rating"] = np.asarray(ratings, dtype=NUMBER_FIELDS["rating"])
+        arrays["play_count"] = np.asarray(play_counts, dtype=NUMBER_FIELDS["play_count"])
+        return cls(arrays)
+
+    def share(self):
+        """Copy the arrays into new shared memory blocks; the caller must close() the result."""
+        arrays = {}
+        blocks = []
+        for name, array in self.arrays.items():
+            block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            blocks.append(block)
+            arrays[name] = np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)
+            arrays[name][:] = array
+        return ScanColumns(arrays, blocks)
+
+    def layout(self):
+        """Picklable description of shared arrays for attach() in a worker."""
+        return {name: (block.name, array.dtype.str, array.shape)
+                for (name, array), block in zip(self.arrays.items(), self.blocks)}
+
+    @classmethod
+    def attach(cls, layout):
+        arrays = {}
+        blocks = []
+        for name, (block_name, dtype, shape) in layout.items():
+            block = shared_memory.SharedMemory(name=block_name)
+            blocks.append(block)
+            arrays[name] = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+        return cls(arrays, blocks)
+
+    def close(self, unlink=False):
+        self.arrays = {}  # Drop the views before the buffers go away
+        for block in self.blocks:
+            block.close()
+            if unlink:
+                block.unlink()
+        self.blocks = []
+
+    def text_mask(self, field, pattern, low, high):
+        """
+        Flags for rows low to high whose field is matched by a compiled bytes pattern.
+        The pattern runs over the partition's buffer in one pass, jumping to the next row
+        after each hit, so rows without a match cost no Python work. A hit that runs across
+        a newline is checked again within its row alone.
+        """
+        text = self.arrays[f"{field}_text"]
+        starts = self.arrays[f"{field}_starts"]
+        buffer = memoryview(text)
+        mask = np.zeros(high - low, dtype=bool)
+        position, end = int(starts[low]), int(starts[high])
+        while True:
+            match = pattern.search(buffer, position, end)
+            if match is None or match.start() == end:
+                return mask  # An empty match at the end belongs to the next partition's first row
+            row = int(np.searchsorted(starts, match.start(), side="right")) - 1
+            row_start, row_end = int(starts[row]), int(starts[row + 1]) - 1
+            if row_start <= match.start() and match.end() <= row_end:
+                mask[row - low] = True
+            elif row >= low and pattern.search(buffer, row_start, row_end) is not None:
+                mask[row - low] = True
+            position = row_end + 1  # The next row; ^ and \b still see the newline before it
+
+
+# The shared columns a pool worker has mapped, as (token, ScanColumns)
+_attached = (None, None)
+
+
+def scan_partition(token, layout, query, low, high):
+    """Rows from low to high matching a query, as absolute row numbers. Runs in a pool worker."""
+    global _attached
+    if _attached[0] != token:
+        if _attached[1] is not None:
+            _attached[1].close()
+        _attached = (token, ScanColumns.attach(layout))  # Mapped once per library version, not per call
+    return np.flatnonzero(query.mask(_attached[1], low, high)) + low
+
+
+def partitions(rows, workers):
+    count = max(1, min(workers * PARTITIONS_PER_WORKER, rows // MIN_PARTITION_ROWS))
+    edges = np.linspace(0, rows, count + 1).astype(int)
+    return list(zip(edges[:-1], edges[1:]))
+
+
+class ScanEngine:
+    """
+    Evaluates queries that no index can answer over every track of a library module, in
+    a process pool. The library is copied once into shared ScanColumns; each scan sends
+    the workers only the query and a row range, and their sorted row numbers are joined
+    in partition order, so keys come back sorted. Library listeners never wait for a
+    scan: changes are queued and applied when the next scan starts, rating and play
+    count changes in place in the shared columns and others by rebuilding them.
+    The columns always match one library version; a scan of any other version than the
+    one they reach with the queued changes rebuilds them from that version first.
+    """
+    def __init__(self, lib, max_workers=None):
+        self.lib = lib
+        self.workers = max_workers or os.cpu_count()
+        self.pool = None
+        self.columns = None
+        self.keys = []
+        self.rows = {}  # Key -> row
+        self.token = None
+        self.built_version = None  # Library version the columns were built from
+        self.version = None  # Library version the columns match, with the queued changes applied since
+        self.lock = threading.Lock()  # Held by a scan and its column updates
+        self.pending = collections.deque()  # (version, key, field, new) changes not yet in the columns
+        self.stale = False  # Set when a change needs the columns rebuilt
+        lib.add_listener(self.on_change)
+
+    def on_change(self, key, field, old, new):
+        """Library listener; it only queues the change, so it returns at once even during a scan."""
+        if field in NUMBER_FIELDS and not self.stale:
+            self.pending.append((self.lib.delivered_version, key, field, new))
+            if len(self.pending) > len(self.rows):
+                self.stale = True  # Rebuilding is cheaper than replaying that many changes
+        else:
+            self.stale = True  # Renamed or reloaded tracks are picked up by the next scan
+
+    def apply_pending(self, version):
+        """
+        Apply the queued changes up to a library version to the columns; later ones stay
+        queued for a scan of a later version. Called with the lock held.
+        """
+        if self.stale:
+            self.stale = False
+            self.pending.clear()
+            self.drop_columns()
+            return
+        while self.pending and self.pending[0][0] <= version:
+            change_version, key, field, new = self.pending.popleft()
+            if self.columns is None or change_version <= self.built_version:
+                continue  # Already in the version the columns were built from
+            if change_version > self.version + 1:
+                self.drop_columns()  # The changes before it went into columns since rebuilt from an older version
+                continue
+            row = self.rows.get(key)
+            if row is not None:
+                self.columns.arrays[field][row] = new
+            self.version = change_version
+
+    def drop_columns(self):
+        if self.columns is not None:
+            self.columns.close(unlink=True)  # Workers keep their own mappings until they attach the next version
+        self.columns = None
+        self.token = None
+        self.built_version = self.version = None
+
+    def build(self, library):
+        """Copy a library version into shared columns."""
+        self.drop_columns()
+        pairs = sorted(library.items(), key=lambda pair: pair[0])
+        self.keys = [key for key, _ in pairs]
+        self.rows = {key: row for row, key in enumerate(self.keys)}
+        items = [item for _, item in pairs]
+        columns = ScanColumns.from_tracks(
+            [item.name for item in items], [item.artist for item in items],
+            [item.rating for item in items], [item.play_count for item in items],
+        )
+        self.columns = columns.share()
+        self.token = uuid.uuid4().hex
+        self.built_version = self.version = library.version
+
+    def scan(self, query):
+        """Row numbers of the tracks matching a query, in key order."""
+        if self.pool is None:
+            self.pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        layout = self.columns.layout()
+        jobs = [self.pool.submit(scan_partition, self.token, layout, query, low, high)
+                for low, high in partitions(self.columns.rows, self.workers)]
+        return np.concatenate([job.result() for job in jobs])
+
+    def keys_matching(self, query, library):
+        """Sorted keys of the tracks matching a query, scanning the columns of the library version given."""
+        with self.lock:
+            self.apply_pending(library.version)
+            if self.columns is None or self.version != library.version:
+                self.build(library)  # Also when changes in library have not reached the listeners yet
+            return [self.keys[row] for row in self.scan(query)]
+
+    def close(self):
+        self.lib.remove_listener(self.on_change)
+        if self.pool is not None:
+            self.pool.shutdown(cancel_futures=True)
+            self.pool = None
+        with self.lock:
+            self.drop_columns()
+
+
+# One shared scan engine per library module, created on first use and closed at exit
+_engines = {}
+
+
+def scan_engine_for(lib):
+    """Return the shared ScanEngine for a library module, creating it if needed."""
+    engine = _engines.get(lib.__name__)
+    if engine is None:
+        engine = _engines[lib.__name__] = ScanEngine(lib)
+        atexit.register(engine.close)
+    return engine
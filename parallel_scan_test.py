@@ -0,0 +1,82 @@
+import os
+import re
+
+import pytest
+
+import Track_Library_JSON as lib
+import parallel_scan
+from parallel_scan import ScanColumns, ScanEngine
+from track_query import QueryIndex, parse_query
+
+
+def test_text_mask_keeps_matches_within_rows():
+    """Test that a pattern is only matched inside one row, even where a hit would run across rows."""
+    columns = ScanColumns.from_tracks(["Hello", "", "World Tour", "low"], ["a", "b", "c", "d"], [0] * 4, [0] * 4)
+    assert columns.text_mask("name", re.compile(rb"o\s*w"), 0, 4).tolist() == [False, False, False, True]
+    assert columns.text_mask("name", re.compile(rb"^$", re.MULTILINE), 0, 4).tolist() == [False, True, False, False]
+    assert columns.text_mask("name", re.compile(rb"o"), 2, 4).tolist() == [True, True]
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    """Scan the JSON library in a two-process pool with one partition per track."""
+    monkeypatch.setattr(parallel_scan, "PARALLEL_MIN_TRACKS", 0)
+    monkeypatch.setattr(parallel_scan, "MIN_PARTITION_ROWS", 1)
+    lib.load_library_from_json(os.path.join(os.path.dirname(__file__), "library.json"))
+    scan_engine = parallel_scan._engines[lib.__name__] = ScanEngine(lib, max_workers=2)
+    index = QueryIndex(lib)
+    yield scan_engine, index
+    index.close()
+    scan_engine.close()
+    del parallel_scan._engines[lib.__name__]
+
+
+def test_parallel_scan_matches_a_single_track_check(engine):
+    """Test that scanned queries find the same tracks, in key order, as checking each track."""
+    scan_engine, index = engine
+    for text in ["/^s.*u$/", "NOT rating=4", "-ee", "title~/o.e/ OR plays>0", "artist=adele"]:
+        query = parse_query(text)
+        expected = sorted(key for key, item in lib.library.items() if query.matches(item))
+        assert scan_engine.keys_matching(query, lib.library) == expected, text
+
+
+def test_scan_follows_changes(engine):
+    """Test that rating changes reach the shared columns without a rebuild."""
+    scan_engine, index = engine
+    query = parse_query("-rating<5")
+    scan_engine.keys_matching(query, lib.library)
+    token = scan_engine.token
+    lib.set_rating("04", 5)
+    assert parse_query("NOT rating<5").keys(index, lib.library) == ["02", "04"]
+    assert scan_engine.token == token
+
+
+def test_changes_during_a_scan_do_not_wait(engine):
+    """Test that a listener call returns while a scan holds the engine, and the change reaches the next scan."""
+    scan_engine, index = engine
+    query = parse_query("rating=5")
+    scan_engine.keys_matching(query, lib.library)
+    with scan_engine.lock:  # As if a scan were running
+        lib.set_rating("03", 5)
+    assert scan_engine.keys_matching(query, lib.library) == ["02", "03"]
+    lib.update_tracks({"03": {"name": "Renamed"}})
+    assert scan_engine.keys_matching(parse_query("/^renamed$/"), lib.library) == ["03"]
+
+
+def test_scan_matches_the_library_version_given(engine):
+    """Test that a scan of an older library version does not see changes published after it."""
+    scan_engine, index = engine
+    query = parse_query("rating=5")
+    old = lib.library
+    scan_engine.keys_matching(query, old)
+    lib.set_rating("03", 5)
+    assert scan_engine.keys_matching(query, old) == ["02"]
+    assert scan_engine.keys_matching(query, lib.library) == ["02", "03"]
+    with lib.write_lock:  # Published, but the listeners have not heard of it yet
+        item = lib.library["04"]
+        lib.library = lib.library.set("04", lib.replace_item(item, rating=5))
+        lib.publish("04", "rating", item.rating, 5)
+        assert scan_engine.keys_matching(query, lib.library) == ["02", "03", "04"]
+    lib.deliver()
+    assert scan_engine.keys_matching(query, old) == ["02"]
+    assert scan_engine.keys_matching(query, lib.library) == ["02", "03", "04"]
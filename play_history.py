@@ -0,0 +1,231 @@
+import contextlib
+import json
+import os
+import struct
+import threading
+import time
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+HISTORY_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "play_history.dat")
+BLOCK_RECORDS = 256  # Events per block
+RECORD = struct.Struct("<dIf")  # Timestamp, track key ID, seconds listened: 16 bytes
+HEADER = struct.Struct("<ddI4x")  # Earliest and latest timestamp in the block, number of events
+BLOCK_SIZE = HEADER.size + BLOCK_RECORDS * RECORD.size
+RECORD_DTYPE = np.dtype([("time", "<f8"), ("key", "<u4"), ("listened", "<f4")])
+DAY = 24 * 60 * 60
+
+
+class PlayHistory:
+    """
+    Append-only log of play events (timestamp, track key, seconds listened).
+    Events are fixed-width records in blocks of BLOCK_RECORDS, each block starting with
+    the range of timestamps it holds. Recording an event writes one record and rewrites
+    its block header; a time-window query reads only the blocks whose range overlaps
+    the window and filters them with NumPy. Track keys are stored once, in a side file
+    with one key per line, and referred to by line number.
+    Several processes, such as two player windows, can record to the same file: each
+    write holds an OS lock on the key file and first reads the keys and the block
+    headers other processes added, so key IDs and blocks are never given out twice.
+    Within a process, reads from worker threads are safe while the Tk thread records.
+    """
+    def __init__(self, path=HISTORY_FILE):
+        self.path = path
+        self.keys_path = os.path.splitext(path)[0] + ".keys"
+        self.keys = []  # Key ID -> track key
+        self.key_ids = {}  # Track key -> key ID
+        self.keys_read = 0  # Bytes of the key file already read
+        self.blocks = []  # [earliest, latest, count] per block
+        self.size = 0  # Size of the history file when its headers were last read
+        self.lock = threading.Lock()  # Reads and writes share one file position
+        self.keys_file = open(self.keys_path, "a+b")
+        # Created without truncating, in case another process creates it at the same time
+        self.file = open(os.open(path, os.O_RDWR | os.O_CREAT | getattr(os, "O_BINARY", 0)), "r+b", buffering=0)
+        self.refresh()
+
+    @contextlib.contextmanager
+    def locked(self):
+        """Hold the lock that orders writes to the history between processes."""
+        if fcntl is not None:
+            fcntl.flock(self.keys_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self.keys_file.fileno(), fcntl.LOCK_UN)
+        else:
+            self.keys_file.seek(0)
+            msvcrt.locking(self.keys_file.fileno(), msvcrt.LK_LOCK, 1)  # Locks the first byte, retrying for 10 s
+            try:
+                yield
+            finally:
+                self.keys_file.seek(0)
+                msvcrt.locking(self.keys_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def refresh(self):
+        """Pick up the keys and events other processes recorded since the last refresh."""
+        with self.lock, self.locked():
+            self.read_new()
+
+    def read_new(self):
+        """Read new key lines and re-read the block headers from the last known block on. Called with both locks held."""
+        self.keys_file.seek(self.keys_read)
+        for line in self.keys_file:
+            if not line.endswith(b"\n"):
+                break  # A line cut short by a crash; it is read again if it is ever completed
+            self.keys_read += len(line)
+            if line.strip():
+                key = json.loads(line)
+                self.key_ids[key] = len(self.keys)
+                self.keys.append(key)
+
+        size = os.fstat(self.file.fileno()).st_size
+        if size == self.size:
+            return  # Every record write makes the file longer, so no process has written since
+        self.size = size
+        first = max(len(self.blocks) - 1, 0)  # Only the last block can have grown since
+        del self.blocks[first:]
+        for offset in range(first * BLOCK_SIZE, size, BLOCK_SIZE):
+            self.file.seek(offset)
+            header = self.file.read(HEADER.size)
+            if len(header) < HEADER.size:
+                break  # A block cut short before its header was complete
+            self.blocks.append(list(HEADER.unpack(header)))
+
+    def __len__(self):
+        return sum(block[2] for block in self.blocks)
+
+    def key_id(self, key):
+        """ID of a track key, adding it to the key file the first time it is seen. Called with both locks held."""
+        key_id = self.key_ids.get(key)
+        if key_id is None:
+            line = (json.dumps(key) + "\n").encode("utf-8")
+            self.keys_file.write(line)
+            self.keys_file.flush()  # The key must be on disk before any event refers to it
+            self.keys_read += len(line)
+            key_id = self.key_ids[key] = len(self.keys)
+            self.keys.append(key)
+        return key_id
+
+    def record(self, key, listened=0.0, timestamp=None):
+        """Append one play event. Costs two small writes however long the history is, plus a lock and a header read."""
+        timestamp = time.time() if timestamp is None else timestamp
+        with self.lock, self.locked():
+            self.read_new()  # Another process may have added keys or records
+            self.write_record(self.key_id(key), listened, timestamp)
+
+    def record_many(self, keys, timestamp=None):
+        """Append one play event per key, all with the same timestamp, e.g. for a played playlist."""
+        timestamp = time.time() if timestamp is None else timestamp
+        with self.lock, self.locked():
+            self.read_new()
+            for key in keys:
+                self.write_record(self.key_id(key), 0.0, timestamp)
+
+    def ids_of(self, keys):
+        """Key IDs of several track keys, adding the ones not seen before to the key file."""
+        with self.lock, self.locked():
+            self.read_new()
+            return [self.key_id(key) for key in keys]
+
+    def write_record(self, key_id, listened, timestamp):
+        if not self.blocks or self.blocks[-1][2] == BLOCK_RECORDS:
+            self.blocks.append([timestamp, timestamp, 0])
+        index = len(self.blocks) - 1
+        block = self.blocks[index]
+        if block[2] == 0:
+            block[0] = block[1] = timestamp  # A block whose header was never written reads as zeros
+
+        # Write the record first, so a header never counts a record that is not there
+        self.file.seek(index * BLOCK_SIZE + HEADER.size + block[2] * RECORD.size)
+        self.file.write(RECORD.pack(timestamp, key_id, listened))
+        block[0] = min(block[0], timestamp)
+        block[1] = max(block[1], timestamp)
+        block[2] += 1
+        self.file.seek(index * BLOCK_SIZE)
+        self.file.write(HEADER.pack(*block))
+        self.size = max(self.size, index * BLOCK_SIZE + HEADER.size + block[2] * RECORD.size)
+
+    def events(self, start=None, end=None):
+        """
+        Events with start <= timestamp < end as a NumPy array with fields time, key and listened.
+        Blocks that lie entirely outside the window are not read.
+        """
+        self.refresh()
+        start = -np.inf if start is None else start
+        end = np.inf if end is None else end
+        chunks = []
+        for index, (earliest, latest, count) in enumerate(self.blocks):
+            if count == 0 or latest < start or earliest >= end:
+                continue
+            records = self.read_block(index, 0, count)
+            if earliest < start or latest >= end:
+                records = records[(records["time"] >= start) & (records["time"] < end)]
+            chunks.append(records)
+        return np.concatenate(chunks) if chunks else np.empty(0, dtype=RECORD_DTYPE)
+
+    def since(self, position):
+        """Events recorded after the first position events, in the order they were recorded."""
+        self.refresh()
+        chunks = []
+        for index in range(position // BLOCK_RECORDS, len(self.blocks)):
+            first = position - index * BLOCK_RECORDS if index == position // BLOCK_RECORDS else 0
+            count = self.blocks[index][2]
+            if count > first:
+                chunks.append(self.read_block(index, first, count))
+        return np.concatenate(chunks) if chunks else np.empty(0, dtype=RECORD_DTYPE)
+
+    def read_block(self, index, first, count):
+        """Records first to count of a block as a NumPy array."""
+        with self.lock:
+            self.file.seek(index * BLOCK_SIZE + HEADER.size + first * RECORD.size)
+            data = self.file.read((count - first) * RECORD.size)
+        return np.frombuffer(data, dtype=RECORD_DTYPE)
+
+    def play_counts(self, start=None, end=None):
+        """Number of plays per track key in a time window."""
+        counts = np.bincount(self.events(start, end)["key"], minlength=len(self.keys))
+        return {self.keys[key_id]: int(counts[key_id]) for key_id in np.flatnonzero(counts)}
+
+    def listened_seconds(self, start=None, end=None):
+        """Seconds listened per track key in a time window."""
+        events = self.events(start, end)
+        totals = np.bincount(events["key"], weights=events["listened"], minlength=len(self.keys))
+        played = np.bincount(events["key"], minlength=len(self.keys))
+        return {self.keys[key_id]: float(totals[key_id]) for key_id in np.flatnonzero(played)}
+
+    def plays_in_last(self, days, now=None):
+        """Number of plays per track key in the last few days."""
+        now = time.time() if now is None else now
+        return self.play_counts(now - days * DAY, now)
+
+    def close(self):
+        self.file.close()
+        self.keys_file.close()
+
+
+def format_recent(history, lib, days=7, n=10, now=None):
+    """Format the most played tracks of the last few days as text for display."""
+    counts = history.plays_in_last(days, now)
+    output = f"Plays in the last {days} days: {sum(counts.values())}\n"
+    for key, count in sorted(counts.items(), key=lambda pair: (-pair[1], pair[0]))[:n]:
+        name = lib.get_name(key)
+        output += f"  {count:>4}  {key if name is None else f'{name} - {lib.get_artist(key)}'}\n"
+    return output
+
+
+# One history per process, opened on first use
+_history = None
+
+
+def shared_history():
+    """Return the play history shared by every window in this process, opening it if needed."""
+    global _history
+    if _history is None:
+        _history = PlayHistory()
+    return _history
@@ -0,0 +1,99 @@
+import multiprocessing
+
+import play_history
+from play_history import BLOCK_RECORDS, DAY, PlayHistory
+
+
+def test_events_survive_reopening(tmp_path):
+    """Test that events and keys written by one history are read back by the next."""
+    path = str(tmp_path / "history.dat")
+    history = PlayHistory(path)
+    history.record("01", 30.5, timestamp=1000.0)
+    history.record("02", 12.0, timestamp=1001.0)
+    history.record("01", 4.0, timestamp=1002.0)
+    history.close()
+
+    history = PlayHistory(path)
+    assert len(history) == 3
+    assert history.play_counts() == {"01": 2, "02": 1}
+    assert history.listened_seconds() == {"01": 34.5, "02": 12.0}
+    history.close()
+
+
+def test_queries_skip_blocks_outside_the_window(tmp_path, monkeypatch):
+    """Test that a time-window query only reads the blocks that overlap it."""
+    history = PlayHistory(str(tmp_path / "history.dat"))
+    for number in range(BLOCK_RECORDS * 4):
+        history.record(f"{number % 7:02d}", timestamp=float(number))
+
+    reads = []
+    read = history.file.read
+    monkeypatch.setattr(history.file, "read", lambda size: reads.append(size) or read(size), raising=False)
+    events = history.events(BLOCK_RECORDS + 10, BLOCK_RECORDS + 20)
+    assert list(events["time"]) == [float(number) for number in range(BLOCK_RECORDS + 10, BLOCK_RECORDS + 20)]
+    assert len(reads) == 1
+    history.close()
+
+
+def test_plays_in_last_days(tmp_path):
+    """Test that plays older than the window are not counted."""
+    history = PlayHistory(str(tmp_path / "history.dat"))
+    now = 100 * DAY
+    history.record("01", timestamp=now - 10 * DAY)
+    history.record("01", timestamp=now - 2 * DAY)
+    history.record("02", timestamp=now - DAY)
+    assert history.plays_in_last(7, now) == {"01": 1, "02": 1}
+    assert "Plays in the last 7 days: 2" in play_history.format_recent(history, _Library(), now=now)
+    history.close()
+
+
+def test_two_histories_on_one_file(tmp_path):
+    """Test that two histories writing to one file see each other's keys and events and never share a key ID."""
+    path = str(tmp_path / "history.dat")
+    first, second = PlayHistory(path), PlayHistory(path)
+    for number in range(BLOCK_RECORDS + 10):
+        first.record("01" if number % 2 else "02", timestamp=float(2 * number))
+        second.record("03" if number % 3 else "01", timestamp=float(2 * number + 1))
+    expected = {"01": (BLOCK_RECORDS + 10) // 2 + (BLOCK_RECORDS + 12) // 3}
+    expected["02"] = BLOCK_RECORDS + 10 - (BLOCK_RECORDS + 10) // 2
+    expected["03"] = BLOCK_RECORDS + 10 - (BLOCK_RECORDS + 12) // 3
+    assert first.play_counts() == second.play_counts() == expected
+    assert first.keys == second.keys and sorted(first.keys) == ["01", "02", "03"]
+    first.close()
+    second.close()
+    reopened = PlayHistory(path)
+    assert reopened.play_counts() == expected
+    assert list(reopened.events()["time"]) == [float(number) for number in range(2 * (BLOCK_RECORDS + 10))]
+    reopened.close()
+
+
+def record_plays(path, prefix, count):
+    history = PlayHistory(path)
+    for number in range(count):
+        history.record(f"{prefix}{number % 5}", timestamp=float(number))
+    history.close()
+
+
+def test_two_processes_on_one_file(tmp_path):
+    """Test that processes recording at the same time lose no events and give each key its own ID."""
+    path = str(tmp_path / "history.dat")
+    ctx = multiprocessing.get_context("spawn")
+    processes = [ctx.Process(target=record_plays, args=(path, prefix, 400)) for prefix in ("a", "b")]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    history = PlayHistory(path)
+    assert history.play_counts() == {f"{prefix}{number}": 80 for prefix in "ab" for number in range(5)}
+    assert len(set(history.keys)) == len(history.keys) == 10
+    history.close()
+
+
+class _Library:
+    @staticmethod
+    def get_name(key):
+        return None
+
+    @staticmethod
+    def get_artist(key):
+        return None
@@ -0,0 +1,188 @@
+import collections
+import random
+
+# Playback modes understood by PlayQueue, in the order they are offered to the user
+ORDER = "In Order"  # Step through the playlist; stop when a song ends
+REPEAT_ALL = "Repeat All"  # Step through the playlist and loop round forever
+REPEAT_ONE = "Repeat One"  # Keep playing the current song
+SHUFFLE = "Shuffle"  # Every song once in random order, then a fresh order
+WEIGHTED = "Weighted"  # Random songs, higher rated ones more often
+MODES = [ORDER, REPEAT_ALL, REPEAT_ONE, SHUFFLE, WEIGHTED]
+HISTORY_LIMIT = 1000  # Songs previous() can go back through; older ones are forgotten
+
+
+class LazyShuffle:
+    """
+    Incremental Fisher-Yates shuffle of the indexes 0..n-1.
+    Only the swaps made so far are stored, so each draw is O(1) and nothing is
+    permuted up front.
+    """
+    def __init__(self, n, rng=random):
+        self.rng = rng
+        self.remaining = n
+        self.swaps = {}  # Position -> index, for positions that no longer hold themselves
+
+    def __len__(self):
+        return self.remaining
+
+    def draw(self):
+        """Return the next index of the permutation, or None once all have been drawn."""
+        if not self.remaining:
+            return None
+        self.remaining -= 1
+        last = self.remaining
+        pick = self.rng.randrange(last + 1)
+        index = self.swaps.get(pick, pick)
+        # Move the last undrawn index into the slot we just took
+        self.swaps[pick] = self.swaps.pop(last, last)
+        if pick == last:
+            del self.swaps[pick]
+        return index
+
+
+class FenwickTree:
+    """
+    Binary indexed tree over non-negative weights.
+    Weights can change in O(log n) and a weighted random index is found in O(log n).
+    """
+    def __init__(self, weights):
+        self.size = len(weights)
+        self.weights = list(weights)
+        self.tree = [0.0] * (self.size + 1)
+        # Linear-time build: push each node's sum up to its parent
+        for i, weight in enumerate(self.weights, start=1):
+            self.tree[i] += weight
+            parent = i + (i & -i)
+            if parent <= self.size:
+                self.tree[parent] += self.tree[i]
+        self.step = 1 << self.size.bit_length() if self.size else 0
+
+    def __len__(self):
+        return self.size
+
+    def total(self):
+        """Sum of all weights."""
+        total = 0.0
+        i = self.size
+        while i > 0:
+            total += self.tree[i]
+            i -= i & -i
+        return total
+
+    def set(self, index, weight):
+        """Change the weight at an index."""
+        delta = weight - self.weights[index]
+        self.weights[index] = weight
+        i = index + 1
+        while i <= self.size:
+            self.tree[i] += delta
+            i += i & -i
+
+    def find(self, target):
+        """Return the index whose cumulative weight range contains target."""
+        position = 0
+        step = self.step
+        while step:
+            next_position = position + step
+            if next_position <= self.size and self.tree[next_position] <= target:
+                position = next_position
+                target -= self.tree[next_position]
+            step >>= 1
+        return min(position, self.size - 1)
+
+    def sample(self, rng=random):
+        """Pick an index with probability proportional to its weight, or None if all are zero."""
+        total = self.total()
+        if total <= 0:
+            return None
+        return self.find(rng.random() * total)
+
+
+class PlayQueue:
+    """
+    Chooses which song of a Playlist plays next according to the playback mode.
+    Shuffle and weighted state is rebuilt lazily whenever the playlist changes.
+    """
+    def __init__(self, playlist, weight_of=None, mode=ORDER, rng=None):
+        """
+        :param playlist: The Playlist whose position this queue moves.
+        :param weight_of: Callable giving the weight of an item for the weighted mode.
+        """
+        self.playlist = playlist
+        self.weight_of = weight_of or (lambda item: 1)
+        self.mode = mode
+        self.rng = rng or random.Random()
+        self.history = collections.deque(maxlen=HISTORY_LIMIT)  # Positions played before the current one, for previous()
+        self.shuffle = None
+        self.weights = None
+        self.item_indexes = {}  # item -> playlist indexes, for weight updates
+        self.version = None
+
+    def set_mode(self, mode):
+        if mode not in MODES:
+            raise ValueError(f"Unknown playback mode: {mode}")
+        self.mode = mode
+        self.shuffle = None
+
+    def auto_advance(self):
+        """True if playback should move on by itself when a song ends."""
+        return self.mode != ORDER
+
+    def sync(self):
+        """Drop derived state if the playlist changed since it was built."""
+        if self.version != self.playlist.version:
+            self.version = self.playlist.version
+            self.history.clear()
+            self.shuffle = None
+            self.weights = None
+
+    def refresh_weight(self, item):
+        """Re-read the weight of an item after, for example, its rating changed."""
+        if self.weights is None:
+            return
+        weight = self.weight_of(item)
+        for index in self.item_indexes.get(item, ()):
+            self.weights.set(index, weight)
+
+    def next(self, auto=False):
+        """
+        Move the playlist to the next song for the current mode and return it.
+        :param auto: True when the previous song ended by itself rather than being skipped.
+        """
+        self.sync()
+        if not self.playlist:
+            return None
+        if self.playlist.position is not None:
+            self.history.append(self.playlist.position)
+
+        if self.mode == REPEAT_ONE and auto and self.playlist.position is not None:
+            return self.playlist.current()
+        if self.mode == SHUFFLE:
+            return self.playlist.select(self.next_shuffled())
+        if self.mode == WEIGHTED:
+            return self.playlist.select(self.next_weighted())
+        return self.playlist.next()
+
+    def previous(self):
+        """Go back to the song played before the current one and return it."""
+        self.sync()
+        if not self.playlist:
+            return None
+        if self.mode in (SHUFFLE, WEIGHTED) and self.history:
+            return self.playlist.select(self.history.pop())
+        return self.playlist.previous()
+
+    def next_shuffled(self):
+        if self.shuffle is None or not self.shuffle:
+            # Start a new random order once every song has been played
+            self.shuffle = LazyShuffle(len(self.playlist), self.rng)
+        return self.shuffle.draw()
+
+    def next_weighted(self):
+        if self.weights is None:
+            self.item_indexes = {}
+            for index, item in enumerate(self.playlist):
+                self.item_indexes.setdefault(item, []).append(index)
+            self.weights = FenwickTree([self.weight_of(item) for item in self.playlist])
+        index = self.weights.sample(self.rng)
+        return self.rng.randrange(len(self.playlist)) if index is None else index
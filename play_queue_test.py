@@ -0,0 +1,143 @@
+import bisect
+import itertools
+import random
+
+import play_queue
+from play_queue import (FenwickTree, LazyShuffle, ORDER, PlayQueue, REPEAT_ALL, REPEAT_ONE,
+                        SHUFFLE, WEIGHTED)
+from playlist import Playlist
+
+
+def test_lazy_shuffle_visits_every_index_once():
+    """Test that a full shuffle cycle draws each index exactly once and then stops."""
+    for n in (0, 1, 2, 7, 500):
+        shuffle = LazyShuffle(n, random.Random(n))
+        drawn = [shuffle.draw() for _ in range(n)]
+        assert sorted(drawn) == list(range(n))
+        assert len(shuffle) == 0
+        assert shuffle.draw() is None
+        assert shuffle.swaps == {}
+
+
+def brute_find(weights, target):
+    """The index find() should return: the first one whose cumulative weight exceeds target."""
+    return min(bisect.bisect_right(list(itertools.accumulate(weights)), target), len(weights) - 1)
+
+
+def check_fenwick(tree, weights):
+    assert tree.total() == sum(weights)
+    for target in range(sum(weights)):
+        assert tree.find(target) == brute_find(weights, target)
+        assert tree.find(target + 0.5) == brute_find(weights, target + 0.5)
+
+
+def test_fenwick_tree_matches_brute_force():
+    """Test that totals and find() agree with a linear scan, also after weights change."""
+    rng = random.Random(1)
+    for size in (1, 2, 5, 8, 33):
+        weights = [rng.choice([0, 0, 1, 2, 5]) for _ in range(size)]
+        weights[rng.randrange(size)] = 3  # At least one weight is positive
+        tree = FenwickTree(weights)
+        check_fenwick(tree, weights)
+        for _ in range(20):
+            index = rng.randrange(size)
+            weights[index] = rng.choice([0, 1, 4])
+            tree.set(index, weights[index])
+            if sum(weights):
+                check_fenwick(tree, weights)
+
+
+def test_fenwick_sample_skips_zero_weights():
+    """Test that sampling never picks a zero weight and gives None when all are zero."""
+    rng = random.Random(2)
+    tree = FenwickTree([0, 2, 0, 0, 1, 0])
+    assert {tree.sample(rng) for _ in range(200)} == {1, 4}
+    tree.set(1, 0)
+    tree.set(4, 0)
+    assert tree.sample(rng) is None
+
+
+def test_order_and_repeat_modes():
+    """Test that in-order and repeat-all loop round, and repeat-one only repeats when a song ends."""
+    queue = PlayQueue(Playlist(["a", "b", "c"]), mode=REPEAT_ALL)
+    assert [queue.next(auto=True) for _ in range(4)] == ["a", "b", "c", "a"]
+    assert queue.auto_advance()
+    queue.set_mode(ORDER)
+    assert not queue.auto_advance()
+    queue.set_mode(REPEAT_ONE)
+    assert queue.next(auto=True) == "a"
+    assert queue.playlist.position == 0
+    assert queue.next() == "b"  # Skipping still moves on
+    assert queue.previous() == "a"
+
+
+def test_repeat_follows_playlist_edits():
+    """Test that advancing after songs are added, removed or moved starts from the current song."""
+    playlist = Playlist(["a", "b", "c", "d"])
+    queue = PlayQueue(playlist, mode=REPEAT_ALL)
+    playlist.select(2)
+    playlist.remove_many(["c"])
+    assert queue.next(auto=True) == "a"  # "d" took the place of "c"
+    playlist.move(0, 2)
+    assert list(playlist) == ["b", "d", "a"]
+    assert queue.next(auto=True) == "b"
+    queue.set_mode(REPEAT_ONE)
+    playlist.add("e")
+    assert queue.next(auto=True) == "b"
+    playlist.clear()
+    assert queue.next(auto=True) is None
+
+
+def test_shuffle_plays_every_song_once_per_cycle():
+    """Test that shuffle plays each song once before repeating and previous() retraces it."""
+    playlist = Playlist([f"song{index}" for index in range(10)])
+    queue = PlayQueue(playlist, mode=SHUFFLE, rng=random.Random(3))
+    played = [queue.next(auto=True) for _ in range(10)]
+    assert sorted(played) == sorted(playlist)
+    assert [queue.previous() for _ in range(3)] == played[-2:-5:-1]
+    played = [queue.next(auto=True) for _ in range(10)]
+    assert sorted(played) == sorted(playlist)
+
+
+def test_shuffle_restarts_when_the_playlist_changes():
+    """Test that a version change gives a fresh shuffle over the new songs and clears history."""
+    playlist = Playlist(["a", "b", "c"])
+    queue = PlayQueue(playlist, mode=SHUFFLE, rng=random.Random(4))
+    queue.next()
+    queue.next()
+    playlist.extend(["d", "e"])
+    played = [queue.next() for _ in range(5)]
+    assert sorted(played) == ["a", "b", "c", "d", "e"]
+    playlist.remove_many(["e"])
+    position = playlist.position
+    assert queue.previous() == playlist[(position - 1) % len(playlist)]  # No history of the old order
+
+
+def test_weighted_mode_follows_weights():
+    """Test that weighted picks only songs with weight, re-reads changed weights and falls back to uniform."""
+    weights = {"a": 0, "b": 5, "c": 0}
+    playlist = Playlist(["a", "b", "c"])
+    queue = PlayQueue(playlist, weight_of=weights.get, mode=WEIGHTED, rng=random.Random(5))
+    assert {queue.next() for _ in range(50)} == {"b"}
+    weights["b"], weights["c"] = 0, 2
+    queue.refresh_weight("b")
+    queue.refresh_weight("c")
+    assert {queue.next() for _ in range(50)} == {"c"}
+    weights["d"] = 7
+    weights["c"] = 0
+    playlist.add("d")  # Weights are rebuilt for the new version
+    assert {queue.next() for _ in range(50)} == {"d"}
+    weights["d"] = 0
+    queue.refresh_weight("d")
+    assert {queue.next() for _ in range(200)} == {"a", "b", "c", "d"}
+
+
+def test_history_keeps_only_the_latest_songs(monkeypatch):
+    """Test that previous() retraces at most HISTORY_LIMIT songs of a long shuffled session."""
+    monkeypatch.setattr(play_queue, "HISTORY_LIMIT", 3)
+    playlist = Playlist([f"song{index}" for index in range(10)])
+    queue = PlayQueue(playlist, mode=SHUFFLE, rng=random.Random(6))
+    played = [queue.next() for _ in range(25)]
+    assert len(queue.history) == 3
+    assert [queue.previous() for _ in range(3)] == played[-2:-5:-1]
+    assert not queue.history
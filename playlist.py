@@ -0,0 +1,154 @@
+class Playlist:
+    """
+    Ordered playlist with hashed membership and a current position.
+    Items are kept in a list for order and counted in a dict, so membership tests
+    and appends are O(1) and bulk operations touch each item once. The current
+    position lives here rather than in a widget selection.
+    """
+    def __init__(self, items=(), unique=False):
+        self.unique = unique  # When True an item can only appear once
+        self.items = []
+        self.counts = {}  # item -> number of times it appears
+        self.position = None  # Index of the current item, or None
+        self.version = 0  # Bumped whenever the items change, so views can tell they are stale
+        self.extend(items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __contains__(self, item):
+        return item in self.counts
+
+    def __getitem__(self, index):
+        return self.items[index]
+
+    def add(self, item):
+        """Append an item. Returns False if the playlist is unique and already has it."""
+        if self.unique and item in self.counts:
+            return False
+        self.items.append(item)
+        self.counts[item] = self.counts.get(item, 0) + 1
+        self.version += 1
+        return True
+
+    def extend(self, items):
+        """Append several items in one pass and return the ones that were added."""
+        added = []
+        for item in items:
+            if self.add(item):
+                added.append(item)
+        return added
+
+    def remove_many(self, items):
+        """Remove every occurrence of the given items in one pass over the playlist."""
+        doomed = set(items) & self.counts.keys()
+        if not doomed:
+            return 0
+        kept = []
+        new_position = None
+        for index, item in enumerate(self.items):
+            if index == self.position:
+                # The current item keeps its place, or the one after it takes over.
+                new_position = len(kept)
+            if item not in doomed:
+                kept.append(item)
+        removed = len(self.items) - len(kept)
+        for item in doomed:
+            del self.counts[item]
+        self.items = kept
+        self.version += 1
+        self.position = new_position if new_position is not None and new_position < len(kept) else None
+        return removed
+
+    def remove_at(self, indexes):
+        """Remove the items at the given indexes in one pass over the playlist."""
+        doomed = set(indexes)
+        kept = []
+        new_position = None
+        for index, item in enumerate(self.items):
+            if index == self.position:
+                new_position = len(kept)
+            if index in doomed:
+                self.counts[item] -= 1
+                if not self.counts[item]:
+                    del self.counts[item]
+            else:
+                kept.append(item)
+        self.items = kept
+        self.version += 1
+        self.position = new_position if new_position is not None and new_position < len(kept) else None
+
+    def move(self, old_index, new_index):
+        """Move one item to a new index, keeping the current item current."""
+        item = self.items.pop(old_index)
+        self.items.insert(new_index, item)
+        self.version += 1
+        if self.position is None:
+            return
+        if self.position == old_index:
+            self.position = new_index
+        elif old_index < self.position <= new_index:
+            self.position -= 1
+        elif new_index <= self.position < old_index:
+            self.position += 1
+
+    def reorder(self, order):
+        """Rearrange the playlist so that item i is the old item at order[i]."""
+        if sorted(order) != list(range(len(self.items))):
+            raise ValueError("order must be a permutation of the playlist indexes")
+        self.items = [self.items[index] for index in order]
+        self.version += 1
+        if self.position is not None:
+            self.position = order.index(self.position)
+
+    def rename(self, old, new):
+        """Replace every occurrence of an item with another, keeping positions."""
+        if old not in self.counts:
+            return 0
+        if self.unique and new in self.counts:
+            raise ValueError(f"{new!r} is already in the playlist")
+        count = self.counts.pop(old)
+        self.items = [new if item == old else item for item in self.items]
+        self.counts[new] = self.counts.get(new, 0) + count
+        self.version += 1
+        return count
+
+    def clear(self):
+        self.items.clear()
+        self.counts.clear()
+        self.position = None
+        self.version += 1
+
+    def index(self, item):
+        """Return the index of the first occurrence of an item."""
+        return self.items.index(item)
+
+    def select(self, index):
+        """Make the item at index current and return it."""
+        if not 0 <= index < len(self.items):
+            raise IndexError("playlist index out of range")
+        self.position = index
+        return self.items[index]
+
+    def current(self):
+        """Return the current item, or None if nothing is selected."""
+        if self.position is None:
+            return None
+        return self.items[self.position]
+
+    def next(self):
+        """Advance to the next item, looping back to the start, and return it."""
+        if not self.items:
+            return None
+        self.position = 0 if self.position is None else (self.position + 1) % len(self.items)
+        return self.items[self.position]
+
+    def previous(self):
+        """Go back to the previous item, looping round to the end, and return it."""
+        if not self.items:
+            return None
+        self.position = len(self.items) - 1 if self.position is None else (self.position - 1) % len(self.items)
+        return self.items[self.position]
@@ -0,0 +1,198 @@
+import json
+import os
+
+# Number of entries handed to the UI per event loop turn when loading progressively
+LOAD_CHUNK_SIZE = 500
+
+PLAYLIST_FILETYPES = [
+    ("M3U8 playlist", "*.m3u8"),
+    ("M3U playlist", "*.m3u"),
+    ("JSON lines playlist", "*.jsonl"),
+]
+
+
+def write_m3u(path, entries):
+    """
+    Write (location, title) entries to an extended M3U file one line at a time.
+    :param path: Destination .m3u or .m3u8 file.
+    :param entries: Iterable of (location, title) pairs; it is consumed lazily.
+    """
+    with open(path, "w", encoding="utf-8") as file:
+        file.write("#EXTM3U\n")
+        for location, title in entries:
+            if title:
+                file.write(f"#EXTINF:-1,{title}\n")
+            file.write(f"{location}\n")
+
+
+def read_m3u(path):
+    """Yield (location, title) entries from an M3U file without reading it all at once."""
+    title = None
+    with open(path, "r", encoding="utf-8-sig", errors="replace") as file:
+        for line in file:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith("#EXTINF:"):
+                # "#EXTINF:<seconds>,<title>" describes the location on the next line
+                title = line.partition(",")[2] or None
+            elif not line.startswith("#"):
+                yield line, title
+                title = None
+
+
+def write_jsonl(path, entries):
+    """Write (location, title) entries as one JSON object per line."""
+    with open(path, "w", encoding="utf-8") as file:
+        for location, title in entries:
+            file.write(json.dumps({"location": location, "title": title}) + "\n")
+
+
+def read_jsonl(path):
+    """Yield (location, title) entries from a JSON lines playlist, skipping bad lines."""
+    with open(path, "rb") as file:
+        for line in file:
+            try:
+                record = json.loads(line)  # Decodes the bytes, so a line that is not UTF-8 is skipped too
+                yield record["location"], record.get("title")
+            except (ValueError, KeyError, TypeError):
+                continue
+
+
+def save_playlist(path, entries):
+    """Save entries in the format chosen by the file extension."""
+    if path.lower().endswith(".jsonl"):
+        write_jsonl(path, entries)
+    else:
+        write_m3u(path, entries)
+
+
+def load_playlist(path):
+    """Return a lazy iterator over the entries of a playlist file."""
+    if path.lower().endswith(".jsonl"):
+        return read_jsonl(path)
+    return read_m3u(path)
+
+
+class PlaylistResolver:
+    """
+    Maps playlist entries back to library keys or song display names.
+    The lookup tables are built once, so resolving each entry is a few dict
+    lookups instead of a search through the library.
+    """
+    def __init__(self, targets):
+        """
+        :param targets: Dict of target -> (file name or None, "Artist - Title" or None).
+            The target is what resolve() returns, e.g. a library key or a display name.
+        """
+        self.targets = targets
+        self.by_file = {}
+        self.by_title = {}
+        for target, (file_name, title) in targets.items():
+            if file_name:
+                self.by_file.setdefault(file_name.lower(), target)
+                self.by_file.setdefault(os.path.splitext(file_name)[0].lower(), target)
+            if title:
+                self.by_title.setdefault(title.lower(), target)
+
+    @classmethod
+    def for_library(cls, lib):
+        """Resolver that returns keys of a track library module."""
+        targets = {}
+        for key, item in lib.library.items():
+            # Songs in the music folder are named "<title>.mp3"
+            targets[key] = (f"{item.name}.mp3", f"{item.artist} - {item.name}")
+        return cls(targets)
+
+    @classmethod
+    def for_song_mapping(cls, song_mapping):
+        """Resolver that returns display names from MusicPlayer.song_mapping."""
+        # Files may sit in subfolders of the music folder; entries are matched on the file name
+        return cls({display_name: (os.path.basename(file), None) for display_name, file in song_mapping.items()})
+
+    def resolve(self, location, title=None):
+        """Return the target for an entry, or None if nothing matches."""
+        if location in self.targets:
+            return location
+        base_name = os.path.basename(location.replace("\\", "/")).lower()
+        target = self.by_file.get(base_name) or self.by_file.get(os.path.splitext(base_name)[0])
+        if target is None and title:
+            target = self.by_title.get(title.lower())
+        return target
+
+
+class ProgressiveLoad:
+    """
+    A playlist being resolved chunk by chunk from the Tk event loop; see load_progressively().
+    cancel() stops it between chunks, so a new load or a reset can start from an empty playlist.
+    """
+    def __init__(self, window, entries, resolver, on_chunk, on_done, on_error=None, chunk_size=LOAD_CHUNK_SIZE):
+        self.window = window
+        self.entries = iter(entries)
+        self.resolver = resolver
+        self.on_chunk = on_chunk
+        self.on_done = on_done
+        self.on_error = on_error
+        self.chunk_size = chunk_size
+        self.loaded = 0
+        self.skipped = 0
+        self.job = None  # Pending after() call for the next chunk
+        self.cancelled = False
+
+    def cancel(self):
+        """Deliver no more chunks and close the file."""
+        self.cancelled = True
+        if self.job is not None:
+            self.window.after_cancel(self.job)
+            self.job = None
+        close = getattr(self.entries, "close", None)
+        if close is not None:
+            close()  # A generator closes its file as it finishes
+
+    def step(self):
+        self.job = None
+        if self.cancelled:
+            return
+        chunk = []
+        finished = True
+        try:
+            for processed, (location, title) in enumerate(self.entries, start=1):
+                target = self.resolver.resolve(location, title)
+                if target is None:
+                    self.skipped += 1
+                else:
+                    chunk.append(target)
+                if processed == self.chunk_size:
+                    finished = False
+                    break
+        except OSError as error:
+            self.deliver(chunk)
+            if self.on_error is None:
+                raise
+            self.on_error(error)
+            return
+        self.deliver(chunk)
+        if finished:
+            self.on_done(self.loaded, self.skipped)
+        else:
+            self.job = self.window.after(1, self.step)
+
+    def deliver(self, chunk):
+        if chunk:
+            self.loaded += len(chunk)
+            self.on_chunk(chunk)
+
+
+def load_progressively(window, entries, resolver, on_chunk, on_done, on_error=None, chunk_size=LOAD_CHUNK_SIZE):
+    """
+    Resolve entries in chunks from the Tk event loop so large playlists appear
+    progressively and the window stays responsive. Returns the ProgressiveLoad, whose
+    cancel() must be called before the playlist is cleared or another load starts.
+    :param on_chunk: Called with a list of resolved targets for each chunk.
+    :param on_done: Called with (loaded, skipped) counts once the file is exhausted.
+    :param on_error: Called with the OSError if reading the file fails, in any chunk,
+        after the entries read before it were passed to on_chunk. Without it the error is raised.
+    """
+    load = ProgressiveLoad(window, entries, resolver, on_chunk, on_done, on_error, chunk_size)
+    load.step()
+    return load
@@ -0,0 +1,105 @@
+from playlist_io import PlaylistResolver, load_playlist, load_progressively, save_playlist
+
+ENTRIES = [
+    ("/music/Hello.mp3", "Adele - Hello"),
+    ("C:\\Music\\Sub Folder\\Señorita.mp3", "Shawn Mendes, Camila Cabello - Señorita"),
+    ("relative/untitled.mp3", None),
+]
+
+
+class FakeWindow:
+    """Stands in for a Tk window; callbacks passed to after() run when run_pending() is called."""
+    def __init__(self):
+        self.pending = []
+
+    def after(self, ms, callback):
+        self.pending.append(callback)
+        return callback
+
+    def after_cancel(self, job):
+        self.pending.remove(job)
+
+    def run_pending(self):
+        while self.pending:
+            self.pending.pop(0)()
+
+
+def test_m3u_and_jsonl_round_trip(tmp_path):
+    """Test that entries saved in either format load back unchanged and in order."""
+    for name in ("list.m3u8", "list.jsonl"):
+        path = str(tmp_path / name)
+        save_playlist(path, iter(ENTRIES))
+        assert list(load_playlist(path)) == ENTRIES
+
+
+def test_jsonl_skips_lines_it_cannot_read(tmp_path):
+    """Test that lines that are not UTF-8, not JSON or have no location are skipped."""
+    path = tmp_path / "list.jsonl"
+    path.write_bytes(
+        b'\xef\xbb\xbf{"location": "a.mp3", "title": "A"}\n'
+        b'{"location": "\xff\xfe.mp3"}\n'
+        b"not json\n"
+        b'{"title": "no location"}\n'
+        b"[1, 2]\n"
+        b'{"location": "b.mp3"}\n'
+    )
+    assert list(load_playlist(str(path))) == [("a.mp3", "A"), ("b.mp3", None)]
+
+
+def test_load_progressively_in_chunks():
+    """Test that entries arrive in chunks from the event loop and unknown ones are counted."""
+    resolver = PlaylistResolver({"01": ("Hello.mp3", "Adele - Hello"), "02": (None, "Queen - Bohemian Rhapsody")})
+    entries = [("x/hello.MP3", None), ("nowhere.mp3", None), ("y.mp3", "queen - bohemian rhapsody")] * 3
+    window = FakeWindow()
+    chunks, done = [], []
+    load_progressively(window, entries, resolver, chunks.append, lambda *counts: done.append(counts), chunk_size=4)
+    assert chunks == [["01", "02", "01"]] and not done
+    window.run_pending()
+    assert chunks == [["01", "02", "01"], ["02", "01"], ["02"]]
+    assert done == [(6, 3)]
+
+
+def test_errors_in_later_chunks_reach_on_error():
+    """Test that a read error after the first chunk is passed to on_error once the entries before it are added."""
+    def entries():
+        for number in range(5):
+            yield f"{number}.mp3", None
+        raise OSError("The drive was disconnected")
+
+    resolver = PlaylistResolver({str(number): (f"{number}.mp3", None) for number in range(5)})
+    window = FakeWindow()
+    chunks, done, errors = [], [], []
+    load_progressively(window, entries(), resolver, chunks.append, lambda *counts: done.append(counts), errors.append,
+                       chunk_size=2)
+    window.run_pending()
+    assert chunks == [["0", "1"], ["2", "3"], ["4"]]
+    assert [str(error) for error in errors] == ["The drive was disconnected"] and not done
+
+
+def test_missing_file_is_reported_through_on_error(tmp_path):
+    """Test that a file that cannot be opened is reported like any other read error."""
+    errors = []
+    load_progressively(FakeWindow(), load_playlist(str(tmp_path / "gone.m3u")), PlaylistResolver({}),
+                       None, None, errors.append)
+    assert len(errors) == 1 and isinstance(errors[0], FileNotFoundError)
+
+
+def test_a_new_load_cancels_the_one_still_running(tmp_path):
+    """Test that once a load is cancelled for a new one, only the new file's entries reach the playlist."""
+    first, second = str(tmp_path / "first.m3u"), str(tmp_path / "second.jsonl")
+    save_playlist(first, ((f"first{number}.mp3", None) for number in range(10)))
+    save_playlist(second, ((f"second{number}.mp3", None) for number in range(5)))
+    resolver = PlaylistResolver({f"{name}{number}": (f"{name}{number}.mp3", None)
+                                 for name in ("first", "second") for number in range(10)})
+    window = FakeWindow()
+    playlist, done = [], []
+    running = load_progressively(window, load_playlist(first), resolver, playlist.extend,
+                                 lambda *counts: done.append(counts), chunk_size=3)
+    assert playlist == ["first0", "first1", "first2"]
+    running.cancel()
+    playlist.clear()
+    load_progressively(window, load_playlist(second), resolver, playlist.extend, lambda *counts: done.append(counts),
+                       chunk_size=3)
+    window.run_pending()
+    assert playlist == [f"second{number}" for number in range(5)]
+    assert done == [(5, 0)]
@@ -0,0 +1,75 @@
+import pytest
+from playlist import Playlist
+
+
+def test_add_and_membership():
+    """Test that added items keep their order and are found by membership."""
+    playlist = Playlist()
+    playlist.add("01")
+    playlist.add("02")
+    playlist.add("01")
+    assert list(playlist) == ["01", "02", "01"]
+    assert "02" in playlist
+    assert "03" not in playlist
+
+
+def test_unique_playlist_rejects_duplicates():
+    """Test that a unique playlist only adds each item once."""
+    playlist = Playlist(unique=True)
+    assert playlist.extend(["a", "b", "a", "c"]) == ["a", "b", "c"]
+    assert playlist.add("b") is False
+    assert len(playlist) == 3
+
+
+def test_next_and_previous_wrap_around():
+    """Test that the current position loops in both directions."""
+    playlist = Playlist(["a", "b", "c"])
+    assert playlist.current() is None
+    assert playlist.next() == "a"
+    assert playlist.previous() == "c"
+    assert playlist.next() == "a"
+    assert Playlist().next() is None
+
+
+def test_remove_keeps_current_item():
+    """Test that removing other items keeps the current item selected."""
+    playlist = Playlist(["a", "b", "c", "d"])
+    playlist.select(2)
+    playlist.remove_many(["a", "d"])
+    assert list(playlist) == ["b", "c"]
+    assert playlist.current() == "c"
+    assert "a" not in playlist
+
+
+def test_remove_at_current_moves_to_next():
+    """Test that removing the current item makes the following item current."""
+    playlist = Playlist(["a", "b", "c"])
+    playlist.select(1)
+    playlist.remove_at([1])
+    assert playlist.current() == "c"
+    playlist.remove_at([1])
+    assert playlist.current() is None
+
+
+def test_move_and_reorder():
+    """Test that reordering follows the current item."""
+    playlist = Playlist(["a", "b", "c"])
+    playlist.select(0)
+    playlist.move(0, 2)
+    assert list(playlist) == ["b", "c", "a"]
+    assert playlist.current() == "a"
+    playlist.reorder([2, 0, 1])
+    assert list(playlist) == ["a", "b", "c"]
+    assert playlist.current() == "a"
+    with pytest.raises(ValueError):
+        playlist.reorder([0, 0, 1])
+
+
+def test_rename_keeps_positions():
+    """Test that renaming an item replaces it in place and keeps it current."""
+    playlist = Playlist(["a", "b", "a"])
+    playlist.select(2)
+    assert playlist.rename("a", "z") == 2
+    assert list(playlist) == ["z", "b", "z"]
+    assert "a" not in playlist
+    assert playlist.current() == "z"
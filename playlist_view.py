@@ -0,0 +1,114 @@
+import tkinter as tk
+
+HEADER = "Current Playlist:"
+MESSAGE_LINE = "1"  # Line 1 holds the latest message, line 2 the header, playlist rows follow
+
+
+def row_tag(key):
+    """Name of the text tag that marks every row showing a track."""
+    return f"track:{key}"
+
+
+class PlaylistView:
+    """
+    Shows a playlist of track keys in a text widget, one row per track.
+    Rows are inserted, cleared and rewritten individually: each row carries a tag
+    for its track, so when the library reports a changed rating or play count
+    only the rows of that track are redrawn, once the event loop is idle.
+    The view stops following the library when its text widget is destroyed.
+    """
+    def __init__(self, text_area, lib):
+        self.text_area = text_area
+        self.lib = lib
+        self.counts = {}  # key -> number of rows showing it
+        self.dirty = set()  # Keys whose rows need redrawing
+        self.flush_pending = False
+        self.closed = False
+        self.edit(lambda: self.text_area.delete("1.0", tk.END))
+        self.edit(lambda: self.text_area.insert("1.0", f"\n{HEADER}\n"))
+        lib.add_listener(self.on_change)
+        text_area.bind("<Destroy>", self.on_destroy, add="+")
+
+    def on_destroy(self, event):
+        if event.widget is self.text_area:
+            self.close()
+
+    def close(self):
+        """Stop following the library; a redraw already scheduled does nothing."""
+        self.closed = True
+        self.lib.remove_listener(self.on_change)
+
+    def edit(self, change):
+        # The widget is read-only to the user, so rows always line up with the playlist
+        self.text_area.configure(state=tk.NORMAL)
+        change()
+        self.text_area.configure(state=tk.DISABLED)
+
+    def row_text(self, key):
+        """Text of the row for one track."""
+        name = self.lib.get_name(key)
+        if name is None:
+            return f"Track {key} not found."
+        artist = self.lib.get_artist(key)
+        rating = self.lib.get_rating(key)
+        play_count = self.lib.get_play_count(key)
+        return f"{name} by {artist} - {rating} stars, Played {play_count} times"
+
+    def append(self, keys):
+        """Add rows for the given keys at the end, with a single insert."""
+        chunks = []
+        for key in keys:
+            chunks.extend((self.row_text(key) + "\n", row_tag(key)))
+            self.counts[key] = self.counts.get(key, 0) + 1
+        if chunks:
+            self.edit(lambda: self.text_area.insert("end-1c", *chunks))
+
+    def clear(self):
+        """Remove every row, keeping the message and header lines."""
+        self.edit(lambda: self.text_area.delete("3.0", tk.END))
+        for key in self.counts:
+            self.text_area.tag_delete(row_tag(key))
+        self.counts.clear()
+        self.dirty.clear()
+
+    def show_message(self, message):
+        """Replace the message line above the playlist."""
+        def change():
+            self.text_area.delete(f"{MESSAGE_LINE}.0", f"{MESSAGE_LINE}.end")
+            self.text_area.insert(f"{MESSAGE_LINE}.0", message)
+        self.edit(change)
+
+    def on_change(self, key, field, old, new):
+        """Library listener that schedules a redraw of the rows of a changed track."""
+        if field == "reload":
+            self.dirty.update(self.counts)
+        elif key in self.counts:
+            self.dirty.add(key)
+        else:
+            return
+        if not self.flush_pending:
+            self.flush_pending = True
+            self.text_area.after_idle(self.flush)
+
+    def flush(self):
+        """Redraw the rows of every track that changed since the last flush."""
+        self.flush_pending = False
+        dirty, self.dirty = self.dirty, set()
+        if self.closed:
+            return
+
+        def change():
+            for key in dirty:
+                tag = row_tag(key)
+                text = self.row_text(key)
+                ranges = self.text_area.tag_ranges(tag)
+                for start, end in zip(ranges[::2], ranges[1::2]):
+                    # Neighbouring rows of the same track share one range, so rewrite line by line.
+                    # Each range ends at the start of the line after its last row.
+                    first_line = int(str(start).split(".")[0])
+                    last_line = int(str(end).split(".")[0]) - 1
+                    for line in range(first_line, last_line + 1):
+                        self.text_area.delete(f"{line}.0", f"{line}.end")
+                        self.text_area.insert(f"{line}.0", text, tag)
+        if dirty:
+            self.edit(change)
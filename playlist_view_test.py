@@ -0,0 +1,92 @@
+import os
+import tkinter as tk
+from types import SimpleNamespace
+
+import pytest
+
+import Track_Library_JSON as lib
+from playlist_view import PlaylistView
+
+
+def load():
+    lib.load_library_from_json(os.path.join(os.path.dirname(__file__), "library.json"))
+
+
+class FakeText:
+    """Stands in for a Tk text widget: records the row texts inserted and runs after_idle() callbacks on demand."""
+    def __init__(self):
+        self.inserted = []
+        self.idle = []
+        self.bindings = {}
+
+    def configure(self, state):
+        pass
+
+    def delete(self, start, end):
+        pass
+
+    def insert(self, index, *chunks):
+        self.inserted.extend(chunks[::2])
+
+    def tag_delete(self, tag):
+        pass
+
+    def tag_ranges(self, tag):
+        return ()
+
+    def after_idle(self, callback):
+        self.idle.append(callback)
+
+    def bind(self, sequence, callback, add=None):
+        self.bindings[sequence] = callback
+
+    def run_idle(self):
+        while self.idle:
+            self.idle.pop(0)()
+
+
+def test_destroying_the_widget_stops_following_the_library():
+    """Test that the view leaves the library's listeners when its widget goes, and a pending redraw does nothing."""
+    load()
+    text = FakeText()
+    view = PlaylistView(text, lib)
+    try:
+        view.append(["01", "02"])
+        assert view.on_change in lib.listeners
+        lib.set_rating("01", 1)
+        assert len(text.idle) == 1
+        text.bindings["<Destroy>"](SimpleNamespace(widget=object()))  # Another widget's event changes nothing
+        assert view.on_change in lib.listeners
+        text.bindings["<Destroy>"](SimpleNamespace(widget=text))
+        assert view.on_change not in lib.listeners
+        redrawn = len(text.inserted)
+        text.run_idle()
+        lib.set_rating("01", 2)
+        assert len(text.inserted) == redrawn and not text.idle
+    finally:
+        view.close()
+        load()
+
+
+def test_changed_tracks_are_redrawn_in_place():
+    """Test that a rating change rewrites every row of that track and no other, once the loop is idle."""
+    try:
+        root = tk.Tk()
+    except tk.TclError as error:
+        pytest.skip(f"No display: {error}")
+    root.withdraw()
+    load()
+    text = tk.Text(root)
+    view = PlaylistView(text, lib)
+    try:
+        view.append(["01", "02", "01"])
+        lib.set_rating("01", 1)
+        root.update()
+        lines = text.get("3.0", "end-1c").splitlines()
+        assert [line.endswith("1 stars, Played 0 times") for line in lines] == [True, False, True]
+        text.destroy()
+        assert view.on_change not in lib.listeners
+    finally:
+        view.close()
+        root.destroy()
+        load()
@@ -0,0 +1,158 @@
+import heapq
+import math
+import threading
+
+import numpy as np
+
+import play_history
+
+SESSION_GAP = 30 * 60  # Plays further apart than this, in seconds, belong to different sessions
+BASKET_SIZE = 20  # Plays per basket; longer sessions are split so each play pairs with a bounded number of others
+TOP_N = 10
+
+
+class CoOccurrence:
+    """
+    Sparse track-to-track co-occurrence counts built from the play history and from playlists.
+    Plays are grouped into baskets: runs of up to BASKET_SIZE plays with no gap longer
+    than SESSION_GAP, so an evening of listening makes one or a few baskets. A playlist
+    given to add_playlist() is one more basket, whatever its length; to keep its cost
+    linear, each of its tracks is paired with the BASKET_SIZE - 1 tracks that follow it.
+    rows[a][b] is the number of baskets holding both a and b and baskets[a] the
+    number holding a; only pairs that occur are stored, never an N x N matrix.
+    Similarity is the cosine of two tracks' basket vectors,
+    rows[a][b] / sqrt(baskets[a] * baskets[b]), so ranking the tracks similar to a only
+    reads a's own row. New history events are counted incrementally, and the last basket
+    stays open so a session still in progress keeps growing.
+    Tracks are identified by their key IDs in the history.
+    """
+    def __init__(self, history):
+        self.history = history
+        self.rows = {}  # Key ID -> {key ID: baskets holding both}
+        self.baskets = {}  # Key ID -> baskets holding it
+        self.consumed = 0  # History events already counted
+        self.open_basket = np.empty(0, dtype=play_history.RECORD_DTYPE)  # Plays of the basket still being filled
+        self.playlists = set()  # Hashes of the playlists already counted, so each counts once per process
+        self.lock = threading.Lock()
+
+    def update(self):
+        """Count the events recorded since the last update and return how many there were."""
+        with self.lock:
+            events = self.history.since(self.consumed)
+            if len(events):
+                self.consumed += len(events)
+                self.add_events(events)
+            return len(events)
+
+    def add_events(self, events):
+        old = len(self.open_basket)  # Plays at the front that were counted by an earlier update
+        plays = np.concatenate([self.open_basket, events])
+        keys = plays["key"].astype(np.int64)
+        width = int(keys.max()) + 1
+
+        # A basket starts with a new session, or after every BASKET_SIZE plays of a session
+        new_session = np.concatenate([[True], np.diff(plays["time"]) > SESSION_GAP])
+        session_start = np.maximum.accumulate(np.where(new_session, np.arange(len(plays)), 0))
+        basket = np.cumsum(new_session | ((np.arange(len(plays)) - session_start) % BASKET_SIZE == 0)) - 1
+        last = np.flatnonzero(basket == basket[-1])
+        self.open_basket = plays[last] if len(last) < BASKET_SIZE else plays[:0]
+
+        # Each track counts once per basket; members first seen among the old plays are already counted
+        codes, first = np.unique(basket * width + keys, return_index=True)
+        member_basket, member_key = np.divmod(codes, width)
+        member_new = first >= old
+        for key_id, count in zip(*np.unique(member_key[member_new], return_counts=True)):
+            self.baskets[int(key_id)] = self.baskets.get(int(key_id), 0) + int(count)
+
+        # Members are sorted by basket, so every pair in a basket is at most BASKET_SIZE - 1 apart
+        pairs = []
+        for offset in range(1, min(BASKET_SIZE, len(codes))):
+            same = member_basket[:-offset] == member_basket[offset:]
+            same &= member_new[:-offset] | member_new[offset:]
+            pairs.append(member_key[:-offset][same] * width + member_key[offset:][same])
+        pairs = np.concatenate(pairs) if pairs else np.empty(0, dtype=np.int64)
+        if len(pairs):
+            self.add_pairs(pairs, width)
+
+    def add_playlist(self, keys):
+        """
+        Count the tracks of a playlist, in order, as one basket. A playlist with the same tracks
+        in the same order is only counted once, however often it is played, saved or loaded;
+        its plays are counted through the history. Returns True if the playlist was new.
+        """
+        key_ids = list(dict.fromkeys(self.history.ids_of(list(dict.fromkeys(keys)))))
+        if not key_ids:
+            return False
+        with self.lock:
+            signature = hash(tuple(key_ids))
+            if signature in self.playlists:
+                return False
+            self.playlists.add(signature)
+            for key_id in key_ids:
+                self.baskets[key_id] = self.baskets.get(key_id, 0) + 1
+            members = np.array(key_ids, dtype=np.int64)
+            width = int(members.max()) + 1
+            pairs = [members[:-offset] * width + members[offset:] for offset in range(1, min(BASKET_SIZE, len(members)))]
+            if pairs:
+                self.add_pairs(np.concatenate(pairs), width)
+            return True
+
+    def add_pairs(self, pair_codes, width):
+        """Add one to both rows of every (a, b) pair, given as codes a * width + b."""
+        pair_codes, counts = np.unique(pair_codes, return_counts=True)
+        first, second = np.divmod(pair_codes, width)
+        sources = np.concatenate([first, second])
+        targets = np.concatenate([second, first])
+        counts = np.concatenate([counts, counts])
+        order = np.argsort(sources, kind="stable")
+        sources, targets, counts = sources[order], targets[order], counts[order]
+        bounds = np.flatnonzero(np.diff(sources)) + 1
+        for start, stop in zip(np.concatenate([[0], bounds]), np.concatenate([bounds, [len(sources)]])):
+            source = int(sources[start])
+            new = dict(zip(targets[start:stop].tolist(), counts[start:stop].tolist()))
+            row = self.rows.get(source)
+            if row is None:
+                self.rows[source] = new
+            else:
+                for target, count in new.items():
+                    row[target] = row.get(target, 0) + count
+
+    def similar(self, key, n=TOP_N):
+        """
+        Up to n (key, similarity) pairs for the tracks most often played together with key,
+        most similar first. Catches up with the history before answering.
+        """
+        self.update()
+        with self.lock:
+            key_id = self.history.key_ids.get(key)
+            row = self.rows.get(key_id)
+            if not row:
+                return []
+            baskets = self.baskets
+            best = heapq.nlargest(n, row.items(), key=lambda pair: pair[1] / math.sqrt(baskets[pair[0]]))
+            scale = 1 / math.sqrt(baskets[key_id])
+            return [(self.history.keys[other], count * scale / math.sqrt(baskets[other])) for other, count in best]
+
+
+def format_similar(lib, key, results):
+    """Format the result of similar() as text for display, naming the tracks that are in the library."""
+    if not results:
+        return f"No tracks have been played together with {key} yet."
+    output = f"Played together with {key}:\n"
+    for other, similarity in results:
+        name = lib.get_name(other)
+        label = other if name is None else f"{other} {name} - {lib.get_artist(other)}"
+        output += f"{label} ({similarity:.2f})\n"
+    return output
+
+
+# One recommender per process, built on first use
+_recommender = None
+
+
+def shared_recommender():
+    """Return the recommender shared by every window in this process, creating it if needed."""
+    global _recommender
+    if _recommender is None:
+        _recommender = CoOccurrence(play_history.shared_history())
+    return _recommender
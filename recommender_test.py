@@ -0,0 +1,64 @@
+import itertools
+import math
+import random
+
+from play_history import PlayHistory
+from recommender import BASKET_SIZE, SESSION_GAP, CoOccurrence
+
+
+def test_similarity_matches_a_brute_force_count(tmp_path):
+    """Test that incremental updates give the cosine similarity of the tracks' basket vectors."""
+    history = PlayHistory(str(tmp_path / "history.dat"))
+    recommender = CoOccurrence(history)
+    rng = random.Random(2)
+    baskets = []
+    timestamp = 0.0
+    for step in range(2000):
+        gap = rng.choice([10, 200, SESSION_GAP + 1])
+        timestamp += gap
+        key = f"{rng.randrange(40):02d}"
+        if not baskets or gap > SESSION_GAP or len(baskets[-1]) == BASKET_SIZE:
+            baskets.append([])
+        baskets[-1].append(key)
+        history.record(key, timestamp=timestamp)
+        if rng.random() < 0.05:
+            recommender.update()
+
+    def cosine(first, second):
+        both = sum(first in basket and second in basket for basket in baskets)
+        return both / math.sqrt(sum(first in basket for basket in baskets) * sum(second in basket for basket in baskets))
+
+    results = recommender.similar("07", n=5)
+    expected = sorted((cosine("07", other) for other in set(itertools.chain(*baskets)) - {"07"}), reverse=True)[:5]
+    assert [round(similarity, 9) for _, similarity in results] == [round(value, 9) for value in expected]
+    assert all(math.isclose(similarity, cosine("07", other)) for other, similarity in results)
+    history.close()
+
+
+def test_played_playlist_forms_one_basket(tmp_path):
+    """Test that tracks played together rank above tracks played in another session."""
+    history = PlayHistory(str(tmp_path / "history.dat"))
+    for key in ["01", "02", "03"]:
+        history.record(key, timestamp=1000.0)
+    history.record("04", timestamp=1000.0 + SESSION_GAP + 1)
+    history.record("01", timestamp=1000.0 + SESSION_GAP + 2)
+    results = CoOccurrence(history).similar("02")
+    assert [key for key, _ in results] == ["03", "01"]
+    history.close()
+
+
+def test_playlists_count_once_as_one_basket(tmp_path):
+    """Test that a playlist is one basket pairing each track with the ones that follow it, counted once."""
+    history = PlayHistory(str(tmp_path / "history.dat"))
+    recommender = CoOccurrence(history)
+    keys = [f"{number:02d}" for number in range(BASKET_SIZE + 5)]
+    assert recommender.add_playlist(keys)
+    assert not recommender.add_playlist(list(keys))  # Played or saved again
+    assert recommender.add_playlist(["00", "01", "01"])
+    results = dict(recommender.similar("00", n=100))
+    assert set(results) == set(keys[1:BASKET_SIZE])
+    assert math.isclose(results["01"], 1.0) and math.isclose(results["02"], 1 / math.sqrt(2))
+    assert len(history) == 0  # Playlists add no plays
+    history.record_many(["05", "06"], timestamp=5.0)
+    assert history.play_counts() == {"05": 1, "06": 1} and set(history.events()["time"]) == {5.0}
+    history.close()
@@ -1,5 +1,7 @@
 import tkinter as tk
-from track_library import list_all, get_name, get_artist
+import track_library as lib
+from gui_tasks import TaskRunner, cancelled
+from track_query import parse_query, search
 
 class TrackSearch:
     def __init__(self, window):
@@ -25,9 +27,12 @@ class TrackSearch:
         self.clear_button = tk.Button(window, text="Clear", command=self.clear_results)
         self.clear_button.pack(pady=5)
 
+        # Searches run in the background; a new search replaces one still running
+        self.tasks = TaskRunner(window)
+
     def search_tracks(self):
         # Get the search query
-        query = self.search_entry.get().lower().strip()
+        query = self.search_entry.get().strip()
 
         # Clear previous results
         self.clear_results()
@@ -36,27 +41,42 @@ class TrackSearch:
         if not query:
             return
 
+        # Report a query that cannot be parsed instead of searching
+        try:
+            parsed = parse_query(query)
+        except ValueError as error:
+            self.show_results(None, f"Invalid search: {error}")
+            return
+
+        self.show_results(None, "Searching...")
+        self.tasks.submit("search", lambda: self.find_tracks(parsed), self.show_results)
+
+    def find_tracks(self, query):
+        """
+        Returns the tracks matching a parsed query, e.g. 'artist:adele rating>=4'. Runs in a background task.
+        """
         # List to hold matching tracks based on the search query
         matching_tracks = []
-        for track_id in list_all().splitlines():
-            # Extract track details using the library functions
-            track_id = track_id.split()[0]  # Get the track ID from the list_all output
-            name = get_name(track_id).lower() if get_name(track_id) else ""
-            artist = get_artist(track_id).lower() if get_artist(track_id) else ""
-
-            # Check if the query is in the track's name or artist
-            if query in name or query in artist:
-                matching_tracks.append(f"Track ID: {track_id}, Name: {name}, Artist: {artist}")
+        for track_id, item in search(lib, query):
+            if cancelled():  # A newer search has replaced this one
+                return None
+            matching_tracks.append(f"Track ID: {track_id}, Name: {item.name}, Artist: {item.artist}")
+        return matching_tracks
 
+    def show_results(self, matching_tracks, message="No matching tracks found."):
+        """
+        Displays the matching tracks, or the message if there are none.
+        """
         # Display the results
         self.results_text.config(state=tk.NORMAL)
+        self.results_text.delete("1.0", tk.END)
         if matching_tracks:
             for track_info in matching_tracks:
                 # Insert each matching track's information into the results_text widget
                 self.results_text.insert(tk.END, track_info + "\n")
         else:
             # If no tracks match the query, display a message indicating that
-            self.results_text.insert(tk.END, "No matching tracks found.")
+            self.results_text.insert(tk.END, message)
             # Disable the results_text widget to prevent further modification
         self.results_text.config(state=tk.DISABLED)
 
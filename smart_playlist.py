@@ -0,0 +1,320 @@
+import operator
+import re
+
+import numpy as np
+
+from library_columns import columns_for
+
+# Comparison operators allowed in rules
+OPERATORS = {
+    "==": operator.eq,
+    "=": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+}
+
+# Rule field names and the column each one reads
+NUMERIC_FIELDS = {"rating": "rating", "play_count": "play_count", "plays": "play_count"}
+KEYWORDS = ("AND", "OR", "NOT")  # End an unquoted artist name
+
+
+class Rule:
+    """
+    Base class for smart playlist rules.
+    mask() evaluates a rule over whole columns at once; matches() checks a single
+    row so a playlist can follow one changed track without re-evaluating everything.
+    Rules combine with &, | and ~.
+    """
+    def mask(self, columns):
+        raise NotImplementedError
+
+    def matches(self, columns, row):
+        raise NotImplementedError
+
+    def __and__(self, other):
+        return And(self, other)
+
+    def __or__(self, other):
+        return Or(self, other)
+
+    def __invert__(self):
+        return Not(self)
+
+
+class Compare(Rule):
+    """A numeric column compared with a constant, e.g. rating >= 4."""
+    def __init__(self, field, op, value):
+        if field not in NUMERIC_FIELDS:
+            raise ValueError(f"Unknown rule field: {field}")
+        if op not in OPERATORS:
+            raise ValueError(f"Unknown rule operator: {op}")
+        self.column = NUMERIC_FIELDS[field]
+        self.op = OPERATORS[op]
+        self.value = value
+
+    def mask(self, columns):
+        return self.op(getattr(columns, self.column), self.value)
+
+    def matches(self, columns, row):
+        return bool(self.op(getattr(columns, self.column)[row], self.value))
+
+
+class ArtistIn(Rule):
+    """The track's artist is one of a set of names."""
+    def __init__(self, artists):
+        self.artists = set(artists)
+
+    def lookup_table(self, columns):
+        # One flag per artist ID, so the mask is a single gather over the artist column
+        table = np.zeros(len(columns.artists) + 1, dtype=bool)
+        for artist in self.artists:
+            artist_id = columns.artist_ids.get(artist)
+            if artist_id is not None:
+                table[artist_id] = True
+        return table
+
+    def mask(self, columns):
+        return self.lookup_table(columns)[columns.artist_id]
+
+    def matches(self, columns, row):
+        return columns.artists[columns.artist_id[row]] in self.artists
+
+
+class And(Rule):
+    def __init__(self, *rules):
+        self.rules = rules
+
+    def mask(self, columns):
+        result = self.rules[0].mask(columns)
+        for rule in self.rules[1:]:
+            result &= rule.mask(columns)
+        return result
+
+    def matches(self, columns, row):
+        return all(rule.matches(columns, row) for rule in self.rules)
+
+
+class Or(Rule):
+    def __init__(self, *rules):
+        self.rules = rules
+
+    def mask(self, columns):
+        result = self.rules[0].mask(columns)
+        for rule in self.rules[1:]:
+            result |= rule.mask(columns)
+        return result
+
+    def matches(self, columns, row):
+        return any(rule.matches(columns, row) for rule in self.rules)
+
+
+class Not(Rule):
+    def __init__(self, rule):
+        self.rule = rule
+
+    def mask(self, columns):
+        return ~self.rule.mask(columns)
+
+    def matches(self, columns, row):
+        return not self.rule.matches(columns, row)
+
+
+TOKEN_PATTERN = re.compile(r"""\s*(?:(\(|\)|\{|\}|,)|(<=|>=|!=|==|=|<|>)|"([^"]*)"|'([^']*)'|([^\s(){},<>=!]+))""")
+
+
+def tokenize(text):
+    """Split a rule into punctuation, operator, quoted string and word tokens."""
+    tokens = []
+    position = 0
+    text = text.strip()
+    while position < len(text):
+        match = TOKEN_PATTERN.match(text, position)
+        if match is None or match.end() == position:
+            raise ValueError(f"Unexpected character in rule at position {position}: {text[position]!r}")
+        punctuation, op, double_quoted, single_quoted, word = match.groups()
+        if punctuation or op:
+            tokens.append(punctuation or op)
+        elif double_quoted is not None or single_quoted is not None:
+            tokens.append(("string", double_quoted if double_quoted is not None else single_quoted))
+        else:
+            tokens.append(("word", word))
+        position = match.end()
+    return tokens
+
+
+class RuleParser:
+    """
+    Parses rules such as 'rating >= 4 AND play_count < 3 AND artist in {"Adele", "Bee Gees"}'.
+    AND binds tighter than OR; NOT and parentheses are supported.
+    """
+    def __init__(self, text):
+        self.tokens = tokenize(text)
+        self.position = 0
+
+    def parse(self):
+        rule = self.parse_or()
+        if self.position != len(self.tokens):
+            raise ValueError(f"Unexpected token in rule: {self.describe(self.peek())}")
+        return rule
+
+    def peek(self):
+        return self.tokens[self.position] if self.position < len(self.tokens) else None
+
+    def take(self):
+        token = self.peek()
+        if token is None:
+            raise ValueError("Rule ended unexpectedly")
+        self.position += 1
+        return token
+
+    def keyword(self, word):
+        token = self.peek()
+        if isinstance(token, tuple) and token[0] == "word" and token[1].upper() == word:
+            self.position += 1
+            return True
+        return False
+
+    def expect(self, token):
+        if self.take() != token:
+            raise ValueError(f"Expected {token!r} in rule")
+
+    def describe(self, token):
+        return token[1] if isinstance(token, tuple) else token
+
+    def parse_or(self):
+        rules = [self.parse_and()]
+        while self.keyword("OR"):
+            rules.append(self.parse_and())
+        return rules[0] if len(rules) == 1 else Or(*rules)
+
+    def parse_and(self):
+        rules = [self.parse_not()]
+        while self.keyword("AND"):
+            rules.append(self.parse_not())
+        return rules[0] if len(rules) == 1 else And(*rules)
+
+    def parse_not(self):
+        if self.keyword("NOT"):
+            return Not(self.parse_not())
+        if self.peek() == "(":
+            self.take()
+            rule = self.parse_or()
+            self.expect(")")
+            return rule
+        return self.parse_condition()
+
+    def parse_condition(self):
+        token = self.take()
+        if not isinstance(token, tuple) or token[0] != "word":
+            raise ValueError(f"Expected a field name in rule, got {self.describe(token)!r}")
+        field = token[1].lower()
+        if field == "artist":
+            return self.parse_artist()
+        if field not in NUMERIC_FIELDS:
+            raise ValueError(f"Unknown rule field: {field}")
+        op = self.take()
+        if op not in OPERATORS:
+            raise ValueError(f"Expected a comparison after {field!r}")
+        try:
+            value = int(self.describe(self.take()))
+        except ValueError:
+            raise ValueError(f"Expected a whole number after {field} {op}") from None
+        return Compare(field, op, value)
+
+    def parse_artist(self):
+        if self.keyword("IN"):
+            self.expect("{")
+            names = []
+            while self.peek() != "}":
+                names.append(self.name())
+                if self.peek() == ",":
+                    self.take()
+            self.take()
+            return ArtistIn(names)
+        op = self.take()
+        if op not in ("=", "==", "!="):
+            raise ValueError("Expected 'in', '=' or '!=' after artist")
+        rule = ArtistIn([self.name()])
+        return Not(rule) if op == "!=" else rule
+
+    def name(self):
+        # Unquoted names may span several words, e.g. {Pink Floyd, Adele}, up to the next keyword
+        words = []
+        while isinstance(self.peek(), tuple):
+            kind, text = self.peek()
+            if kind == "word" and text.upper() in KEYWORDS:
+                break
+            self.take()
+            words.append(text)
+            if kind == "string":
+                break
+        if not words:
+            raise ValueError("Expected an artist name in rule")
+        return " ".join(words)
+
+
+def parse_rule(text):
+    """Parse a rule string into a Rule."""
+    return RuleParser(text).parse()
+
+
+class SmartPlaylist:
+    """
+    The tracks of a library that match a rule, kept as a boolean row mask.
+    The mask is computed once with vectorized operations and then follows the
+    library: a changed rating or play count re-checks only that track's row.
+    """
+    def __init__(self, lib, rule):
+        self.columns = columns_for(lib)
+        self.rule = parse_rule(rule) if isinstance(rule, str) else rule
+        self.refresh()
+        self.columns.listeners.append(self.on_row_change)
+
+    def __len__(self):
+        return int(np.count_nonzero(self.mask))
+
+    def refresh(self):
+        """Evaluate the rule over every row."""
+        self.mask = np.asarray(self.rule.mask(self.columns), dtype=bool)
+
+    def on_row_change(self, row, field):
+        if row is None:
+            self.refresh()
+        else:
+            self.mask[row] = self.rule.matches(self.columns, row)
+
+    def close(self):
+        """Stop following the library."""
+        self.columns.listeners.remove(self.on_row_change)
+
+    def keys(self):
+        """Library keys of the matching tracks, in library order."""
+        return self.columns.keys_at(np.flatnonzero(self.mask))
+
+
+def benchmark(rows=10_000_000, rule='rating >= 4 AND plays < 3 AND artist in {Adele, "Bee Gees"}'):
+    """Time parsing a rule and evaluating it over synthetic columns of the given number of rows."""
+    import time
+    import types
+
+    rng = np.random.default_rng(0)
+    artists = [f"Artist {number}" for number in range(10_000)] + ["Adele", "Bee Gees"]
+    columns = types.SimpleNamespace(  # The attributes of LibraryColumns that rules read
+        rating=rng.integers(0, 6, rows, dtype=np.int8),
+        play_count=rng.integers(0, 100, rows, dtype=np.int32),
+        artist_id=rng.integers(0, len(artists), rows, dtype=np.int32),
+        artists=artists,
+        artist_ids={artist: artist_id for artist_id, artist in enumerate(artists)},
+    )
+    started = time.perf_counter()
+    mask = parse_rule(rule).mask(columns)
+    elapsed = time.perf_counter() - started
+    print(f"{rule!r} over {rows} rows: {elapsed * 1000:.0f} ms, {int(np.count_nonzero(mask))} matches")
+
+
+if __name__ == "__main__":
+    # Usage: python smart_playlist.py
+    benchmark()
@@ -0,0 +1,66 @@
+import os
+
+import numpy as np
+import pytest
+
+import Track_Library_JSON as lib
+import library_columns
+from smart_playlist import And, ArtistIn, Compare, Not, Or, SmartPlaylist, parse_rule
+
+
+@pytest.fixture
+def columns(monkeypatch):
+    """Columns of the JSON library, used by smart playlists instead of the shared ones and closed afterwards."""
+    lib.load_library_from_json(os.path.join(os.path.dirname(__file__), "library.json"))
+    fresh = library_columns.LibraryColumns(lib)
+    monkeypatch.setitem(library_columns._columns, lib.__name__, fresh)
+    yield fresh
+    fresh.close()
+    lib.load_library_from_json(os.path.join(os.path.dirname(__file__), "library.json"))
+
+
+def test_parse_rule():
+    """Test that AND binds tighter than OR and unquoted artist names end at keywords."""
+    rule = parse_rule('rating >= 4 AND plays < 3 OR NOT artist in {Pink Floyd, "Bee Gees"}')
+    assert isinstance(rule, Or) and isinstance(rule.rules[0], And) and isinstance(rule.rules[1], Not)
+    assert rule.rules[1].rule.artists == {"Pink Floyd", "Bee Gees"}
+    rule = parse_rule("artist = Adele AND rating >= 1")
+    assert isinstance(rule, And) and rule.rules[0].artists == {"Adele"} and isinstance(rule.rules[1], Compare)
+    assert parse_rule("artist != Ed Sheeran or (plays = 0)").rules[0].rule.artists == {"Ed Sheeran"}
+
+
+@pytest.mark.parametrize("text", ["", "mood = 3", "rating >=", "rating > four", "artist in {Adele", "(rating > 1", "artist"])
+def test_parse_errors(text):
+    """Test that malformed rules raise ValueError."""
+    with pytest.raises(ValueError):
+        parse_rule(text)
+
+
+def test_mask_matches_row_checks(columns):
+    """Test that every rule's vectorized mask agrees with checking each row on its own."""
+    for text in ["rating >= 4", "plays = 0 AND NOT rating < 3", "artist in {Adele, AC/DC} OR rating == 5",
+                 "artist != Adele AND (rating <= 2 OR rating > 4)"]:
+        rule = parse_rule(text)
+        expected = [rule.matches(columns, row) for row in range(len(columns))]
+        assert rule.mask(columns).tolist() == expected, text
+
+
+def test_playlist_follows_row_changes(columns):
+    """Test that changed ratings and play counts re-check only their track, and a reload everything."""
+    playlist = SmartPlaylist(lib, "rating >= 4 AND plays < 1")
+    try:
+        assert playlist.keys() == ["01", "02"]
+        lib.increment_play_count("01")
+        lib.set_rating("05", 4)
+        assert playlist.keys() == ["02", "05"]
+        assert playlist.mask.tolist() == playlist.rule.mask(columns).tolist()
+        lib.load_library_from_json(os.path.join(os.path.dirname(__file__), "library.json"))
+        assert playlist.keys() == ["01", "02"]
+    finally:
+        playlist.close()
+
+
+def test_artist_in_ignores_unknown_artists(columns):
+    """Test that names not in the library match nothing rather than failing."""
+    assert not ArtistIn(["Nobody"]).mask(columns).any()
+    assert np.count_nonzero(ArtistIn(["Adele", "Nobody"]).mask(columns)) == 1
@@ -0,0 +1,75 @@
+import functools
+import hashlib
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from mutagen import MutagenError
+from mutagen.easyid3 import EasyID3
+
+import Track_Library_JSON as store
+from folder_watcher import FolderWatcher
+
+CHUNK_SIZE = 256  # Files per task handed to a worker, so big imports are not dominated by task overhead
+UNKNOWN_ARTIST = "Unknown Artist"
+
+
+def track_key(relative_path):
+    """
+    Stable library key of a music file, derived from its path within the music folder.
+    Importing the same folder again gives every file the same key.
+    """
+    normalized = relative_path.replace("\\", "/").lower()
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()[:12]
+
+
+def read_tags(path):
+    """
+    Read (title, artist) from a file's ID3 tags.
+    Missing tags fall back to the file name and UNKNOWN_ARTIST.
+    """
+    title = artist = None
+    try:
+        tags = EasyID3(path)
+        title = (tags.get("title") or [None])[0]
+        artist = (tags.get("artist") or [None])[0]
+    except MutagenError:  # No ID3 header, or a file mutagen cannot parse
+        pass
+    return title or os.path.splitext(os.path.basename(path))[0], artist or UNKNOWN_ARTIST
+
+
+def read_entry(folder, relative_path):
+    """Library entry (key, title, artist) for one file. Runs in a worker process."""
+    return (track_key(relative_path), *read_tags(os.path.join(folder, relative_path)))
+
+
+def read_folder(folder, max_workers=None):
+    """Read the tags of every MP3 file under a folder in parallel, one worker per core by default."""
+    paths = FolderWatcher(folder).paths()
+    with ProcessPoolExecutor(max_workers=max_workers or os.cpu_count()) as pool:
+        return list(pool.map(functools.partial(read_entry, folder), paths, chunksize=CHUNK_SIZE))
+
+
+def ingest(folder, library_path=None, max_workers=None):
+    """
+    Import the tags of every MP3 file under a folder into the JSON track library.
+    Tags are read in parallel, merged in one batch and the library is written once at the end.
+    :return: (files read, tracks added, tracks updated)
+    """
+    try:
+        store.load_library_from_json(library_path)
+    except FileNotFoundError:
+        store.clear_library()  # Start a new library
+    entries = read_folder(folder, max_workers)
+    added, updated = store.merge_tracks(entries)
+    if added or updated:
+        store.save_library_to_json(library_path)
+    return len(entries), added, updated
+
+
+if __name__ == "__main__":
+    # Usage: python tag_ingest.py [music folder] [library.json]
+    folder = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(os.path.abspath(__file__)), "MusicPlayer")
+    library_path = sys.argv[2] if len(sys.argv) > 2 else None
+    read, added, updated = ingest(folder, library_path)
+    print(f"Read {read} files: {added} tracks added, {updated} updated.")
@@ -0,0 +1,36 @@
+import json
+
+import Track_Library_JSON as store
+import tag_ingest
+
+
+def test_keys_are_stable_across_platforms():
+    """Test that the same file path gives the same key whatever the separator or case."""
+    assert tag_ingest.track_key("Album\\Song.mp3") == tag_ingest.track_key("album/song.MP3")
+    assert tag_ingest.track_key("a.mp3") != tag_ingest.track_key("b.mp3")
+
+
+def test_untagged_file_falls_back_to_file_name(tmp_path):
+    """Test that a file without ID3 tags is named after the file."""
+    song = tmp_path / "Some Song.mp3"
+    song.write_bytes(b"\x00" * 64)
+    assert tag_ingest.read_tags(str(song)) == ("Some Song", tag_ingest.UNKNOWN_ARTIST)
+
+
+def test_ingest_merges_and_writes_once(tmp_path):
+    """Test that known tracks keep their key and rating and new files are added unrated."""
+    music = tmp_path / "music"
+    music.mkdir()
+    (music / "Highway to Hell.mp3").write_bytes(b"\x00" * 64)
+    (music / "New Song.mp3").write_bytes(b"\x00" * 64)
+    library_path = tmp_path / "library.json"
+    library_path.write_text(json.dumps({"03": {"title": "Highway to Hell", "artist": "Unknown Artist", "rating": 2}}))
+
+    assert tag_ingest.ingest(str(music), str(library_path), max_workers=1) == (2, 1, 0)
+    data = json.loads(library_path.read_text())
+    assert data["03"]["rating"] == 2
+    assert data[tag_ingest.track_key("New Song.mp3")] == {
+        "title": "New Song", "artist": "Unknown Artist", "rating": 0, "play_count": 0
+    }
+    assert tag_ingest.ingest(str(music), str(library_path), max_workers=1) == (2, 0, 0)
+    store.clear_library()
@@ -0,0 +1,199 @@
+import json
+import os
+import sys
+import threading
+import time
+import tkinter
+
+TRACE_ENV = "TK_WATCHDOG_TRACE"  # Set to a file path to trace a window, e.g. TK_WATCHDOG_TRACE=trace.json
+HEARTBEAT_MS = 10  # How often the event loop is expected to run the heartbeat
+THRESHOLD_MS = 50  # Handlers and stalls longer than this are sampled and reported
+SAMPLE_INTERVAL = 0.005  # Seconds between stack samples of a slow handler
+HANDLER_TID = 1  # Trace rows: Tk callbacks and their sampled stacks
+LAG_TID = 2  # Trace row: event loop stalls
+
+_active = None  # The installed watchdog, if any
+_original_call = tkinter.CallWrapper.__call__
+
+
+def _traced_call(self, *args):
+    """Replacement for CallWrapper.__call__ that times every Tk callback while a watchdog is active."""
+    watchdog = _active
+    if watchdog is None or getattr(self.func, "__name__", None) == "heartbeat":
+        return _original_call(self, *args)
+    name = callback_name(self.func)
+    start = watchdog.handler_started(name)
+    try:
+        return _original_call(self, *args)
+    finally:
+        watchdog.handler_finished(name, start)
+
+
+def callback_name(func):
+    """Readable name of a Tk callback: Class.method for bound methods, with the location for lambdas."""
+    owner = getattr(func, "__self__", None)
+    name = getattr(func, "__name__", None) or type(func).__name__
+    if owner is not None:
+        return f"{type(owner).__name__}.{name}"
+    code = getattr(func, "__code__", None)
+    if name == "<lambda>" and code is not None:
+        return f"<lambda> ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+    return name
+
+
+def frame_label(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class Watchdog:
+    """
+    Records how long every Tk callback takes, and how late the event loop runs, in a
+    Chrome trace file that Perfetto, chrome://tracing or speedscope show as a timeline
+    and flame graph.
+    A heartbeat scheduled with after() every HEARTBEAT_MS notices when the loop falls
+    behind, and records the stall with the handlers that ran in it. Callbacks are timed
+    by wrapping tkinter's CallWrapper, which every command, binding and after() goes
+    through. While a handler has been running for longer than the threshold, a sampler
+    thread reads the Tk thread's stack every SAMPLE_INTERVAL, and the sampled frames
+    are written nested under the handler.
+    """
+    def __init__(self, window, trace_path, threshold_ms=THRESHOLD_MS):
+        self.window = window
+        self.threshold = threshold_ms / 1000
+        self.origin = time.perf_counter()
+        self.thread_id = threading.get_ident()  # The Tk thread, whose stack is sampled
+        self.lock = threading.Lock()  # Guards the trace file and the sampled stack
+        self.trace = open(trace_path, "w", encoding="utf-8")
+        self.trace.write("[\n")
+        self.running = []  # (name, start) of the handlers being run, outermost first
+        self.sampled = []  # (frame label, start) of the frames in the latest sample, outermost first
+        self.finished_since_beat = []  # Names of the handlers that ran since the last heartbeat
+        self.stats = {}  # Handler name -> [calls, total seconds, longest]
+        self.stalls = 0
+
+        self.stop = threading.Event()
+        self.sampler = threading.Thread(target=self.sample_loop, name="tk-watchdog", daemon=True)
+        self.sampler.start()
+        self.expected = time.perf_counter() + HEARTBEAT_MS / 1000
+        self.heartbeat_job = window.after(HEARTBEAT_MS, self.heartbeat)
+
+    def micros(self, seconds):
+        return round((seconds - self.origin) * 1e6)
+
+    def emit(self, event):
+        """Write one trace event. The caller holds the lock."""
+        event.setdefault("pid", os.getpid())
+        self.trace.write(json.dumps(event) + ",\n")
+
+    def complete(self, name, category, start, end, tid, args=None):
+        event = {"name": name, "cat": category, "ph": "X", "ts": self.micros(start),
+                 "dur": round((end - start) * 1e6), "tid": tid}
+        if args:
+            event["args"] = args
+        self.emit(event)
+
+    def handler_started(self, name):
+        start = time.perf_counter()
+        self.running.append((name, start))
+        return start
+
+    def handler_finished(self, name, start):
+        end = time.perf_counter()
+        duration = end - start
+        with self.lock:
+            self.running.pop()
+            if not self.running:
+                self.close_sampled(0, end)
+            self.complete(name, "handler", start, end, HANDLER_TID)
+        stats = self.stats.setdefault(name, [0, 0.0, 0.0])
+        stats[0] += 1
+        stats[1] += duration
+        stats[2] = max(stats[2], duration)
+        self.finished_since_beat.append(name)
+
+    def heartbeat(self):
+        """Runs every HEARTBEAT_MS; a late run means the event loop was blocked."""
+        now = time.perf_counter()
+        lag = now - self.expected
+        if lag > self.threshold:
+            self.stalls += 1
+            handlers = sorted(set(self.finished_since_beat))
+            with self.lock:
+                self.complete("stall", "lag", self.expected, now, LAG_TID, {"handlers": handlers})
+        self.finished_since_beat.clear()
+        self.expected = now + HEARTBEAT_MS / 1000
+        self.heartbeat_job = self.window.after(HEARTBEAT_MS, self.heartbeat)
+
+    def sample_loop(self):
+        while not self.stop.wait(SAMPLE_INTERVAL):
+            running = self.running[:1]
+            if not running or time.perf_counter() - running[0][1] < self.threshold:
+                continue
+            frame = sys._current_frames().get(self.thread_id)
+            labels = []
+            while frame is not None:
+                labels.append(frame_label(frame.f_code))
+                frame = frame.f_back
+            labels.reverse()
+            with self.lock:
+                if self.running[:1] == running:  # The handler may have finished meanwhile
+                    self.record_sample(labels, time.perf_counter())
+
+    def record_sample(self, labels, now):
+        """Extend the frames shared with the previous sample, and close and open the rest. Holds the lock."""
+        shared = 0
+        while shared < min(len(labels), len(self.sampled)) and self.sampled[shared][0] == labels[shared]:
+            shared += 1
+        self.close_sampled(shared, now)
+        self.sampled.extend((label, now) for label in labels[shared:])
+
+    def close_sampled(self, depth, end):
+        """Write the sampled frames below the given depth, innermost first. Holds the lock."""
+        while len(self.sampled) > depth:
+            label, start = self.sampled.pop()
+            self.complete(label, "sample", start, end, HANDLER_TID)
+
+    def summary(self, n=15):
+        """The handlers that took the most time in total, as text."""
+        output = f"{self.stalls} event loop stall(s) over {self.threshold * 1000:.0f} ms\n"
+        output += f"{'calls':>7} {'total ms':>10} {'max ms':>8}  handler\n"
+        ranked = sorted(self.stats.items(), key=lambda item: -item[1][1])[:n]
+        for name, (calls, total, longest) in ranked:
+            output += f"{calls:>7} {total * 1000:>10.1f} {longest * 1000:>8.1f}  {name}\n"
+        return output
+
+    def close(self):
+        """Stop tracing, finish the trace file and print a summary."""
+        global _active
+        _active = None
+        tkinter.CallWrapper.__call__ = _original_call
+        self.stop.set()
+        self.sampler.join()
+        try:
+            self.window.after_cancel(self.heartbeat_job)
+        except tkinter.TclError:
+            pass  # The window is already gone
+        with self.lock:
+            for tid, name in ((HANDLER_TID, "Tk callbacks"), (LAG_TID, "Event loop stalls")):
+                self.emit({"name": "thread_name", "ph": "M", "tid": tid, "args": {"name": name}})
+            self.trace.write(json.dumps({"name": "process_name", "ph": "M", "pid": os.getpid(),
+                                         "args": {"name": os.path.basename(sys.argv[0])}}) + "\n]\n")
+            self.trace.close()
+        print(self.summary())
+
+
+def install(window, trace_path, threshold_ms=THRESHOLD_MS):
+    """
+    Start tracing the Tk callbacks of a window. It replaces tkinter.CallWrapper.__call__ on
+    the class, so callbacks registered before it are timed as well as later ones.
+    """
+    global _active
+    tkinter.CallWrapper.__call__ = _traced_call
+    _active = Watchdog(window, trace_path, threshold_ms)
+    return _active
+
+
+def from_environment(window):
+    """Install a watchdog if TK_WATCHDOG_TRACE names a trace file, otherwise return None."""
+    trace_path = os.environ.get(TRACE_ENV)
+    return install(window, trace_path) if trace_path else None
@@ -0,0 +1,44 @@
+import json
+import time
+import tkinter
+
+import tk_watchdog
+
+
+class FakeWindow:
+    """Stands in for a Tk window; after() callbacks are run by the test."""
+    def __init__(self):
+        self.pending = []
+
+    def after(self, ms, callback):
+        self.pending.append(callback)
+        return len(self.pending)
+
+    def after_cancel(self, job):
+        pass
+
+
+class Player:
+    def search_tracks(self):
+        time.sleep(0.1)
+
+
+def test_slow_handler_is_timed_and_sampled(tmp_path):
+    """Test that a slow callback shows up in the trace with its sampled stack and a stall."""
+    trace_path = tmp_path / "trace.json"
+    window = FakeWindow()
+    watchdog = tk_watchdog.install(window, str(trace_path), threshold_ms=20)
+    callback = tkinter.CallWrapper(Player().search_tracks, None, None)
+    callback()
+    window.pending.pop(0)()  # The heartbeat, late because of the handler
+    watchdog.close()
+
+    events = json.loads(trace_path.read_text(encoding="utf-8"))
+    handlers = [event for event in events if event.get("cat") == "handler"]
+    assert [event["name"] for event in handlers] == ["Player.search_tracks"]
+    assert handlers[0]["dur"] >= 100_000
+    samples = [event["name"] for event in events if event.get("cat") == "sample"]
+    assert any(name.startswith("search_tracks ") for name in samples)
+    stalls = [event for event in events if event.get("cat") == "lag"]
+    assert stalls[0]["args"]["handlers"] == ["Player.search_tracks"]
+    assert tkinter.CallWrapper.__call__ is tk_watchdog._original_call
@@ -0,0 +1,155 @@
+import bisect
+
+import index_cache
+
+
+class ValueIndex:
+    """
+    Secondary index from an integer value (rating, play count) to track keys.
+    Keys are bucketed by value and the distinct values are kept sorted, so moving
+    a key between values costs O(log d) for d distinct values.
+    """
+    def __init__(self):
+        self.buckets = {}  # value -> dict used as an insertion-ordered set of keys
+        self.values = []  # Sorted list of the distinct values that have keys
+
+    def __len__(self):
+        return sum(len(bucket) for bucket in self.buckets.values())
+
+    def add(self, key, value):
+        """Index a key under the given value."""
+        bucket = self.buckets.get(value)
+        if bucket is None:
+            bucket = self.buckets[value] = {}
+            bisect.insort(self.values, value)
+        bucket[key] = None
+
+    def remove(self, key, value):
+        """Drop a key from the given value, if it is indexed there."""
+        bucket = self.buckets.get(value)
+        if bucket is None or key not in bucket:
+            return
+        del bucket[key]
+        if not bucket:
+            del self.buckets[value]
+            del self.values[bisect.bisect_left(self.values, value)]
+
+    def move(self, key, old, new):
+        """Re-index a key whose value changed from old to new."""
+        self.remove(key, old)
+        self.add(key, new)
+
+    def clear(self):
+        self.buckets.clear()
+        self.values.clear()
+
+    def top(self, n):
+        """Return up to n keys with the highest values, highest first."""
+        result = []
+        for value in reversed(self.values):
+            for key in self.buckets[value]:
+                if len(result) == n:
+                    return result
+                result.append(key)
+        return result
+
+    def range(self, low=None, high=None):
+        """Return the keys whose value lies in [low, high], lowest value first."""
+        start = 0 if low is None else bisect.bisect_left(self.values, low)
+        stop = len(self.values) if high is None else bisect.bisect_right(self.values, high)
+        result = []
+        for value in self.values[start:stop]:
+            result.extend(self.buckets[value])
+        return result
+
+    def count_range(self, low=None, high=None):
+        """Count the keys whose value lies in [low, high] without listing them."""
+        start = 0 if low is None else bisect.bisect_left(self.values, low)
+        stop = len(self.values) if high is None else bisect.bisect_right(self.values, high)
+        return sum(len(self.buckets[value]) for value in self.values[start:stop])
+
+
+class TrackIndex:
+    """
+    Rating and play count rankings for a track library module (track_library or
+    Track_Library_JSON). The index follows the library through its listeners, so
+    set_rating and increment_play_count keep it current without rescanning.
+    A library as read from its file is indexed from an index_cache file when it has one.
+    """
+    CACHE_FORMAT = 1  # Bump when the saved state changes
+
+    def __init__(self, lib):
+        self.lib = lib
+        self.rating = ValueIndex()
+        self.play_count = ValueIndex()
+        self.rebuild()
+        lib.add_listener(self.on_change)
+
+    def rebuild(self):
+        """Index every track currently in the library, from the cache file if it matches, else from scratch."""
+        library = self.lib.library
+        if index_cache.load(self, self.lib, library):
+            return
+        self.rating.clear()
+        self.play_count.clear()
+        for key, item in library.items():
+            self.rating.add(key, item.rating)
+            self.play_count.add(key, item.play_count)
+        index_cache.save(self, self.lib, library)
+
+    def cache_state(self):
+        return [(index.buckets, index.values) for index in (self.rating, self.play_count)]
+
+    def restore_cache_state(self, state):
+        (self.rating.buckets, self.rating.values), (self.play_count.buckets, self.play_count.values) = state
+
+    def on_change(self, key, field, old, new):
+        """Library listener that applies a single change to the indexes."""
+        if field == "rating":
+            self.rating.move(key, old, new)
+        elif field == "play_count":
+            self.play_count.move(key, old, new)
+        elif field == "reload":
+            self.rebuild()
+
+    def close(self):
+        """Stop following the library."""
+        self.lib.remove_listener(self.on_change)
+
+    def top_rated(self, n):
+        """Keys of the n highest rated tracks."""
+        return self.rating.top(n)
+
+    def most_played(self, n):
+        """Keys of the n most played tracks."""
+        return self.play_count.top(n)
+
+    def with_rating(self, low=None, high=None):
+        """Keys of the tracks rated between low and high inclusive."""
+        return self.rating.range(low, high)
+
+    def played_between(self, low=None, high=None):
+        """Keys of the tracks played between low and high times inclusive."""
+        return self.play_count.range(low, high)
+
+
+# One shared index per library module, created on first use
+_indexes = {}
+
+
+def index_for(lib):
+    """Return the shared TrackIndex for a library module, building it if needed."""
+    index = _indexes.get(lib.__name__)
+    if index is None:
+        index = _indexes[lib.__name__] = TrackIndex(lib)
+    return index
+
+
+def format_ranking(lib, keys):
+    """Format ranked keys one per line with their rating stars and play count."""
+    output = ""
+    library = lib.library  # Format every row from the same version of the library
+    for position, key in enumerate(keys, start=1):
+        item = library[key]
+        output += f"{position}. {key} {item.info()} ({item.play_count} plays)\n"
+    return output
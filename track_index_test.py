@@ -0,0 +1,60 @@
+import pytest
+import os
+import Track_Library_JSON as lib
+from track_index import TrackIndex, ValueIndex
+
+
+@pytest.fixture
+def index():
+    """Load the JSON library and build a fresh index that follows it."""
+    lib.load_library_from_json(os.path.join(os.path.dirname(__file__), "library.json"))
+    track_index = TrackIndex(lib)
+    yield track_index
+    track_index.close()
+
+
+def test_top_rated(index):
+    """Test that the top rated tracks come back highest rating first."""
+    assert index.top_rated(3) == ["02", "01", "05"]
+    assert len(index.top_rated(50)) == 5
+
+
+def test_with_rating(index):
+    """Test range queries on the rating index."""
+    assert index.with_rating(5, 5) == ["02"]
+    assert index.with_rating(1, 2) == ["04", "03"]
+    assert index.with_rating(6) == []
+
+
+def test_set_rating_updates_index(index):
+    """Test that set_rating moves the track in the ranking."""
+    lib.set_rating("04", 5)
+    assert index.with_rating(5, 5) == ["02", "04"]
+    assert "04" not in index.with_rating(1, 1)
+
+
+def test_increment_play_count_updates_index(index):
+    """Test that plays are reflected in the most played ranking."""
+    lib.increment_play_count("03")
+    lib.increment_play_count("03")
+    lib.increment_play_count("05")
+    assert index.most_played(2) == ["03", "05"]
+    assert index.played_between(1) == ["05", "03"]
+
+
+def test_reload_rebuilds_index(index):
+    """Test that reloading the library resets the play count ranking."""
+    lib.increment_play_count("01")
+    lib.load_library_from_json(os.path.join(os.path.dirname(__file__), "library.json"))
+    assert index.played_between(1) == []
+    assert index.top_rated(1) == ["02"]
+
+
+def test_value_index_remove_missing_key():
+    """Test that removing an unknown key leaves the index untouched."""
+    value_index = ValueIndex()
+    value_index.add("01", 3)
+    value_index.remove("02", 3)
+    value_index.remove("01", 4)
+    assert value_index.range() == ["01"]
+    assert value_index.count_range(3, 3) == 1
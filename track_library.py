@@ -1,18 +1,96 @@
+import collections
+import os
+import threading
+import traceback
+
 from library_item import LibraryItem
+from library_snapshot import LibrarySnapshot, replace_item
+
+
+# The current version of the library. It is never modified: writers publish a new
+# snapshot that shares the unchanged tracks, so readers on any thread see a consistent view.
+library = LibrarySnapshot.from_items([
+    ("01", LibraryItem("Another Brick in the Wall", "Pink Floyd", 4)),
+    ("02", LibraryItem("Stayin' Alive", "Bee Gees", 5)),
+    ("03", LibraryItem("Highway to Hell", "AC/DC", 2)),
+    ("04", LibraryItem("Shape of You", "Ed Sheeran", 1)),
+    ("05", LibraryItem("Someone Like You", "Adele", 3)),
+])
+write_lock = threading.Lock()  # Writers take turns, so no change is lost
+_built_in = library  # The tracks above, so indexes of them can be cached against this file
+
+
+def __getattr__(name):
+    """
+    library_source, the (path, snapshot, content hash) the library was read from, is worked
+    out on first use, so importing this module does not read and hash its own file.
+    """
+    global library_source
+    if name != "library_source":
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    import index_cache
+    path = os.path.abspath(__file__)
+    library_source = (path, _built_in, index_cache.file_hash(path))
+    return library_source
+
+# Callbacks notified as callback(key, field, old, new) after a track changes
+listeners = []
+
+
+def add_listener(callback):
+    listeners.append(callback)
+
+
+def remove_listener(callback):
+    try:
+        listeners.remove(callback)
+    except ValueError:
+        return
+
+
+# Changes published but not yet delivered to the listeners, in the order of their snapshots
+undelivered = collections.deque()
+delivery_lock = threading.Lock()  # One thread delivers at a time, so listeners hear changes in publish order
+_delivery = threading.local()
+delivered_version = None  # Library version of the change the listeners are being told about
 
 
-library = {}
-library["01"] = LibraryItem("Another Brick in the Wall", "Pink Floyd", 4)
-library["02"] = LibraryItem("Stayin' Alive", "Bee Gees", 5)
-library["03"] = LibraryItem("Highway to Hell", "AC/DC", 2)
-library["04"] = LibraryItem("Shape of You", "Ed Sheeran", 1)
-library["05"] = LibraryItem("Someone Like You", "Adele", 3)
+def publish(key, field, old, new):
+    """Queue a change for the listeners. Called with write_lock held, right after its snapshot is published."""
+    undelivered.append((library.version, key, field, old, new))
+
+
+def deliver():
+    """
+    Call every listener with each queued change, oldest first. Writers call this after releasing
+    write_lock; while another thread is delivering it waits, so a writer's own change has been
+    delivered when it returns. A change made by a listener is delivered by the loop already running.
+    """
+    global delivered_version
+    if getattr(_delivery, "active", False):
+        return
+    with delivery_lock:
+        _delivery.active = True
+        try:
+            while undelivered:
+                delivered_version, key, field, old, new = undelivered.popleft()
+                for callback in list(listeners):
+                    try:
+                        callback(key, field, old, new)
+                    except Exception:
+                        traceback.print_exc()  # The change is already published; the other listeners still hear of it
+        finally:
+            _delivery.active = False
+
+
+def snapshot():
+    """Return the current library version, which stays the same however the library changes later."""
+    return library
 
 
 def list_all():
     output = ""
-    for key in library:
-        item = library[key]
+    for key, item in snapshot().items():
         output += f"{key} {item.info()}\n"
     return output
 
@@ -42,11 +120,42 @@ def get_rating(key):
 
 
 def set_rating(key, rating):
-    try:
-        item = library[key]
-        item.rating = rating
-    except KeyError:
-        return
+    global library
+    with write_lock:
+        try:
+            item = library[key]
+        except KeyError:
+            return
+        library = library.set(key, replace_item(item, rating=rating))
+        publish(key, "rating", item.rating, rating)
+    deliver()
+
+
+def update_tracks(changes):
+    """
+    Change the titles, artists and ratings of many tracks in one batch, given as a dict of
+    key -> {attribute: new value}. Returns (number of tracks changed, keys not in the library).
+    """
+    global library
+    missing = []
+    changed = []  # (key, field, old, new) of every value that changed
+    with write_lock:
+        items = {}
+        for key, values in changes.items():
+            item = library.get(key)
+            if item is None:
+                missing.append(key)
+                continue
+            values = {field: value for field, value in values.items() if getattr(item, field) != value}
+            if values:
+                items[key] = replace_item(item, **values)
+                changed.extend((key, field, getattr(item, field), value) for field, value in values.items())
+        if items:
+            library = library.update(items)  # Published as one new version
+            for change in changed:
+                publish(*change)
+    deliver()
+    return len(items), missing
 
 
 def get_play_count(key):
@@ -58,8 +167,12 @@ def get_play_count(key):
 
 
 def increment_play_count(key):
-    try:
-        item = library[key]
-        item.play_count += 1
-    except KeyError:
-        return
+    global library
+    with write_lock:
+        try:
+            item = library[key]
+        except KeyError:
+            return
+        library = library.set(key, replace_item(item, play_count=item.play_count + 1))
+        publish(key, "play_count", item.play_count, item.play_count + 1)
+    deliver()
@@ -2,8 +2,23 @@
 import tkinter as tk  # Core tkinter module for GUI creation.
 from tkinter import ttk  # ttk module for themed tkinter widgets.
 import tkinter.scrolledtext as tkst  # ScrolledText widget for scrollable text areas.
+from tkinter import filedialog  # File dialogs for saving and loading playlists.
+import os  # File name handling for status messages.
 import track_library as lib  # External library for track data management.
 import font_manager as fonts  # External library for managing font configurations.
+from track_index import index_for, format_ranking  # Rating and play count rankings.
+from playlist import Playlist  # Ordered playlist model with O(1) membership checks.
+from playlist_view import PlaylistView  # Row-by-row playlist rendering in a text area.
+import playlist_io  # Streaming M3U and JSON lines playlist files.
+from library_analytics import stats_for, format_report  # Incrementally maintained library statistics.
+from gui_tasks import TaskRunner, cancelled  # Runs library calls in the background so the window stays responsive.
+import play_history  # Log of when each track was played.
+import recommender  # Tracks that are often played together.
+import tk_watchdog  # Optional tracing of slow handlers, enabled with TK_WATCHDOG_TRACE.
+from track_query import parse_query, search  # Search queries answered from library indexes.
+
+TOP_N = 50  # Number of tracks shown in the Top Rated and Most Played views.
+STATS_REFRESH_MS = 1000  # How often an open statistics panel checks for changes.
 
 def set_text(text_area, content):
     """
@@ -14,6 +29,31 @@ def set_text(text_area, content):
     text_area.delete("1.0", tk.END)  # Clear existing text in the widget.
     text_area.insert(1.0, content)  # Insert new content starting from the top.
 
+def find_tracks(query):
+    """
+    Returns a description of every track matching a query, e.g. 'artist:"pink floyd" rating>=4 title~wall'.
+    Runs in a background task and stops early once a newer search supersedes it.
+    """
+    matching_tracks = []  # List to hold matching tracks.
+
+    for track_id, item in search(lib, query):
+        if cancelled():
+            return None
+        matching_tracks.append(f"Track ID: {track_id}, Name: {item.name}, Artist: {item.artist}")
+    return matching_tracks
+
+def track_details(key):
+    """
+    Returns the details of a track for the 'View' box, or a not found message.
+    """
+    name = lib.get_name(key)  # Retrieve the name of the track.
+    if name is None:
+        return f"Track {key} not found"
+    artist = lib.get_artist(key)
+    rating = lib.get_rating(key)
+    play_count = lib.get_play_count(key)
+    return f"{name}\n{artist}\nrating: {rating} plays: {play_count}"
+
 class TrackPlayer:
     """
     Main application class for the Track Player GUI.
@@ -30,6 +70,19 @@ class TrackPlayer:
 
         fonts.configure()  # Configure fonts using the font_manager module.
 
+        # Rankings kept up to date by set_rating and increment_play_count.
+        self.track_index = index_for(lib)
+
+        # Library statistics and the panel that shows them, opened on demand.
+        self.library_stats = stats_for(lib)
+        self.stats_window = None
+        self.stats_version = None
+
+        # Every play is also logged with its time, for questions such as plays in the last week.
+        self.history = play_history.shared_history()
+        # Similar tracks, counted from the same log when first asked for.
+        self.recommender = recommender.shared_recommender()
+
         # Configure grid layout for flexible widget placement.
         self.window.grid_rowconfigure((0, 1), weight=1, uniform="row")
         self.window.grid_columnconfigure((0, 1), weight=1, uniform="col")
@@ -38,6 +91,12 @@ class TrackPlayer:
         self.status_lbl = tk.Label(self.window, text="Welcome to the Track Player!", bg="lightgrey")
         self.status_lbl.grid(row=2, column=0, columnspan=2, pady=5, sticky="w")
 
+        # Progress bar that runs while library work is going on in the background.
+        self.progress_bar = ttk.Progressbar(self.window, mode="indeterminate", length=150)
+        self.progress_bar.grid(row=2, column=1, padx=10, pady=5, sticky="e")
+        self.progress_bar.grid_remove()  # Hidden until a task starts.
+        self.tasks = TaskRunner(self.window, on_busy=self.show_busy)
+
         # Setup sections for various functionalities.
         self.setup_view_tracks_section(0, 0)  # Section for viewing tracks.
         self.setup_create_playlist_section(0, 1)  # Section for creating playlists.
@@ -45,7 +104,8 @@ class TrackPlayer:
         self.setup_search_tracks_section(1, 1)  # Section for searching tracks.
 
         # Initialize an empty playlist.
-        self.playlist = []
+        self.playlist = Playlist()
+        self.playlist_load = None  # Playlist file still being read in chunks, cancelled by a reset or another load.
 
         # Automatically click "List All Tracks" when the window opens.
         self.list_tracks_clicked()
@@ -53,11 +113,11 @@ class TrackPlayer:
     def list_tracks_clicked(self):
         """
         Handles the 'List All Tracks' button click event.
-        Retrieves the list of all tracks from the track library and displays it in the text area.
+        Fetches the list of all tracks in the background and displays it in the text area.
         """
-        track_list = lib.list_all()  # Fetch the list of all tracks from the track library.
-        set_text(self.list_txt, track_list)  # Display the list in the text area.
-        self.status_lbl.configure(text="List Tracks button was clicked!")  # Update the status label.
+        self.status_lbl.configure(text="Loading tracks...")
+        # Shares its name with the ranked views, so only the last one clicked fills the text area.
+        self.tasks.submit("list", lib.list_all, self.show_result(self.list_txt, "List Tracks button was clicked!"))
 
     def setup_view_tracks_section(self, row, col):
         """
@@ -82,6 +142,12 @@ class TrackPlayer:
         self.track_txt = tk.Text(view_frame, width=20, height=5, wrap="none")
         self.track_txt.grid(row=1, column=3, padx=5, pady=3)
 
+        # Buttons for the ranked views.
+        tk.Button(view_frame, text="Top Rated", command=self.top_rated_clicked).grid(row=2, column=0, padx=5, pady=2)
+        tk.Button(view_frame, text="Most Played", command=self.most_played_clicked).grid(row=2, column=1, padx=5, pady=2)
+        tk.Button(view_frame, text="Statistics", command=self.statistics_clicked).grid(row=2, column=2, padx=5, pady=2)
+        tk.Button(view_frame, text="Similar", command=self.similar_clicked).grid(row=2, column=3, padx=5, pady=2)
+
     def setup_create_playlist_section(self, row, col):
         """
         Create the "Create Playlist" section in the GUI.
@@ -98,10 +164,14 @@ class TrackPlayer:
         tk.Button(playlist_frame, text="Add", command=self.add_track).grid(row=0, column=2, padx=5, pady=2)
         tk.Button(playlist_frame, text="Play", command=self.play_playlist).grid(row=0, column=3, padx=5, pady=2)
         tk.Button(playlist_frame, text="Reset", command=self.reset_playlist).grid(row=0, column=4, padx=5, pady=2)
+        tk.Button(playlist_frame, text="Save", command=self.save_playlist).grid(row=0, column=5, padx=5, pady=2)
+        tk.Button(playlist_frame, text="Load", command=self.load_playlist).grid(row=0, column=6, padx=5, pady=2)
 
         # Scrollable text area for displaying the playlist.
         self.playlist_text_area = tkst.ScrolledText(playlist_frame, width=60, height=8, wrap="none")
-        self.playlist_text_area.grid(row=1, column=0, columnspan=5, padx=5, pady=2)
+        self.playlist_text_area.grid(row=1, column=0, columnspan=7, padx=5, pady=2)
+        # Renders the playlist into the text area, redrawing only rows that change.
+        self.playlist_view = PlaylistView(self.playlist_text_area, lib)
 
     def setup_update_tracks_section(self, row, col):
         """
@@ -149,11 +219,101 @@ class TrackPlayer:
     def list_tracks_clicked(self):
         """
         Handles the 'List All Tracks' button click event.
-        Retrieves the list of all tracks from the track library and displays it in the text area.
+        Fetches the list of all tracks in the background and displays it in the text area.
+        """
+        self.status_lbl.configure(text="Loading tracks...")
+        # Shares its name with the ranked views, so only the last one clicked fills the text area.
+        self.tasks.submit("list", lib.list_all, self.show_result(self.list_txt, "List Tracks button was clicked!"))
+
+    def top_rated_clicked(self):
+        """
+        Handles the 'Top Rated' button click event.
+        Displays the highest rated tracks from the rating index.
+        """
+        self.status_lbl.configure(text="Loading top rated tracks...")
+        keys = self.track_index.top_rated(TOP_N)  # Read here: listeners change the index on this thread
+        self.tasks.submit(
+            "list",
+            lambda: format_ranking(lib, keys),  # Only the formatting runs in the background.
+            self.show_result(self.list_txt, "Top Rated button was clicked!"),
+        )
+
+    def most_played_clicked(self):
+        """
+        Handles the 'Most Played' button click event.
+        Displays the most played tracks from the play count index.
+        """
+        self.status_lbl.configure(text="Loading most played tracks...")
+        keys = self.track_index.most_played(TOP_N)  # Read here: listeners change the index on this thread
+        self.tasks.submit(
+            "list",
+            lambda: format_ranking(lib, keys),  # Only the formatting runs in the background.
+            self.show_result(self.list_txt, "Most Played button was clicked!"),
+        )
+
+    def similar_clicked(self):
         """
-        track_list = lib.list_all()  # Fetch the list of all tracks from the track library.
-        set_text(self.list_txt, track_list)  # Display the list in the text area.
-        self.status_lbl.configure(text="List Tracks button was clicked!")  # Update the status label.
+        Handles the 'Similar' button click event.
+        Lists the tracks most often played together with the entered track number.
+        """
+        key = self.input_txt.get()  # Get the track number from the input field.
+        self.status_lbl.configure(text="Finding similar tracks...")
+        self.tasks.submit(
+            "list",
+            lambda: recommender.format_similar(lib, key, self.recommender.similar(key)),  # Catches up with new plays first.
+            self.show_result(self.list_txt, "Similar button was clicked!"),
+        )
+
+    def show_result(self, text_area, status):
+        """
+        Returns a callback for a background task that displays its text result and a status message.
+        """
+        def show(content):
+            set_text(text_area, content)
+            self.status_lbl.configure(text=status)
+        return show
+
+    def show_busy(self, busy):
+        """
+        Shows the progress bar while background tasks are running.
+        """
+        if busy:
+            self.progress_bar.grid()
+            self.progress_bar.start(10)
+        else:
+            self.progress_bar.stop()
+            self.progress_bar.grid_remove()
+
+    def statistics_clicked(self):
+        """
+        Handles the 'Statistics' button click event.
+        Opens the library statistics panel, or brings it to the front if it is already open.
+        """
+        if self.stats_window is not None and self.stats_window.winfo_exists():
+            self.stats_window.lift()
+            return
+
+        self.stats_window = tk.Toplevel(self.window)
+        self.stats_window.title("Library Statistics")
+        self.stats_text = tkst.ScrolledText(self.stats_window, width=80, height=30, wrap="none")
+        self.stats_text.pack(fill="both", expand=True, padx=5, pady=5)
+        self.stats_version = None  # Force the first draw.
+        self.refresh_statistics()
+        self.status_lbl.configure(text="Statistics button was clicked!")
+
+    def refresh_statistics(self):
+        """
+        Redraws the statistics panel when the library has changed, while the panel is open.
+        The statistics themselves are updated incrementally, so a redraw only formats them.
+        """
+        if self.stats_window is None or not self.stats_window.winfo_exists():
+            return
+        version = self.library_stats.columns.version
+        if version != self.stats_version:
+            self.stats_version = version
+            report = format_report(self.library_stats) + "\n" + play_history.format_recent(self.history, lib)
+            set_text(self.stats_text, report)
+        self.stats_window.after(STATS_REFRESH_MS, self.refresh_statistics)
 
     def view_tracks_clicked(self):
         """
@@ -161,20 +321,8 @@ class TrackPlayer:
         Displays details of the track corresponding to the entered track number.
         """
         key = self.input_txt.get()  # Get the track number from the input field.
-        name = lib.get_name(key)  # Retrieve the name of the track.
-
-        if name is not None:
-            # If the track exists, retrieve and format its details.
-            artist = lib.get_artist(key)
-            rating = lib.get_rating(key)
-            play_count = lib.get_play_count(key)
-            track_details = f"{name}\n{artist}\nrating: {rating} plays: {play_count}"
-            set_text(self.track_txt, track_details)  # Display the track details.
-        else:
-            # Display an error message if the track does not exist.
-            set_text(self.track_txt, f"Track {key} not found")
-
-        self.status_lbl.configure(text="View Track button was clicked!")  # Update the status label.
+        self.status_lbl.configure(text="Loading track...")
+        self.tasks.submit("view", lambda: track_details(key), self.show_result(self.track_txt, "View Track button was clicked!"))
 
     def add_track(self):
         """
@@ -185,18 +333,23 @@ class TrackPlayer:
 
         if not track_number:
             # Display an error message if no track number is entered.
-            self.display_message("Error: Track number cannot be empty.", self.playlist_text_area)
+            self.playlist_view.show_message("Error: Track number cannot be empty.")
             return
 
-        track_name = lib.get_name(track_number)  # Retrieve the name of the track.
+        # A single lookup is quick enough for the Tk thread; only whole-library work runs in the background.
+        self.track_found(track_number, lib.get_name(track_number))
 
+    def track_found(self, track_number, track_name):
+        """
+        Adds a track to the playlist, or reports that it does not exist.
+        """
         if track_name:
-            # If the track exists, add it to the playlist and update the display.
-            self.playlist.append(track_number)
-            self.update_playlist_display()
+            # If the track exists, add it to the playlist and append its row to the display.
+            self.playlist.add(track_number)
+            self.playlist_view.append([track_number])
         else:
             # Display an error message if the track number is invalid.
-            self.display_message("Error: Invalid track number.", self.playlist_text_area)
+            self.playlist_view.show_message("Error: Invalid track number.")
 
     def play_playlist(self):
         """
@@ -205,55 +358,119 @@ class TrackPlayer:
         """
         if not self.playlist:
             # Display an error message if the playlist is empty.
-            self.display_message("Error: Playlist is empty. Add tracks first.", self.playlist_text_area)
+            self.playlist_view.show_message("Error: Playlist is empty. Add tracks first.")
             return
 
+        # Check which tracks exist, then count the plays.
+        self.play_tracks([(track_number, lib.get_name(track_number) is not None) for track_number in self.playlist])
+
+    def play_tracks(self, tracks):
+        """
+        Increments the play count of every existing track and displays a summary.
+        Play counts are changed on the Tk thread, since listeners redraw the views.
+            tracks (list): (track number, exists) pairs for the playlist.
+        """
         tracks_played = 0  # Counter for successfully played tracks.
+        played = []
 
-        for track_number in self.playlist:
-            if lib.get_name(track_number) is not None:
+        for track_number, exists in tracks:
+            if exists:
                 # Increment the play count for valid tracks.
                 lib.increment_play_count(track_number)
+                played.append(track_number)
                 tracks_played += 1
             else:
                 # Display a warning if a track is invalid and skip it.
-                self.display_message(f"Warning: Track {track_number} does not exist and was skipped.", self.playlist_text_area)
+                self.playlist_view.show_message(f"Warning: Track {track_number} does not exist and was skipped.")
+
+        # Log the run with one timestamp, and count the playlist as tracks that belong together.
+        self.history.record_many(played)
+        self.recommender.add_playlist(played)
 
         if tracks_played > 0:
             # Display the number of successfully played tracks.
-            self.display_message(f"{tracks_played} track(s) played successfully.", self.playlist_text_area)
-
-        self.update_playlist_display()  # Update the playlist display.
+            self.playlist_view.show_message(f"{tracks_played} track(s) played successfully.")
+        # The view redraws the rows of the played tracks itself, once the event loop is idle.
 
     def reset_playlist(self):
         """
         Handles the 'Reset' button click event to clear the playlist.
         """
+        self.cancel_playlist_load()  # A file still loading must not refill the playlist.
         self.playlist.clear()  # Clear all tracks from the playlist.
-        self.display_message("Playlist reset.", self.playlist_text_area)  # Update the user with a reset message.
+        self.playlist_view.clear()  # Remove the playlist rows from the display.
+        self.playlist_view.show_message("Playlist reset.")  # Update the user with a reset message.
 
-    def update_playlist_display(self):
+    def save_playlist(self):
         """
-        Updates the text area to show the current playlist with track details.
+        Handles the 'Save' button click event to write the playlist to an M3U or JSON lines file.
+        Entries are streamed to the file one at a time.
         """
-        content = "Current Playlist:\n"  # Initialize the display content.
+        if not self.playlist:
+            # Display an error message if the playlist is empty.
+            self.playlist_view.show_message("Error: Playlist is empty. Add tracks first.")
+            return
 
-        for track_number in self.playlist:
-            track_name = lib.get_name(track_number)  # Retrieve the name of the track.
+        path = filedialog.asksaveasfilename(defaultextension=".m3u8", filetypes=playlist_io.PLAYLIST_FILETYPES)
+        if not path:
+            return  # The user cancelled the dialog.
 
-            if track_name:
-                # If the track exists, format its details.
-                artist = lib.get_artist(track_number)
-                rating = lib.get_rating(track_number)
-                play_count = lib.get_play_count(track_number)
-                content += f"{track_name} by {artist} - {rating} stars, Played {play_count} times\n"
-            else:
-                # Append a message for invalid tracks.
-                content += f"Track {track_number} not found.\n"
+        entries = ((key, f"{lib.get_artist(key)} - {lib.get_name(key)}") for key in self.playlist)
+        try:
+            playlist_io.save_playlist(path, entries)
+        except OSError as error:
+            self.playlist_view.show_message(f"Error: Could not save playlist ({error}).")
+            return
+        self.recommender.add_playlist(self.playlist)  # A saved playlist says which tracks go together.
+        self.status_lbl.configure(text=f"Playlist saved to {os.path.basename(path)}")
+
+    def load_playlist(self):
+        """
+        Handles the 'Load' button click event to read a playlist from an M3U or JSON lines file.
+        The file is read lazily and added to the playlist in chunks.
+        """
+        path = filedialog.askopenfilename(filetypes=playlist_io.PLAYLIST_FILETYPES)
+        if not path:
+            return  # The user cancelled the dialog.
+
+        entries = playlist_io.load_playlist(path)  # Read lazily; errors reach on_playlist_error.
+        self.cancel_playlist_load()  # Only the newest file may add tracks.
+        self.playlist.clear()  # Replace the current playlist with the loaded one.
+        self.playlist_view.clear()
+        resolver = playlist_io.PlaylistResolver.for_library(lib)  # Index the library once for lookups.
+        self.playlist_load = playlist_io.load_progressively(
+            self.window, entries, resolver, self.on_playlist_chunk, self.on_playlist_loaded, self.on_playlist_error
+        )
+
+    def cancel_playlist_load(self):
+        """
+        Stops a playlist file that is still being loaded from adding more tracks.
+        """
+        if self.playlist_load is not None:
+            self.playlist_load.cancel()
+            self.playlist_load = None
 
-        # Update the playlist text area with the formatted content.
-        self.playlist_text_area.delete(1.0, tk.END)
-        self.playlist_text_area.insert(tk.END, content)
+    def on_playlist_chunk(self, keys):
+        """
+        Adds a chunk of loaded track numbers to the playlist and its display, and reports progress.
+        """
+        self.playlist.extend(keys)
+        self.playlist_view.append(keys)
+        self.status_lbl.configure(text=f"Loading playlist... {len(self.playlist)} tracks")
+
+    def on_playlist_loaded(self, loaded, skipped):
+        """
+        Shows a summary once the whole file has been read.
+        """
+        self.status_lbl.configure(text=f"Playlist loaded: {loaded} track(s), {skipped} unknown entries skipped.")
+        self.recommender.add_playlist(self.playlist)
+
+    def on_playlist_error(self, error):
+        """
+        Reports a playlist file that could not be read; the tracks read before the error are kept.
+        """
+        self.playlist_view.show_message(f"Error: Could not load playlist ({error}).")
+        self.status_lbl.configure(text=f"Playlist partly loaded: {len(self.playlist)} track(s).")
 
     def update_rating(self):
         """
@@ -268,7 +485,13 @@ class TrackPlayer:
             self.display_message("Error: Rating must be a number between 1 and 5.", self.update_text_area)
             return
 
-        if lib.get_name(track_number) is not None:
+        self.rating_checked(track_number, new_rating, lib.get_name(track_number))
+
+    def rating_checked(self, track_number, new_rating, track_name):
+        """
+        Applies a rating once the track has been looked up.
+        """
+        if track_name is not None:
             # Update the track's rating and display its details.
             lib.set_rating(track_number, int(new_rating))
             play_count = lib.get_play_count(track_number)
@@ -283,7 +506,7 @@ class TrackPlayer:
         Handles the 'Find' button click event to search for tracks based on a query.
         Displays a list of matching tracks or an appropriate message if no matches are found.
         """
-        query = self.search_entry.get().lower().strip()  # Get and normalize the search query.
+        query = self.search_entry.get().strip()  # Get the search query; matching ignores case.
 
         self.search_results_text.delete("1.0", tk.END)  # Clear previous search results.
 
@@ -292,18 +515,21 @@ class TrackPlayer:
             self.search_results_text.insert(tk.END, "Please enter a search term.\n")
             return
 
-        matching_tracks = []  # List to hold matching tracks.
-
-        for track_id in lib.list_all().splitlines():
-            # Extract the track ID and details from the track list.
-            track_id = track_id.split()[0]
-            name = lib.get_name(track_id).lower() if lib.get_name(track_id) else ""
-            artist = lib.get_artist(track_id).lower() if lib.get_artist(track_id) else ""
+        try:
+            parsed = parse_query(query)  # Parsing is quick, so mistakes are reported straight away.
+        except ValueError as error:
+            self.search_results_text.insert(tk.END, f"Invalid search: {error}\n")
+            return
 
-            if query in name or query in artist:
-                # Add matching tracks to the list.
-                matching_tracks.append(f"Track ID: {track_id}, Name: {name}, Artist: {artist}")
+        # Search in the background; a newer search replaces one still running.
+        self.search_results_text.insert(tk.END, "Searching...\n")
+        self.tasks.submit("search", lambda: find_tracks(parsed), self.show_search_results)
 
+    def show_search_results(self, matching_tracks):
+        """
+        Displays the tracks found by a background search.
+        """
+        self.search_results_text.delete("1.0", tk.END)  # Clear the progress message.
         if matching_tracks:
             # Display all matching tracks.
             for track_info in matching_tracks:
@@ -323,5 +549,8 @@ class TrackPlayer:
     
 if __name__ == "__main__":
     window = tk.Tk()
+    watchdog = tk_watchdog.from_environment(window)  # Must start before the widgets register their callbacks.
     app = TrackPlayer(window)
     window.mainloop()
+    if watchdog is not None:
+        watchdog.close()
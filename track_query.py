@@ -0,0 +1,634 @@
+import bisect
+import collections
+import heapq
+import operator
+import re
+import threading
+
+import index_cache
+import parallel_scan
+
+# Query field names and the track attribute each one reads
+TEXT_FIELDS = {"title": "name", "name": "name", "artist": "artist"}
+NUMERIC_FIELDS = {"rating": "rating", "plays": "play_count", "play_count": "play_count"}
+OPERATORS = {":": operator.eq, "=": operator.eq, "<": operator.lt, "<=": operator.le, ">": operator.gt, ">=": operator.ge}
+INTERSECT_RATIO = 4  # A filter is intersected as a key set when it holds at most this many times the running result; otherwise each candidate is checked
+
+
+def trigrams(text):
+    """The distinct three-character substrings of a lowercased text."""
+    text = text.lower()
+    return {text[start:start + 3] for start in range(len(text) - 2)}
+
+
+def insert_sorted(postings, term, key):
+    keys = postings.setdefault(term, [])
+    position = bisect.bisect_left(keys, key)
+    if position == len(keys) or keys[position] != key:  # Replaying a change already indexed adds nothing
+        keys.insert(position, key)
+
+
+def remove_sorted(postings, term, key):
+    keys = postings.get(term)
+    if keys is None:
+        return
+    position = bisect.bisect_left(keys, key)
+    if position < len(keys) and keys[position] == key:
+        del keys[position]
+        if not keys:
+            del postings[term]
+
+
+class NumberIndex:
+    """Sorted keys per value of an integer field, with the distinct values sorted for range lookups."""
+    def __init__(self):
+        self.buckets = {}  # value -> sorted keys
+        self.values = []  # Sorted distinct values that have keys
+
+    def add(self, key, value):
+        if value not in self.buckets:
+            bisect.insort(self.values, value)
+        insert_sorted(self.buckets, value, key)
+
+    def remove(self, key, value):
+        remove_sorted(self.buckets, value, key)
+        if value not in self.buckets:
+            position = bisect.bisect_left(self.values, value)
+            if position < len(self.values) and self.values[position] == value:
+                del self.values[position]
+
+    def range_values(self, low=None, high=None):
+        start = 0 if low is None else bisect.bisect_left(self.values, low)
+        stop = len(self.values) if high is None else bisect.bisect_right(self.values, high)
+        return self.values[start:stop]
+
+    def count(self, low=None, high=None):
+        return sum(len(self.buckets[value]) for value in self.range_values(low, high))
+
+    def keys(self, low=None, high=None):
+        """Sorted keys whose value lies in [low, high]."""
+        buckets = [self.buckets[value] for value in self.range_values(low, high)]
+        return buckets[0] if len(buckets) == 1 else union(*buckets)
+
+
+def intersect(smaller, larger):
+    """Keys in both sorted lists, found by binary search of the larger one, so in O(s log l)."""
+    if len(smaller) > len(larger):
+        smaller, larger = larger, smaller
+    result = []
+    start = 0
+    for key in smaller:
+        start = bisect.bisect_left(larger, key, start)
+        if start == len(larger):
+            break
+        if larger[start] == key:
+            result.append(key)
+    return result
+
+
+def union(*key_lists):
+    """Keys in any of several sorted lists, as one sorted list without repeats."""
+    result = []
+    for key in heapq.merge(*key_lists):
+        if not result or result[-1] != key:
+            result.append(key)
+    return result
+
+
+class QueryIndex:
+    """
+    Indexes of a track library module (track_library or Track_Library_JSON) for the
+    query planner: title and artist trigrams, exact artist names, ratings and play
+    counts. Every posting is a sorted list of keys, so filters combine by intersecting
+    sorted key sets. The index follows the library through its listeners, and is saved
+    to and restored from an index_cache file while the library is as read from its file.
+    Lookups, which may run on worker threads, hold the lock. The listener never waits for
+    it: changes are queued and applied by whichever of the listener and the next lookup
+    holds the lock first, so changes made during a build or a search are not lost.
+    """
+    CACHE_FORMAT = 1  # Bump when the saved state changes
+
+    def __init__(self, lib):
+        self.lib = lib
+        self.lock = threading.Lock()
+        self.pending = collections.deque()  # (key, field, old, new) changes not yet indexed
+        lib.add_listener(self.on_change)  # Before building, so changes made meanwhile are queued
+        with self.lock:
+            self.rebuild()
+            self.catch_up()
+
+    def rebuild(self):
+        """Index every track currently in the library, from the cache file if it matches, else from scratch."""
+        library = self.lib.library  # Build from one version, which decides whether the cache applies
+        if index_cache.load(self, self.lib, library):
+            return
+        self.grams = {"name": {}, "artist": {}}  # Field -> trigram -> sorted keys
+        self.artists = {}  # Lowercased artist -> sorted keys
+        self.numbers = {"rating": NumberIndex(), "play_count": NumberIndex()}
+        for key, item in sorted(library.items(), key=lambda pair: pair[0]):
+            # Keys arrive in order, so appending keeps every posting sorted
+            for field, postings in self.grams.items():
+                for gram in trigrams(getattr(item, field)):
+                    postings.setdefault(gram, []).append(key)
+            self.artists.setdefault(item.artist.lower(), []).append(key)
+            for field, numbers in self.numbers.items():
+                value = getattr(item, field)
+                if value not in numbers.buckets:
+                    numbers.values.append(value)
+                numbers.buckets.setdefault(value, []).append(key)
+        for numbers in self.numbers.values():
+            numbers.values.sort()
+        index_cache.save(self, self.lib, library)
+
+    def cache_state(self):
+        numbers = {field: (index.buckets, index.values) for field, index in self.numbers.items()}
+        return self.grams, self.artists, numbers
+
+    def restore_cache_state(self, state):
+        self.grams, self.artists, numbers = state
+        self.numbers = {}
+        for field, (buckets, values) in numbers.items():
+            self.numbers[field] = NumberIndex()
+            self.numbers[field].buckets, self.numbers[field].values = buckets, values
+
+    def on_change(self, key, field, old, new):
+        """Library listener that queues a change, and applies the queue unless a lookup or build is running."""
+        self.pending.append((key, field, old, new))
+        if self.lock.acquire(blocking=False):
+            try:
+                self.catch_up()
+            finally:
+                self.lock.release()
+
+    def catch_up(self):
+        """Apply the queued changes. Called with the lock held, before every lookup."""
+        while self.pending:
+            self.apply(*self.pending.popleft())
+
+    def apply(self, key, field, old, new):
+        """
+        Apply a single change to the indexes. Applying a change that the indexes already
+        hold, as a build from a newer library version does, leaves them as they are.
+        """
+        if field == "reload":
+            self.rebuild()
+        elif field in self.numbers:
+            self.numbers[field].remove(key, old)
+            self.numbers[field].add(key, new)
+        elif field in self.grams:
+            for gram in trigrams(old) - trigrams(new):
+                remove_sorted(self.grams[field], gram, key)
+            for gram in trigrams(new) - trigrams(old):
+                insert_sorted(self.grams[field], gram, key)
+            if field == "artist":
+                remove_sorted(self.artists, old.lower(), key)
+                insert_sorted(self.artists, new.lower(), key)
+
+    def close(self):
+        """Stop following the library."""
+        self.lib.remove_listener(self.on_change)
+
+    def size(self):
+        return len(self.lib.library)
+
+
+class Query:
+    """
+    Base class for query nodes.
+    estimate() is an upper bound on the number of matching tracks, read from the
+    indexes without listing any keys; keys() lists the matching keys in sorted order,
+    through an index where indexed() is true and by scanning the library otherwise;
+    matches() checks a single track, and mask() flags the matching rows of a range of
+    parallel_scan.ScanColumns.
+    """
+    def indexed(self):
+        return True
+
+    def estimate(self, index):
+        return index.size()
+
+    def keys(self, index, library):
+        """Without an index to use, every track is checked, by a process pool in large libraries."""
+        if len(library) >= parallel_scan.PARALLEL_MIN_TRACKS:
+            return parallel_scan.scan_engine_for(index.lib).keys_matching(self, library)
+        return sorted(key for key, item in library.items() if self.matches(item))
+
+    def matches(self, item):
+        raise NotImplementedError
+
+    def mask(self, columns, low, high):
+        raise NotImplementedError
+
+
+class Contains(Query):
+    """A text field contains a substring, found through the field's trigrams."""
+    def __init__(self, field, text):
+        self.field = field
+        self.text = text.lower()
+        self.grams = trigrams(text)
+
+    def __repr__(self):
+        return f"{self.field} ~ {self.text!r}"
+
+    def indexed(self):
+        return bool(self.grams)  # Texts shorter than a trigram are found by scanning
+
+    def postings(self, index):
+        return [index.grams[self.field].get(gram, []) for gram in self.grams]
+
+    def estimate(self, index):
+        if not self.grams:
+            return index.size()
+        return min(len(keys) for keys in self.postings(index))
+
+    def keys(self, index, library):
+        if not self.grams:
+            return super().keys(index, library)
+        postings = sorted(self.postings(index), key=len)
+        candidates = postings[0]
+        for keys in postings[1:]:
+            candidates = intersect(candidates, keys)
+        # Every trigram matching does not make a substring, so check the survivors
+        return [key for key in candidates if self.matches(library.get(key))]
+
+    def matches(self, item):
+        return item is not None and self.text in getattr(item, self.field).lower()
+
+    def mask(self, columns, low, high):
+        return columns.text_mask(self.field, re.compile(re.escape(self.text.encode("utf-8"))), low, high)
+
+
+class Equals(Contains):
+    """A text field equals a value, ignoring case; artists have an exact index."""
+    def __repr__(self):
+        return f"{self.field} = {self.text!r}"
+
+    def indexed(self):
+        return self.field == "artist" or super().indexed()
+
+    def estimate(self, index):
+        if self.field == "artist":
+            return len(index.artists.get(self.text, ()))
+        return super().estimate(index)
+
+    def keys(self, index, library):
+        if self.field == "artist":
+            return index.artists.get(self.text, [])
+        return super().keys(index, library)
+
+    def matches(self, item):
+        return item is not None and getattr(item, self.field).lower() == self.text
+
+    def mask(self, columns, low, high):
+        pattern = re.compile(b"^" + re.escape(self.text.encode("utf-8")) + b"$", re.MULTILINE)
+        return columns.text_mask(self.field, pattern, low, high)
+
+
+class Matches(Query):
+    """
+    A text field matches a regular expression, ignoring case. No index can answer it, so
+    it is always scanned. In a parallel scan the expression runs over the UTF-8 bytes of
+    lowercased text, with ^ and $ at the ends of each title or artist; expressions that
+    depend on characters outside ASCII, such as '.' against an accented letter, can
+    match differently there than in a single track check.
+    """
+    def __init__(self, field, pattern):
+        self.field = field
+        self.pattern = pattern
+        try:
+            self.regex = re.compile(pattern, re.IGNORECASE)
+            self.byte_regex = re.compile(pattern.encode("utf-8"), re.IGNORECASE | re.MULTILINE)
+        except re.error as error:
+            raise ValueError(f"Invalid regular expression /{pattern}/: {error}") from None
+
+    def __repr__(self):
+        return f"{self.field} ~ /{self.pattern}/"
+
+    def indexed(self):
+        return False
+
+    def matches(self, item):
+        return item is not None and self.regex.search(getattr(item, self.field)) is not None
+
+    def mask(self, columns, low, high):
+        return columns.text_mask(self.field, self.byte_regex, low, high)
+
+
+class Compare(Query):
+    """A numeric field compared with a constant, answered from the rating or play count index."""
+    def __init__(self, field, op, value):
+        self.field = field
+        self.op = op
+        self.value = value
+        # The comparison as an inclusive range of values, which is what NumberIndex looks up
+        self.low, self.high = {
+            ":": (value, value), "=": (value, value), ">=": (value, None), ">": (value + 1, None),
+            "<=": (None, value), "<": (None, value - 1),
+        }[op]
+
+    def __repr__(self):
+        return f"{self.field} {self.op} {self.value}"
+
+    def estimate(self, index):
+        return index.numbers[self.field].count(self.low, self.high)
+
+    def keys(self, index, library):
+        return index.numbers[self.field].keys(self.low, self.high)
+
+    def matches(self, item):
+        return item is not None and OPERATORS[self.op](getattr(item, self.field), self.value)
+
+    def mask(self, columns, low, high):
+        return OPERATORS[self.op](columns.arrays[self.field][low:high], self.value)
+
+
+class Not(Query):
+    """Tracks that do not match a query. It has no index, so it only filters or scans."""
+    def __init__(self, query):
+        self.query = query
+
+    def __repr__(self):
+        return f"NOT {self.query!r}"
+
+    def indexed(self):
+        return False
+
+    def matches(self, item):
+        return item is not None and not self.query.matches(item)
+
+    def mask(self, columns, low, high):
+        return ~self.query.mask(columns, low, high)
+
+
+class And(Query):
+    """
+    Tracks matching every query. The planner drives the lookup with the most selective
+    query, then narrows the result by each of the others, most selective first: a query
+    whose estimate is close to the result size is intersected as a sorted key set, a
+    negated query that matches few tracks has those tracks removed, and a broad one is
+    checked against each remaining track instead. Either way the work follows the sizes
+    of the result and the most selective index, not the library.
+    """
+    def __init__(self, *queries):
+        self.queries = queries
+
+    def __repr__(self):
+        return "(" + " AND ".join(repr(query) for query in self.queries) + ")"
+
+    def indexed(self):
+        return any(query.indexed() for query in self.queries)
+
+    def estimate(self, index):
+        return min(query.estimate(index) for query in self.queries)
+
+    def plan(self, index):
+        """The queries with their estimates, in the order they are applied; queries without an index go last."""
+        return sorted(((query.estimate(index), query) for query in self.queries),
+                      key=lambda pair: (not pair[1].indexed(), pair[0]))
+
+    def strategy(self, query, estimate, size, index):
+        """How a query narrows a result of the given size: "intersect", "exclude" or "filter"."""
+        if query.indexed() and estimate <= INTERSECT_RATIO * size:
+            return "intersect"
+        if isinstance(query, Not) and query.query.indexed() and query.query.estimate(index) <= size:
+            return "exclude"
+        return "filter"
+
+    def keys(self, index, library):
+        if not self.indexed():
+            return super().keys(index, library)  # Checked in one pass rather than scanning per query
+        (_, driver), *filters = self.plan(index)
+        result = driver.keys(index, library)
+        for estimate, query in filters:
+            if not result:
+                break
+            how = self.strategy(query, estimate, len(result), index)
+            if how == "intersect":
+                result = intersect(result, query.keys(index, library))
+            elif how == "exclude":
+                excluded = set(query.query.keys(index, library))
+                result = [key for key in result if key not in excluded]
+            else:
+                result = [key for key in result if query.matches(library.get(key))]
+        return result
+
+    def matches(self, item):
+        return all(query.matches(item) for query in self.queries)
+
+    def mask(self, columns, low, high):
+        result = self.queries[0].mask(columns, low, high)
+        for query in self.queries[1:]:
+            result &= query.mask(columns, low, high)
+        return result
+
+
+class Or(Query):
+    """Tracks matching any of several queries, merged from their sorted key sets."""
+    def __init__(self, *queries):
+        self.queries = queries
+
+    def __repr__(self):
+        return "(" + " OR ".join(repr(query) for query in self.queries) + ")"
+
+    def estimate(self, index):
+        return min(sum(query.estimate(index) for query in self.queries), index.size())
+
+    def indexed(self):
+        return all(query.indexed() for query in self.queries)
+
+    def keys(self, index, library):
+        if not self.indexed():
+            return super().keys(index, library)  # One branch needs a scan anyway
+        return union(*(query.keys(index, library) for query in self.queries))
+
+    def matches(self, item):
+        return any(query.matches(item) for query in self.queries)
+
+    def mask(self, columns, low, high):
+        result = self.queries[0].mask(columns, low, high)
+        for query in self.queries[1:]:
+            result |= query.mask(columns, low, high)
+        return result
+
+
+def explain(query, index):
+    """The plan for a query as text, one line per step, with estimated track counts."""
+    with index.lock:
+        index.catch_up()
+        if not isinstance(query, And):
+            return f"lookup {query!r} (~{query.estimate(index)})"
+        lines = []
+        result = None
+        for estimate, step in query.plan(index):
+            if result is None:
+                lines.append(f"lookup {step!r} (~{estimate})")
+                result = estimate
+            else:
+                lines.append(f"{query.strategy(step, estimate, result, index)} {step!r} (~{estimate})")
+                result = min(result, estimate)
+        return "\n".join(lines)
+
+
+TOKEN_PATTERN = re.compile(r"""\s*(?:(\(|\))|(\w+)(:|~|>=|<=|!=|=|<|>)|(-)|"([^"]*)"|'([^']*)'|/((?:[^/\\]|\\.)*)/|([^\s()"'][^\s()]*))""")
+
+
+def tokenize(text):
+    """Split a query into parentheses, "field op" pairs, negations, quoted strings, /regexes/ and words."""
+    tokens = []
+    position = 0
+    text = text.strip()
+    while position < len(text):
+        match = TOKEN_PATTERN.match(text, position)
+        if match is None or match.end() == position:
+            raise ValueError(f"Unexpected character in query at position {position}: {text[position]!r}")
+        paren, field, op, minus, double_quoted, single_quoted, regex, word = match.groups()
+        if paren or minus:
+            tokens.append(paren or minus)
+        elif field is not None:
+            tokens.append(("field", field.lower(), op))
+        elif double_quoted is not None or single_quoted is not None:
+            tokens.append(("string", double_quoted if double_quoted is not None else single_quoted))
+        elif regex is not None:
+            tokens.append(("regex", regex))
+        else:
+            tokens.append(("word", word))
+        position = match.end()
+    return tokens
+
+
+class QueryParser:
+    """
+    Parses queries such as 'artist:"pink floyd" rating>=4 plays<10 title~wall'.
+    Terms next to each other must all match; OR, NOT or a leading '-', and parentheses
+    are supported. field:value and field=value test equality, field~text tests that a
+    title or artist contains the text, and a bare word or quoted phrase must appear in
+    the title or the artist. A /regular expression/ after '~', or on its own for the
+    title or the artist, is matched ignoring case.
+    """
+    def __init__(self, text):
+        self.tokens = tokenize(text)
+        self.position = 0
+
+    def parse(self):
+        if not self.tokens:
+            raise ValueError("Empty query")
+        query = self.parse_or()
+        if self.position != len(self.tokens):
+            raise ValueError(f"Unexpected {self.describe(self.peek())!r} in query")
+        return query
+
+    def peek(self):
+        return self.tokens[self.position] if self.position < len(self.tokens) else None
+
+    def take(self):
+        token = self.peek()
+        if token is None:
+            raise ValueError("Query ended unexpectedly")
+        self.position += 1
+        return token
+
+    def keyword(self, word):
+        token = self.peek()
+        if isinstance(token, tuple) and token[0] == "word" and token[1] == word:
+            self.position += 1
+            return True
+        return False
+
+    def describe(self, token):
+        if isinstance(token, tuple):
+            return token[1] + token[2] if token[0] == "field" else token[1]
+        return token
+
+    def parse_or(self):
+        queries = [self.parse_and()]
+        while self.keyword("OR"):
+            queries.append(self.parse_and())
+        return queries[0] if len(queries) == 1 else Or(*queries)
+
+    def parse_and(self):
+        queries = [self.parse_not()]
+        while self.peek() not in (None, ")") and self.peek() != ("word", "OR"):
+            self.keyword("AND")  # Optional between terms
+            queries.append(self.parse_not())
+        return queries[0] if len(queries) == 1 else And(*queries)
+
+    def parse_not(self):
+        if self.keyword("NOT") or self.peek() == "-":
+            if self.peek() == "-":
+                self.take()
+            return Not(self.parse_not())
+        token = self.take()
+        if token == "(":
+            query = self.parse_or()
+            if self.take() != ")":
+                raise ValueError("Expected ')' in query")
+            return query
+        if not isinstance(token, tuple):
+            raise ValueError(f"Unexpected {self.describe(token)!r} in query")
+        if token[0] == "field":
+            return self.parse_condition(token[1], token[2])
+        if token[0] == "regex":
+            return Or(Matches("name", token[1]), Matches("artist", token[1]))
+        return Or(Contains("name", token[1]), Contains("artist", token[1]))
+
+    def parse_condition(self, field, op):
+        token = self.take()
+        if not isinstance(token, tuple) or token[0] == "field":
+            raise ValueError(f"Expected a value after {field}{op}")
+        value = token[1]
+        if token[0] == "regex":
+            if field not in TEXT_FIELDS or op != "~":
+                raise ValueError(f"A regular expression can only follow title~ or artist~, not {field}{op}")
+            return Matches(TEXT_FIELDS[field], value)
+        if field in TEXT_FIELDS:
+            if op == "~":
+                return Contains(TEXT_FIELDS[field], value)
+            if op in (":", "=", "!="):
+                query = Equals(TEXT_FIELDS[field], value)
+                return Not(query) if op == "!=" else query
+            raise ValueError(f"{field} can only be compared with ':', '=', '!=' or '~'")
+        if field in NUMERIC_FIELDS:
+            if op == "~":
+                raise ValueError(f"{field} is a number and cannot contain text")
+            try:
+                number = int(value)
+            except ValueError:
+                raise ValueError(f"Expected a whole number after {field}{op}") from None
+            if op == "!=":
+                return Not(Compare(NUMERIC_FIELDS[field], "=", number))
+            return Compare(NUMERIC_FIELDS[field], op, number)
+        raise ValueError(f"Unknown query field: {field}")
+
+
+def parse_query(text):
+    """Parse a query string into a Query."""
+    return QueryParser(text).parse()
+
+
+# One shared query index per library module, created on first use
+_indexes = {}
+_indexes_lock = threading.Lock()  # Windows searching at the same time share one build
+
+
+def query_index_for(lib):
+    """Return the shared QueryIndex for a library module, building it if needed."""
+    with _indexes_lock:
+        index = _indexes.get(lib.__name__)
+        if index is None:
+            index = _indexes[lib.__name__] = QueryIndex(lib)
+    return index
+
+
+def search(lib, query):
+    """
+    Return (key, item) pairs for the tracks matching a query string or Query, in key order.
+    Raises ValueError if the query cannot be parsed.
+    """
+    if isinstance(query, str):
+        query = parse_query(query)
+    index = query_index_for(lib)
+    with index.lock:  # Key lists may be the index's own postings, so read them before letting changes in
+        index.catch_up()
+        library = lib.library  # Check and return every track from the same version of the library
+        found = ((key, library.get(key)) for key in query.keys(index, library))
+        return [(key, item) for key, item in found if item is not None]
@@ -0,0 +1,82 @@
+import pytest
+import os
+import Track_Library_JSON as lib
+import index_cache
+from track_query import QueryIndex, And, explain, parse_query, search
+
+
+@pytest.fixture
+def index():
+    """Load the JSON library and build a fresh query index that follows it."""
+    lib.load_library_from_json(os.path.join(os.path.dirname(__file__), "library.json"))
+    query_index = QueryIndex(lib)
+    yield query_index
+    query_index.close()
+
+
+def found(index, text):
+    query = parse_query(text)
+    return query.keys(index, lib.library)
+
+
+def test_parse_query():
+    """Test that adjacent terms are joined with AND and fields get their comparisons."""
+    query = parse_query('artist:"pink floyd" rating>=4 plays<10 title~wall')
+    assert isinstance(query, And)
+    assert [repr(part) for part in query.queries] == [
+        "artist = 'pink floyd'", "rating >= 4", "play_count < 10", "name ~ 'wall'"
+    ]
+    assert repr(parse_query("-adele OR (rating=5 AND plays!=0)")) == \
+        "(NOT (name ~ 'adele' OR artist ~ 'adele') OR (rating = 5 AND NOT play_count = 0))"
+
+
+@pytest.mark.parametrize("text", ["", "artist:", "rating>=four", "mood:happy", "(rating=5", "rating~5", "/[a/", "rating~/5/"])
+def test_parse_errors(text):
+    """Test that malformed queries raise ValueError."""
+    with pytest.raises(ValueError):
+        parse_query(text)
+
+
+def test_queries_match_a_scan(index):
+    """Test that planned lookups find the same tracks as checking every track."""
+    for text in ['artist:"pink floyd" rating>=4 title~wall', "you", "rating>=3 -adele", "rating<3 OR artist=adele",
+                 "title~e plays=0", "NOT rating=4", "ee", "title:'shape of you'",
+                 "/^s.*u$/", "artist~/^(adele|queen)$/ -rating=5"]:
+        query = parse_query(text)
+        expected = sorted(key for key, item in lib.library.items() if query.matches(item))
+        assert query.keys(index, lib.library) == expected, text
+
+
+def test_planner_drives_with_most_selective_index(index):
+    """Test that the smallest indexed key set drives the lookup and negations come last."""
+    plan = explain(parse_query("-bee rating>=2 artist:adele"), index).splitlines()
+    assert plan[0].startswith("lookup artist = 'adele'")
+    assert plan[-1].startswith("exclude NOT")
+
+
+def test_index_follows_changes(index):
+    """Test that rating and play count changes move tracks between index entries."""
+    lib.set_rating("04", 5)
+    lib.increment_play_count("04")
+    assert found(index, "rating=5 plays>0") == ["04"]
+    assert [key for key, _ in search(lib, "rating:5")] == ["02", "04"]
+    lib.load_library_from_json(os.path.join(os.path.dirname(__file__), "library.json"))
+    assert found(index, "rating=5") == ["02"]
+
+
+def test_changes_during_a_build_or_lookup_are_kept(monkeypatch):
+    """Test that changes made while the index is built or searched are queued, not lost or waited on."""
+    lib.load_library_from_json(os.path.join(os.path.dirname(__file__), "library.json"))
+    monkeypatch.setattr(index_cache, "load", lambda index, lib_, library: False)  # Always build
+    monkeypatch.setattr(index_cache, "save", lambda index, lib_, library: lib.set_rating("04", 5))
+    index = QueryIndex(lib)
+    try:
+        assert found(index, "rating=5") == ["02", "04"]
+        with index.lock:  # As if a search were running on a worker thread
+            lib.set_rating("05", 5)
+            assert len(index.pending) == 1
+        assert explain(parse_query("rating=5"), index) == "lookup rating = 5 (~3)"
+    finally:
+        index.close()
+        lib.load_library_from_json(os.path.join(os.path.dirname(__file__), "library.json"))
+
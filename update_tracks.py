@@ -1,7 +1,11 @@
+import csv
 import tkinter as tk
 import tkinter.scrolledtext as tkst
+from tkinter import filedialog
 import font_manager as fonts
 import track_library as lib  # Use the functions from the original track_library.py
+from gui_tasks import TaskRunner  # Exports the library in the background so the window stays responsive
+import library_io  # Bulk import and export of titles, artists, ratings and play counts
 
 class UpdateTracks:
     def __init__(self, window):
@@ -27,10 +31,19 @@ class UpdateTracks:
         # Button to update track rating
         tk.Button(self.window, text="Update Rating", command=self.update_rating).grid(row=2, column=0, padx=10, pady=10)
 
+        # Buttons to import changes from and export the library to CSV or JSON lines files
+        file_frame = tk.Frame(self.window)
+        file_frame.grid(row=2, column=1, padx=10, pady=10)
+        tk.Button(file_frame, text="Import Library...", command=self.import_library).pack(side=tk.LEFT, padx=5)
+        tk.Button(file_frame, text="Export Library...", command=self.export_library).pack(side=tk.LEFT, padx=5)
+
         # Scrolled text area to display results
         self.text_area = tkst.ScrolledText(self.window, width=85, height=10)
         self.text_area.grid(row=3, column=0, columnspan=2, padx=10, pady=10)
 
+        # Exports run in the background, with a busy cursor while they do
+        self.tasks = TaskRunner(self.window)
+
     def update_rating(self):
         """
         Updates the rating for the specified track.
@@ -43,8 +56,15 @@ class UpdateTracks:
             self.display_message("Error: Rating must be a number between 1 and 5.")
             return
 
-        # Check if the track exists
-        if lib.get_name(track_number) is not None:
+        # Check if the track exists; a single lookup is quick enough for the Tk thread
+        self.apply_rating(track_number, new_rating, lib.get_name(track_number))
+
+    def apply_rating(self, track_number, new_rating, track_name):
+        """
+        Sets the rating of a track that has been looked up.
+        The change is made on the Tk thread, since library listeners update the views.
+        """
+        if track_name is not None:
             lib.set_rating(track_number, int(new_rating))  # Update the track's rating
             play_count = lib.get_play_count(track_number) # Get the updated play count
             content = f"Updated Track:\nName: {lib.get_name(track_number)}\nNew Rating: {new_rating} stars\nPlay Count: {play_count}\n"
@@ -52,6 +72,48 @@ class UpdateTracks:
         else:
             self.display_message("Error: Invalid track number.")
 
+    def import_library(self):
+        """
+        Applies the titles, artists and ratings in a CSV or JSON lines file, one batch per
+        event loop turn, so the window stays responsive and listeners run on the Tk thread.
+        """
+        path = filedialog.askopenfilename(filetypes=library_io.LIBRARY_FILETYPES)
+        if not path: # The user cancelled the dialog
+            return
+
+        report = library_io.ImportReport()
+        batches = library_io.import_batches(lib, path, report)
+
+        def step():
+            try:
+                next(batches)
+            except StopIteration:
+                self.display_message(f"Import finished: {report.summary()}")
+                return
+            except (OSError, ValueError, csv.Error) as error:
+                self.display_message(f"Error: Could not import {path} ({error}).")
+                return
+            self.display_message(f"Importing... {report.rows} rows read, {report.updated} tracks updated")
+            self.window.after(1, step)
+
+        step()
+
+    def export_library(self):
+        """
+        Writes every track with its rating and play count to a CSV or JSON lines file in the background.
+        """
+        path = filedialog.asksaveasfilename(defaultextension=".csv", filetypes=library_io.LIBRARY_FILETYPES)
+        if not path: # The user cancelled the dialog
+            return
+
+        self.display_message("Exporting...")
+        self.tasks.submit(
+            "export",
+            lambda: library_io.export_library(lib, path),  # Reads one library version, so it is safe off the Tk thread
+            lambda count: self.display_message(f"Exported {count} track(s) to {path}."),
+            lambda error: self.display_message(f"Error: Could not export library ({error})."),
+        )
+
     def display_message(self, message):
         """
         Displays a message in the text area.
@@ -4,6 +4,10 @@ import tkinter.scrolledtext as tkst
 # Importing track library for accessing track information and font manager for styling
 import track_library as lib
 import font_manager as fonts
+from track_index import index_for, format_ranking
+from gui_tasks import TaskRunner
+
+TOP_N = 50  # Number of tracks shown in the ranked views
  
 
 def set_text(text_area, content):
@@ -20,10 +24,23 @@ def set_text(text_area, content):
     text_area.insert(1.0, content)
 
 
+def track_details(key):
+    """
+    Returns the details of a track for display, or a message if it was not found.
+    """
+    name = lib.get_name(key) # Attempt to retrieve the track details from the library
+    if name is None:
+        return f"Track {key} not found" # Message for a track that was not found
+    artist = lib.get_artist(key)
+    rating = lib.get_rating(key)
+    play_count = lib.get_play_count(key)
+    return f"{name}\n{artist}\nrating: {rating}\nplays: {play_count}" # Detailed information about the track
+
+
 class TrackViewer():
     def __init__(self, window):
         # Set window geometry and title
-        window.geometry("750x350")
+        window.geometry("750x400")
         window.title("View Tracks")
 
         # Button to list all tracks
@@ -49,8 +66,19 @@ class TrackViewer():
         self.track_txt = tk.Text(window, width=24, height=4, wrap="none")
         self.track_txt.grid(row=1, column=3, sticky="NW", padx=10, pady=10)
 
+        # Buttons for the ranked views, served from the rating and play count indexes
+        self.track_index = index_for(lib)
+        top_rated_btn = tk.Button(window, text="Top Rated", command=self.top_rated_clicked)
+        top_rated_btn.grid(row=2, column=0, padx=10, pady=10)
+
+        most_played_btn = tk.Button(window, text="Most Played", command=self.most_played_clicked)
+        most_played_btn.grid(row=2, column=1, padx=10, pady=10)
+
         self.status_lbl = tk.Label(window, text="", font=("Helvetica", 10))
-        self.status_lbl.grid(row=2, column=0, columnspan=4, sticky="W", padx=10, pady=10)
+        self.status_lbl.grid(row=3, column=0, columnspan=4, sticky="W", padx=10, pady=10)
+
+        # Library calls run in the background, with a busy cursor while they do
+        self.tasks = TaskRunner(window)
 
         self.list_tracks_clicked()
 
@@ -60,21 +88,40 @@ class TrackViewer():
         Retrieves and displays details of a specific track based on user input.
         """
         key = self.input_txt.get()
-        name = lib.get_name(key) # Attempt to retrieve the track details from the library
-        if name is not None:  # If track is found, format the details for display
-            artist = lib.get_artist(key)
-            rating = lib.get_rating(key)
-            play_count = lib.get_play_count(key)
-            track_details = f"{name}\n{artist}\nrating: {rating}\nplays: {play_count}" # Display detailed information about the track
-            set_text(self.track_txt, track_details)
-        else:
-            set_text(self.track_txt, f"Track {key} not found") # Display a message if the track was not found
-        self.status_lbl.configure(text="View Track button was clicked!")
+        self.status_lbl.configure(text="Loading track...")
+        self.tasks.submit("view", lambda: track_details(key), self.show_result(self.track_txt, "View Track button was clicked!"))
 
     def list_tracks_clicked(self):
-        track_list = lib.list_all() # Retrieve all track details from the library
-        set_text(self.list_txt, track_list)
-        self.status_lbl.configure(text="List Tracks button was clicked!")
+        self.status_lbl.configure(text="Loading tracks...")
+        # All list views share one task name, so only the last one clicked fills the list
+        self.tasks.submit("list", lib.list_all, self.show_result(self.list_txt, "List Tracks button was clicked!"))
+
+    def top_rated_clicked(self):
+        self.status_lbl.configure(text="Loading top rated tracks...")
+        keys = self.track_index.top_rated(TOP_N)  # Read here: listeners change the index on this thread
+        self.tasks.submit(
+            "list",
+            lambda: format_ranking(lib, keys), # Highest rated tracks first, formatted in the background
+            self.show_result(self.list_txt, "Top Rated button was clicked!"),
+        )
+
+    def most_played_clicked(self):
+        self.status_lbl.configure(text="Loading most played tracks...")
+        keys = self.track_index.most_played(TOP_N)  # Read here: listeners change the index on this thread
+        self.tasks.submit(
+            "list",
+            lambda: format_ranking(lib, keys), # Most played tracks first, formatted in the background
+            self.show_result(self.list_txt, "Most Played button was clicked!"),
+        )
+
+    def show_result(self, text_area, status):
+        """
+        Returns a callback for a background task that shows its text in a text area and updates the status.
+        """
+        def show(content):
+            set_text(text_area, content)
+            self.status_lbl.configure(text=status)
+        return show
 
 if __name__ == "__main__":  # only runs when this file is run as a standalone
     window = tk.Tk()        # create a TK object
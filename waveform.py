@@ -0,0 +1,94 @@
+import os
+
+import numpy as np
+
+from audio_engine import decode_file
+import media_cache
+
+PEAK_COLUMNS = 720  # Min/max pairs kept per track, about 3 KB on disk
+
+
+def compute_peaks(samples, columns=PEAK_COLUMNS):
+    """
+    Downsample int16 frames of shape (frames, channels) to columns (min, max) pairs.
+    Returns an int16 array of shape (columns, 2).
+    """
+    columns = max(1, min(columns, len(samples)))
+    usable = len(samples) // columns * columns
+    if usable == 0:
+        return np.zeros((columns, 2), dtype=np.int16)
+    # Each row holds every sample (of every channel) that falls into one column
+    blocks = samples[:usable].reshape(columns, -1)
+    return np.stack([blocks.min(axis=1), blocks.max(axis=1)], axis=1).astype(np.int16)
+
+
+def peaks_path(path):
+    """Cache file for the peaks of an audio file."""
+    return media_cache.cache_path("peaks", media_cache.file_fingerprint(path), ".npy")
+
+
+def load_peaks(path):
+    """Return the cached peaks of an audio file, or None if they have not been generated."""
+    try:
+        return np.load(peaks_path(path))
+    except (OSError, ValueError):
+        return None
+
+
+def generate_peaks(path):
+    """
+    Decode an audio file once and cache its peaks. Runs in a decode_pool() worker.
+    Returns the path so callers can tell which job finished.
+    """
+    cache_file = peaks_path(path)
+    if not os.path.exists(cache_file):
+        peaks = compute_peaks(decode_file(path))
+        media_cache.write_atomically(cache_file, lambda file: np.save(file, peaks))
+    return path
+
+
+def missing_peaks(paths):
+    """The paths whose peaks are not in the cache yet. Files that cannot be read, e.g. deleted ones, are left out."""
+    missing = []
+    for path in paths:
+        try:
+            cache_file = peaks_path(path)
+        except OSError:
+            continue  # Nothing to decode; the folder watcher removes the song on its next poll
+        if not os.path.exists(cache_file):
+            missing.append(path)
+    return missing
+
+
+def pregenerate(folder, max_workers=None):
+    """Generate peaks for every MP3 file in a folder tree, using every core."""
+    paths = []
+    for root, _, files in os.walk(folder):
+        paths.extend(os.path.join(root, name) for name in files if name.lower().endswith(".mp3"))
+    with media_cache.decode_pool(max_workers) as pool:
+        for path in pool.map(generate_peaks, missing_peaks(paths)):
+            print(f"Peaks cached for {path}")
+
+
+def draw_peaks(canvas, peaks, color="grey"):
+    """Draw peaks as one vertical line per canvas pixel column."""
+    canvas.delete("peaks")
+    width = int(canvas["width"])
+    height = int(canvas["height"])
+    if peaks is None or not len(peaks):
+        return
+    # Reduce the stored columns to the canvas width, keeping the extremes
+    edges = np.linspace(0, len(peaks), width + 1).astype(int)
+    middle = height / 2
+    scale = middle / 32768
+    for x in range(width):
+        column = peaks[edges[x]:max(edges[x + 1], edges[x] + 1)]
+        low = middle - column[:, 1].max() * scale
+        high = middle - column[:, 0].min() * scale
+        canvas.create_line(x, low, x, high + 1, fill=color, tags="peaks")
+
+
+if __name__ == "__main__":
+    import sys
+    # Usage: python waveform.py [music folder]
+    pregenerate(sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(os.path.abspath(__file__)), "MusicPlayer"))
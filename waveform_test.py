@@ -0,0 +1,58 @@
+import os
+
+import numpy as np
+
+import media_cache
+import waveform
+from waveform import PEAK_COLUMNS, compute_peaks
+
+
+def test_peaks_hold_the_extremes_of_each_column():
+    """Test that every column holds the minimum and maximum of its frames over both channels."""
+    rng = np.random.default_rng(1)
+    samples = rng.integers(-32768, 32768, size=(PEAK_COLUMNS * 50 + 7, 2), dtype=np.int16)
+    peaks = compute_peaks(samples)
+    assert peaks.shape == (PEAK_COLUMNS, 2) and peaks.dtype == np.int16
+    blocks = samples[:PEAK_COLUMNS * 50].reshape(PEAK_COLUMNS, 50, 2)  # The last 7 frames are left out
+    assert (peaks[:, 0] == blocks.min(axis=(1, 2))).all()
+    assert (peaks[:, 1] == blocks.max(axis=(1, 2))).all()
+
+
+def test_short_and_empty_inputs():
+    """Test that fewer frames than columns give one column per frame, and no frames one silent column."""
+    samples = np.array([[1, -2], [5, 3], [-7, 0]], dtype=np.int16)
+    assert compute_peaks(samples).tolist() == [[-2, 1], [3, 5], [-7, 0]]
+    assert compute_peaks(np.zeros((0, 2), dtype=np.int16)).tolist() == [[0, 0]]
+
+
+def test_generated_peaks_are_cached_per_file_version(tmp_path, monkeypatch):
+    """Test that generated peaks load back and that rewriting the file makes them missing again."""
+    monkeypatch.setattr(media_cache, "CACHE_DIR", str(tmp_path / "cache"))
+    decoded = []
+    samples = np.arange(-3000, 3000, dtype=np.int16).reshape(-1, 2)
+    monkeypatch.setattr(waveform, "decode_file", lambda path: decoded.append(path) or samples)
+    song = tmp_path / "song.mp3"
+    song.write_bytes(b"first version")
+    path = str(song)
+
+    assert waveform.load_peaks(path) is None and waveform.missing_peaks([path]) == [path]
+    assert waveform.generate_peaks(path) == path
+    assert (waveform.load_peaks(path) == compute_peaks(samples)).all()
+    assert waveform.missing_peaks([path]) == []
+    waveform.generate_peaks(path)
+    assert decoded == [path]  # Cached peaks are not decoded again
+
+    fingerprint = media_cache.file_fingerprint(path)
+    song.write_bytes(b"second, longer version")
+    os.utime(path, ns=(0, os.stat(path).st_mtime_ns + 1))
+    assert media_cache.file_fingerprint(path) != fingerprint
+    assert waveform.load_peaks(path) is None and waveform.missing_peaks([path]) == [path]
+
+
+def test_deleted_files_are_not_missing_peaks(tmp_path, monkeypatch):
+    """Test that a song whose file is gone is skipped rather than raising on the Tk thread."""
+    monkeypatch.setattr(media_cache, "CACHE_DIR", str(tmp_path / "cache"))
+    song = tmp_path / "song.mp3"
+    song.write_bytes(b"audio")
+    assert waveform.missing_peaks([str(tmp_path / "gone.mp3"), str(song)]) == [str(song)]
+    assert waveform.load_peaks(str(tmp_path / "gone.mp3")) is None